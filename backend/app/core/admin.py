@@ -1,7 +1,11 @@
+import uuid
+
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Item, ItemImage, Transaction, Rating
+from .models import User, Item, ItemImage, Transaction, Rating, PointsLedgerEntry, Like
+from .pagination import EstimatedCountPaginator
+from .search import search_items
 
 # Customize Django Admin Site
 admin.site.site_header = "ReWear Admin Panel"
@@ -12,11 +16,49 @@ admin.site.index_title = "Welcome to ReWear Community Clothing Exchange Admin"
 admin.site.unregister(Group)
 
 
+# ===============================
+# Large Table Support
+# ===============================
+
+class LargeTableAdmin:
+    """
+    ModelAdmin mixin for changelists over large tables. Pages are counted
+    with EstimatedCountPaginator and without the unfiltered total, and FK
+    columns must be covered by list_select_related so a page costs a
+    constant number of queries.
+
+    Search only uses indexed lookups instead of icontains across joins: a
+    UUID matches search_uuid_field, a term containing @ goes through
+    search_fields (= and ^ lookups on emails, backed by the upper-case
+    indexes of migration 0011), and anything else is a full-text search of
+    item titles, brands, tags and descriptions through search_item_field.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_uuid_field = 'pk'
+    search_item_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(**{self.search_uuid_field: uuid.UUID(term)}), False
+        except ValueError:
+            pass
+        if '@' in term or self.search_item_field is None:
+            return super().get_search_results(request, queryset, term)
+        matches = search_items(Item.objects.all(), term).values('pk')
+        return queryset.filter(**{f'{self.search_item_field}__in': matches}), False
+
+
 @admin.register(User)
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(LargeTableAdmin, BaseUserAdmin):
     list_display = ['email', 'first_name', 'last_name', 'points_balance', 'role', 'is_staff', 'is_active', 'date_joined']
     list_filter = ['role', 'is_staff', 'is_active', 'is_suspended', 'date_joined']
-    search_fields = ['email', 'first_name', 'last_name', 'username']
+    # Prefix matches, so user autocompletes use the upper-case indexes
+    search_fields = ['^email', '^username']
+    search_uuid_field = 'user_id'
     ordering = ['-date_joined']
     
     # Configure login field for admin
@@ -45,10 +87,13 @@ class ItemImageInline(admin.TabularInline):
 
 
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ['title', 'uploader', 'category', 'type', 'condition', 'status', 'points_value', 'created_at']
     list_filter = ['category', 'type', 'condition', 'status', 'created_at']
-    search_fields = ['title', 'description', 'uploader__first_name', 'uploader__last_name', 'brand']
+    list_select_related = ['uploader']
+    search_fields = ['=uploader__email']
+    search_item_field = 'pk'
+    autocomplete_fields = ['uploader']
     ordering = ['-created_at']
     inlines = [ItemImageInline]
     
@@ -58,18 +103,22 @@ class ItemAdmin(admin.ModelAdmin):
         ('Status & Pricing', {'fields': ('status', 'points_value', 'tags')}),
     )
     
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['likes_count', 'created_at', 'updated_at']
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ['transaction_id', 'sender', 'receiver', 'item', 'method', 'status', 'points_amount', 'created_at']
     list_filter = ['method', 'status', 'created_at']
-    search_fields = ['sender__first_name', 'sender__last_name', 'receiver__first_name', 'receiver__last_name', 'item__title']
+    # Item.__str__ shows the uploader
+    list_select_related = ['sender', 'receiver', 'item__uploader']
+    search_fields = ['=sender__email', '=receiver__email']
+    search_item_field = 'item'
+    autocomplete_fields = ['sender', 'receiver', 'item', 'offered_item']
     ordering = ['-created_at']
     
     fieldsets = (
-        (None, {'fields': ('sender', 'receiver', 'item')}),
+        (None, {'fields': ('sender', 'receiver', 'item', 'offered_item')}),
         ('Transaction Details', {'fields': ('method', 'status', 'points_amount', 'message')}),
         ('Admin', {'fields': ('admin_notes',)}),
         ('Timestamps', {'fields': ('created_at', 'updated_at', 'completed_at')}),
@@ -79,10 +128,15 @@ class TransactionAdmin(admin.ModelAdmin):
 
 
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ['rater', 'rated_user', 'rating', 'transaction', 'created_at']
     list_filter = ['rating', 'created_at']
-    search_fields = ['rater__first_name', 'rater__last_name', 'rated_user__first_name', 'rated_user__last_name']
+    # Transaction.__str__ shows sender and receiver
+    list_select_related = ['rater', 'rated_user', 'transaction__sender', 'transaction__receiver']
+    search_fields = ['=rater__email', '=rated_user__email']
+    search_item_field = 'transaction__item'
+    autocomplete_fields = ['rater', 'rated_user']
+    raw_id_fields = ['transaction']
     ordering = ['-created_at']
     
     fieldsets = (
@@ -95,8 +149,43 @@ class RatingAdmin(admin.ModelAdmin):
 
 
 @admin.register(ItemImage)
-class ItemImageAdmin(admin.ModelAdmin):
+class ItemImageAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ['item', 'is_primary', 'created_at']
     list_filter = ['is_primary', 'created_at']
-    search_fields = ['item__title', 'alt_text']
+    list_select_related = ['item__uploader']
+    search_fields = ['=item__uploader__email']
+    search_item_field = 'item'
+    autocomplete_fields = ['item']
     ordering = ['-created_at']
+
+
+@admin.register(Like)
+class LikeAdmin(LargeTableAdmin, admin.ModelAdmin):
+    list_display = ['user', 'item', 'created_at']
+    list_filter = ['created_at']
+    list_select_related = ['user', 'item__uploader']
+    search_fields = ['=user__email']
+    search_item_field = 'item'
+    autocomplete_fields = ['user', 'item']
+    ordering = ['-created_at']
+
+
+@admin.register(PointsLedgerEntry)
+class PointsLedgerEntryAdmin(LargeTableAdmin, admin.ModelAdmin):
+    list_display = ['entry_id', 'user', 'entry_type', 'amount', 'transaction', 'created_at']
+    list_filter = ['entry_type', 'created_at']
+    list_select_related = ['user', 'transaction__sender', 'transaction__receiver']
+    search_fields = ['=user__email']
+    ordering = ['-created_at']
+    readonly_fields = ['entry_id', 'user', 'transaction', 'entry_type', 'amount', 'created_at']
+    
+    # The ledger is append-only; this also removes the "delete selected"
+    # action, whose queryset.delete() would bypass the model's guard
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,6 +1,41 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.core'
+
+    def ready(self):
+        from .models import Item, ItemImage, Like, Rating, Transaction, User
+        from .matching import refresh_if_due, want_added
+        from .search import index_item, unindex_item
+        from .view_counts import flush_if_due
+        from .signals import (
+            rating_saved, rating_deleted, item_saved, item_deleted, item_image_changed,
+            item_listing_saved, item_listing_deleted, transaction_saved, transaction_deleted,
+            like_saved, like_deleted, user_changed, user_located,
+        )
+
+        post_save.connect(index_item, sender=Item, dispatch_uid='core_index_item')
+        post_delete.connect(unindex_item, sender=Item, dispatch_uid='core_unindex_item')
+        post_save.connect(rating_saved, sender=Rating, dispatch_uid='core_rating_saved')
+        post_delete.connect(rating_deleted, sender=Rating, dispatch_uid='core_rating_deleted')
+        post_save.connect(item_saved, sender=Item, dispatch_uid='core_item_saved')
+        post_delete.connect(item_deleted, sender=Item, dispatch_uid='core_item_deleted')
+        post_save.connect(item_image_changed, sender=ItemImage, dispatch_uid='core_item_image_saved')
+        post_delete.connect(item_image_changed, sender=ItemImage, dispatch_uid='core_item_image_deleted')
+        post_save.connect(item_listing_saved, sender=Item, dispatch_uid='core_item_listing_saved')
+        post_delete.connect(item_listing_deleted, sender=Item, dispatch_uid='core_item_listing_deleted')
+        post_save.connect(transaction_saved, sender=Transaction, dispatch_uid='core_transaction_saved')
+        post_delete.connect(transaction_deleted, sender=Transaction, dispatch_uid='core_transaction_deleted')
+        post_save.connect(like_saved, sender=Like, dispatch_uid='core_like_saved')
+        post_delete.connect(like_deleted, sender=Like, dispatch_uid='core_like_deleted')
+        request_finished.connect(flush_if_due, dispatch_uid='core_flush_view_counts')
+        post_save.connect(want_added, sender=Like, dispatch_uid='core_like_want_added')
+        post_save.connect(want_added, sender=Transaction, dispatch_uid='core_swap_want_added')
+        request_finished.connect(refresh_if_due, dispatch_uid='core_refresh_want_graph')
+        post_save.connect(user_changed, sender=User, dispatch_uid='core_user_saved')
+        post_delete.connect(user_changed, sender=User, dispatch_uid='core_user_deleted')
+        post_save.connect(user_located, sender=User, dispatch_uid='core_user_located')
@@ -0,0 +1,72 @@
+"""
+Async support for DRF views.
+
+DRF's APIView dispatches synchronously. An AsyncAPIView keeps its sync
+handlers (get, post, ...) and may add async variants of them (aget,
+apost, ...). Which ones serve requests is decided by settings.ASYNC_VIEWS,
+which defaults to true only for SERVER_MODE=asgi:
+
+- off (WSGI, the default): the view is a plain sync APIView, so requests
+  pay no async_to_sync/sync_to_async hops.
+- on (ASGI with uvicorn workers): dispatch is a coroutine and the async
+  variants wait on the database, cache and storage without holding a
+  worker thread. Authentication, permission checks and handlers without
+  an async variant run through sync_to_async.
+
+Async handlers must not touch the ORM synchronously: load related rows
+up front (select_related/prefetch_related with the a*-methods) before
+serializing.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.functional import classproperty
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """APIView whose handlers have optional async variants, used when settings.ASYNC_VIEWS is on"""
+
+    # Set by as_view()
+    async_dispatch = False
+
+    @classproperty
+    def view_is_async(cls):
+        return settings.ASYNC_VIEWS
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # The setting is read once, when the URL conf is loaded, and each
+        # request dispatches the way the view was built
+        return super().as_view(async_dispatch=cls.view_is_async, **initkwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.async_dispatch:
+            return self.adispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_async_handler(self, method):
+        """The async variant of a handler, or the sync handler wrapped in sync_to_async"""
+        if method not in self.http_method_names:
+            return sync_to_async(self.http_method_not_allowed)
+        handler = getattr(self, f'a{method}', None)
+        if handler is not None:
+            return handler
+        return sync_to_async(getattr(self, method, self.http_method_not_allowed))
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = self.get_async_handler(request.method.lower())
+            response = await handler(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
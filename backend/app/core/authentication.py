@@ -0,0 +1,78 @@
+"""
+JWT authentication without a user SELECT per request.
+
+Tokens issued by tokens_for_user() carry the user's token version.
+CachedJWTAuthentication loads the user row through the cache
+(AUTH_USER_CACHE_TIMEOUT seconds), so with a warm cache a request is
+authenticated without touching the database. Changing a user's password,
+role, suspension or active flag bumps User.token_version and evicts the
+cached row (app/core/signals.py), which rejects every token issued
+before the change.
+
+The eviction reaches every worker only through a shared cache (Redis,
+REDIS_URL). With the per-process local-memory cache, other workers keep
+serving their copy until it expires, so AUTH_USER_CACHE_TIMEOUT defaults
+to a few seconds there; set it to 0 to read the row on every request.
+
+The cached user is a snapshot: counters updated with F() expressions,
+such as points_balance, may be stale on request.user, so views that
+return or save the user's own row load it fresh.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+
+def _user_cache_key(pk):
+    return f'auth:user:{pk}'
+
+
+def tokens_for_user(user):
+    """Return a RefreshToken whose access tokens carry a version claim"""
+    refresh = RefreshToken.for_user(user)
+    refresh['ver'] = user.token_version
+    return refresh
+
+
+def get_cached_user(pk):
+    """Load a user by primary key through the cache, or None"""
+    if not settings.AUTH_USER_CACHE_TIMEOUT:
+        return User.objects.filter(pk=pk).first()
+    key = _user_cache_key(pk)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=pk).first()
+        if user is not None:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def evict_cached_user(pk):
+    cache.delete(_user_cache_key(pk))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves the user from the cache and checks its token version"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if user.is_suspended:
+            raise AuthenticationFailed('User account is suspended', code='user_suspended')
+        # Tokens issued before versioning carry no claim and match version 0
+        if validated_token.get('ver', 0) != user.token_version:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return user
@@ -0,0 +1,40 @@
+"""
+Benchmarks behind the benchmark_* and load_test management commands, one
+module per feature:
+
+- endpoints: the bulk fixture generator and the per-route runner
+  (benchmark_endpoints, load_test)
+- logins: login throughput per password hasher (benchmark_logins)
+- matching: the want graph and swap suggestions (benchmark_swap_matching)
+- similar_items: the similar items job and endpoint
+  (benchmark_similar_items)
+
+Helpers shared by their fixture generators and runners live here.
+"""
+import math
+import uuid
+
+
+BENCHMARK_PASSWORD = 'benchmark-pass-123'
+
+
+def batches(rows, batch_size):
+    """Lists of up to batch_size rows from an iterable, for bulk_create"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def random_uuid(rng):
+    """A version 4 UUID from a seeded random.Random, so fixtures are reproducible"""
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
@@ -0,0 +1,361 @@
+"""
+Endpoint benchmarks: a bulk fixture generator and a runner that replays
+every route in app/core/urls.py through the DRF test client, recording
+query counts, p50/p95 latency and response size.
+
+Used by the benchmark_endpoints management command; see its help for
+running against a throwaway database and comparing with a baseline.
+load_test seeds its database with seed() as well.
+"""
+import io
+import json
+import random
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from ..images import shutdown_executor
+from ..matching import rebuild_want_graph
+from ..models import User, Item, ItemImage, Transaction, Rating, Like
+from ..recommendations import rebuild_similar_items
+from ..view_counts import buffer as view_buffer
+from . import BENCHMARK_PASSWORD, batches, percentile, random_uuid
+
+
+# Row counts at scale 1.0
+FULL_SCALE = {
+    'users': 50_000,
+    'items': 500_000,
+    'images': 2_000_000,
+    'transactions': 1_000_000,
+    'ratings': 200_000,
+}
+
+
+# ===============================
+# Fixture Generator
+# ===============================
+
+@dataclass
+class BenchmarkContext:
+    """Rows the scenarios act on, picked after seeding"""
+    actor: User
+    other: User
+    staff: User
+    unrated: User
+    own_item: Item
+    other_item: Item
+    received_swap: Transaction
+    counts: dict = field(default_factory=dict)
+
+
+def seed(scale=0.01, batch_size=5000, random_seed=1, log=None):
+    """
+    Bulk-insert a realistic dataset scaled from FULL_SCALE and return a
+    BenchmarkContext. Rows are generated lazily and written with
+    bulk_create in batches, so memory stays bounded by batch_size plus
+    the id lists needed for foreign keys.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    counts = {name: max(10, int(total * scale)) for name, total in FULL_SCALE.items()}
+    password = make_password(BENCHMARK_PASSWORD)
+    categories = [choice for choice, _ in Item.ITEM_CATEGORIES]
+    sizes = [choice for choice, _ in Item.ITEM_SIZES]
+    conditions = [choice for choice, _ in Item.ITEM_CONDITIONS]
+
+    log(f"Seeding {counts['users']} users...")
+    users = (
+        User(
+            username=f'bench{i}', email=f'bench{i}@rewear.test', password=password,
+            first_name='Bench', last_name=f'User{i}', location=rng.choice(['Pune', 'Delhi', 'Chennai']),
+        )
+        for i in range(counts['users'])
+    )
+    for batch in batches(users, batch_size):
+        # bulk_create skips save(), which geocodes
+        for user in batch:
+            user.geocode_location()
+        User.objects.bulk_create(batch)
+    user_ids = list(User.objects.filter(username__startswith='bench').values_list('pk', flat=True))
+
+    log(f"Seeding {counts['items']} items...")
+    item_ids = [random_uuid(rng) for _ in range(counts['items'])]
+    items = (
+        Item(
+            item_id=item_id, uploader_id=rng.choice(user_ids),
+            title=f'{rng.choice(["Denim", "Linen", "Wool", "Silk"])} {rng.choice(["Jacket", "Shirt", "Dress", "Scarf"])} {i}',
+            description='Gently used, from a smoke-free home. ' * rng.randint(1, 4),
+            category=rng.choice(categories), size=rng.choice(sizes), condition=rng.choice(conditions),
+            brand=rng.choice(['Levis', 'Zara', 'H&M', None]), tags='vintage,casual',
+            status='available' if rng.random() < 0.7 else 'swapped', points_value=rng.randint(5, 80),
+        )
+        for i, item_id in enumerate(item_ids)
+    )
+    for batch in batches(items, batch_size):
+        Item.objects.bulk_create(batch)
+
+    log(f"Seeding {counts['images']} images...")
+    per_item = max(1, counts['images'] // counts['items'])
+    images = (
+        ItemImage(
+            image_id=random_uuid(rng), item_id=item_id,
+            image=f'items/{item_id}.jpg' if n == 0 else f'items/{item_id}-{n}.jpg', is_primary=(n == 0),
+        )
+        for item_id in item_ids
+        for n in range(per_item)
+    )
+    for batch in batches(images, batch_size):
+        ItemImage.objects.bulk_create(batch)
+
+    log(f"Seeding {counts['transactions']} transactions...")
+    statuses = ['pending', 'accepted', 'completed', 'cancelled']
+    transactions = (
+        Transaction(
+            transaction_id=random_uuid(rng), sender_id=sender, receiver_id=receiver,
+            item_id=rng.choice(item_ids), method=rng.choice(['swap', 'points']),
+            status=rng.choice(statuses), points_amount=rng.randint(0, 50),
+        )
+        for sender, receiver in (rng.sample(user_ids, 2) for _ in range(counts['transactions']))
+    )
+    for batch in batches(transactions, batch_size):
+        Transaction.objects.bulk_create(batch)
+
+    # The first seeded user acts in the scenarios; the third is never rated
+    actor_id, other_id, unrated_id = user_ids[:3]
+    rater_ids = user_ids[3:]
+    rated_ids = [other_id] + rater_ids
+
+    log(f"Seeding {counts['ratings']} ratings...")
+    ratings = (
+        Rating(rating_id=random_uuid(rng), rater_id=rater, rated_user_id=rated, rating=rng.randint(1, 5))
+        for rater, rated in ((rng.choice(rater_ids), rng.choice(rated_ids)) for _ in range(counts['ratings']))
+        if rater != rated
+    )
+    for batch in batches(ratings, batch_size):
+        Rating.objects.bulk_create(batch)
+
+    actor = User.objects.get(pk=actor_id)
+    other = User.objects.get(pk=other_id)
+    own_item = Item.objects.create(
+        uploader=actor, title='Benchmark Jacket', description='Owned by the actor',
+        category='outerwear', size='m', condition='good', points_value=20,
+    )
+    other_item = Item.objects.create(
+        uploader=other, title='Benchmark Dress', description='Owned by another user',
+        category='dresses', size='s', condition='excellent', points_value=20,
+    )
+    received_swap = Transaction.objects.create(
+        sender=other, receiver=actor, item=own_item, method='swap', status='pending',
+    )
+    # With other's request for own_item, a two-way match for the actor
+    wanted_item = Item.objects.create(
+        uploader=other, title='Benchmark Scarf', description='Liked by the actor',
+        category='accessories', size='one_size', condition='good', points_value=10,
+    )
+    Like.objects.create(user=actor, item=wanted_item)
+    log('Computing similar items...')
+    rebuild_similar_items()
+    log('Building the want graph...')
+    rebuild_want_graph()
+    staff = User.objects.create(
+        username='benchmark-staff', email='staff@bench.test', password=password,
+        first_name='Benchmark', last_name='Staff', is_staff=True,
+    )
+    # bulk_create skips the signals that maintain these
+    log('Rebuilding user stats and rating aggregates...')
+    User.rebuild_stats()
+    User.rebuild_rating_aggregates()
+    actor.refresh_from_db()
+    other.refresh_from_db()
+    log('Seeding done.')
+    return BenchmarkContext(
+        actor=actor, other=other, staff=staff, unrated=User.objects.get(pk=unrated_id),
+        own_item=own_item, other_item=other_item, received_swap=received_swap, counts=counts,
+    )
+
+
+# ===============================
+# Scenarios
+# ===============================
+
+@dataclass
+class Scenario:
+    """One request against one route; writes are rolled back after each run"""
+    name: str
+    method: str
+    path: str
+    data: object = None
+    format: str = 'json'
+    authenticated: bool = True
+    as_staff: bool = False
+    # Settings overridden while the scenario runs
+    settings: dict = field(default_factory=dict)
+
+
+def _upload_payload():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 900), 'teal').save(buffer, format='JPEG')
+    buffer.seek(0)
+    buffer.name = 'benchmark.jpg'
+    return {'images': [buffer]}
+
+
+def _import_payload():
+    rows = [
+        {'title': f'Drive Item {i}', 'description': 'Donated', 'category': 'tops', 'size': 'm',
+         'condition': 'good', 'points_value': 10, 'images': [f'items/drive-{i}.jpg']}
+        for i in range(100)
+    ]
+    buffer = io.BytesIO(''.join(json.dumps(row) + '\n' for row in rows).encode())
+    buffer.name = 'drive.ndjson'
+    return {'file': buffer}
+
+
+def build_scenarios(ctx):
+    """Scenarios covering every route in app/core/urls.py"""
+    signup = {
+        'first_name': 'New', 'last_name': 'Member', 'email': 'new.member@rewear.test',
+        'password': 'Str0ng-Passw0rd!', 'password_confirm': 'Str0ng-Passw0rd!',
+    }
+    new_item = {
+        'title': 'Benchmark Coat', 'description': 'Warm', 'category': 'outerwear',
+        'size': 'l', 'condition': 'good', 'points_value': 30, 'images': ['items/benchmark.jpg'],
+    }
+    return [
+        Scenario('api_root', 'get', '/api/', authenticated=False),
+        Scenario('auth_signup', 'post', '/api/auth/signup/', signup, authenticated=False),
+        Scenario('auth_login', 'post', '/api/auth/login/',
+                 {'email': ctx.actor.email, 'password': BENCHMARK_PASSWORD}, authenticated=False),
+        Scenario('profile_get', 'get', '/api/users/me/'),
+        Scenario('profile_update', 'put', '/api/users/me/', {'bio': 'Swapping since 2020'}),
+        Scenario('public_profile', 'get', f'/api/users/{ctx.other.user_id}/'),
+        Scenario('items_browse', 'get', '/api/items/'),
+        Scenario('items_browse_filtered', 'get', '/api/items/?category=tops&size=m'),
+        Scenario('items_search', 'get', '/api/items/?search=denim+jack'),
+        Scenario('items_browse_near', 'get', '/api/items/?near=18.5204,73.8567&radius_km=25'),
+        Scenario('items_create', 'post', '/api/items/', new_item),
+        Scenario('item_detail', 'get', f'/api/items/{ctx.other_item.item_id}/'),
+        Scenario('item_update', 'put', f'/api/items/{ctx.own_item.item_id}/', {'points_value': 25}),
+        Scenario('item_delete', 'delete', f'/api/items/{ctx.own_item.item_id}/'),
+        Scenario('my_items', 'get', '/api/users/me/items/'),
+        Scenario('swaps_list', 'get', '/api/swaps/'),
+        Scenario('swaps_create', 'post', '/api/swaps/', {
+            'requested_item_id': str(ctx.other_item.item_id), 'method': 'points', 'points_amount': 10,
+        }),
+        Scenario('swap_suggestions', 'get', '/api/swaps/suggestions/'),
+        Scenario('swap_detail', 'get', f'/api/swaps/{ctx.received_swap.transaction_id}/'),
+        Scenario('swap_accept', 'put', f'/api/swaps/{ctx.received_swap.transaction_id}/', {'action': 'accept'}),
+        Scenario('item_similar', 'get', f'/api/items/{ctx.other_item.item_id}/similar/'),
+        Scenario('item_like', 'post', f'/api/items/{ctx.other_item.item_id}/like/'),
+        Scenario('item_unlike', 'delete', f'/api/items/{ctx.other_item.item_id}/like/'),
+        Scenario('item_purchase', 'post', f'/api/items/{ctx.other_item.item_id}/purchase/',
+                 {'mode': 'points', 'points_used': 20}),
+        Scenario('rating_create', 'post', f'/api/users/{ctx.unrated.user_id}/rate/', {'rating': 5}),
+        Scenario('user_ratings', 'get', f'/api/users/{ctx.other.user_id}/ratings/'),
+        Scenario('image_upload', 'post', '/api/upload/images/', _upload_payload, format='multipart'),
+        # Without the watermark lag, so the freshly seeded rows are exported
+        Scenario('export_transactions', 'get', '/api/exports/transactions/', as_staff=True,
+                 settings={'EXPORT_WATERMARK_LAG': 0}),
+        Scenario('view_count_stats', 'get', '/api/metrics/view-counts/', as_staff=True),
+        Scenario('items_import', 'post', '/api/items/import/', _import_payload, format='multipart', as_staff=True),
+    ]
+
+
+# ===============================
+# Runner
+# ===============================
+
+def run_scenario(scenario, actor, iterations=20, warmup=2):
+    """
+    Run a scenario and return its measurements. Each request runs in a
+    transaction that is rolled back, so write scenarios are repeatable,
+    and the cache is cleared first so every request takes the full path.
+    Buffered views of the rolled-back request are dropped, and uploads go
+    to a temporary MEDIA_ROOT that is removed once the image workers are
+    done with it.
+    """
+    client = APIClient()
+    if scenario.authenticated:
+        client.force_authenticate(actor)
+
+    timings, query_counts, sizes, statuses = [], [], [], set()
+    media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+    try:
+        with override_settings(MEDIA_ROOT=media_root, **scenario.settings):
+            for run in range(warmup + iterations):
+                data = scenario.data() if callable(scenario.data) else scenario.data
+                cache.clear()
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        response = getattr(client, scenario.method)(scenario.path, data, format=scenario.format)
+                        # Streaming responses run their queries while being consumed
+                        content = b''.join(response.streaming_content) if response.streaming else response.content
+                        elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+                view_buffer.clear()
+
+                if run >= warmup:
+                    timings.append(elapsed * 1000)
+                    query_counts.append(len(queries.captured_queries))
+                    sizes.append(len(content))
+                    statuses.add(response.status_code)
+            # Variants are written after the response, so wait for them
+            # before MEDIA_ROOT is restored
+            shutdown_executor(wait=True)
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    return {
+        'status': sorted(statuses),
+        'queries': max(query_counts),
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'bytes': max(sizes),
+    }
+
+
+def run_benchmarks(ctx, iterations=20, warmup=2, only=None, log=None):
+    log = log or (lambda message: None)
+    results = {}
+    for scenario in build_scenarios(ctx):
+        if only and scenario.name not in only:
+            continue
+        actor = ctx.staff if scenario.as_staff else ctx.actor
+        results[scenario.name] = run_scenario(scenario, actor, iterations, warmup)
+        log(f"{scenario.name:<24} {results[scenario.name]}")
+    return results
+
+
+def compare_with_baseline(results, baseline, latency_tolerance=2.0, latency_slack_ms=5.0, size_tolerance=0.10):
+    """
+    Return human-readable regressions of results against a baseline.
+    Query counts must not grow, response sizes may grow by size_tolerance,
+    and p50/p95 may grow by latency_tolerance times plus latency_slack_ms
+    to absorb machine noise.
+    """
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        if actual['status'] != expected['status']:
+            regressions.append(f"{name}: status {actual['status']} (baseline {expected['status']})")
+        if actual['queries'] > expected['queries']:
+            regressions.append(f"{name}: {actual['queries']} queries (baseline {expected['queries']})")
+        if actual['bytes'] > expected['bytes'] * (1 + size_tolerance):
+            regressions.append(f"{name}: {actual['bytes']} bytes (baseline {expected['bytes']})")
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = expected[metric] * latency_tolerance + latency_slack_ms
+            if actual[metric] > limit:
+                regressions.append(f"{name}: {metric} {actual[metric]} (baseline {expected[metric]}, limit {limit:.2f})")
+    return regressions
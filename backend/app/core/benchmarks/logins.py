@@ -0,0 +1,58 @@
+"""
+Login throughput per password hasher, behind the benchmark_logins
+management command.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from ..models import User
+from . import BENCHMARK_PASSWORD, percentile
+
+
+def measure_logins(hasher, lean=True, users=20, duration=3.0):
+    """
+    Log in repeatedly from one thread for duration seconds, as a single
+    sync gunicorn worker would, with passwords hashed by ``hasher`` (a key
+    of PASSWORD_HASHER_CHOICES). Returns logins per second and latencies.
+    """
+    preferred = settings.PASSWORD_HASHER_CHOICES[hasher]
+    hashers = [preferred] + [path for path in settings.PASSWORD_HASHERS if path != preferred]
+    with override_settings(PASSWORD_HASHERS=hashers):
+        password = make_password(BENCHMARK_PASSWORD)
+        prefix = f'login-{hasher}-{uuid.uuid4().hex[:8]}'
+        accounts = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@bench.test', password=password,
+                 first_name='Login', last_name=str(i))
+            for i in range(users)
+        ])
+
+        client = APIClient()
+        url = '/api/auth/login/?lean=1' if lean else '/api/auth/login/'
+        timings, queries = [], 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            account = accounts[len(timings) % users]
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.post(url, {'email': account.email, 'password': BENCHMARK_PASSWORD})
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'Login failed with {response.status_code}: {response.content[:200]}')
+            queries = max(queries, len(captured.captured_queries))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'hasher': hasher,
+        'mode': 'lean' if lean else 'full',
+        'logins': len(timings),
+        'logins_per_s': round(len(timings) / elapsed, 1),
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
@@ -0,0 +1,146 @@
+"""
+Want graph benchmarks, behind the benchmark_swap_matching management
+command: a fixture of likes and swap requests, the graph build and
+GET /api/swaps/suggestions/.
+"""
+import random
+import time
+import tracemalloc
+from array import array
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..matching import build_want_graph, rebuild_want_graph
+from ..models import User, Item, Transaction, Like
+from . import BENCHMARK_PASSWORD, batches, percentile, random_uuid
+
+
+# Row counts of the want graph fixture at scale 1.0
+WANT_GRAPH_SCALE = {
+    'users': 50_000,
+    'items': 500_000,
+    'likes': 1_000_000,
+    'swap_requests': 100_000,
+}
+
+
+def seed_wants(scale=1.0, batch_size=5000, random_seed=1, log=None):
+    """
+    Bulk-insert what the want graph reads, scaled from WANT_GRAPH_SCALE:
+    users, items (70% available), likes and pending swap requests. Item
+    popularity is skewed, so a few items are wanted by many users.
+    Images are left out and likes_count is not maintained, since matching
+    reads neither. Returns the seeded user pks.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    counts = {name: max(10, int(total * scale)) for name, total in WANT_GRAPH_SCALE.items()}
+    password = make_password(BENCHMARK_PASSWORD)
+
+    log(f"Seeding {counts['users']} users...")
+    users = (
+        User(username=f'want{i}', email=f'want{i}@rewear.test', password=password, first_name='Want', last_name=str(i))
+        for i in range(counts['users'])
+    )
+    for batch in batches(users, batch_size):
+        User.objects.bulk_create(batch)
+    user_ids = list(User.objects.filter(username__startswith='want').values_list('pk', flat=True))
+
+    log(f"Seeding {counts['items']} items...")
+    item_ids = [random_uuid(rng) for _ in range(counts['items'])]
+    uploaders = array('I', (rng.choice(user_ids) for _ in item_ids))
+    items = (
+        Item(
+            item_id=item_id, uploader_id=uploader, title=f'Wanted Item {i}', description='Gently used',
+            category='tops', size='m', condition='good', points_value=20,
+            status='available' if rng.random() < 0.7 else 'swapped',
+        )
+        for i, (item_id, uploader) in enumerate(zip(item_ids, uploaders))
+    )
+    for batch in batches(items, batch_size):
+        Item.objects.bulk_create(batch)
+
+    def popular_item():
+        return int(len(item_ids) * rng.random() ** 3)
+
+    log(f"Seeding {counts['likes']} likes...")
+    per_user = counts['likes'] // len(user_ids)
+
+    def likes():
+        for user_id in user_ids:
+            for index in {popular_item() for _ in range(rng.randint(0, 2 * per_user))}:
+                yield Like(like_id=random_uuid(rng), user_id=user_id, item_id=item_ids[index])
+    for batch in batches(likes(), batch_size):
+        Like.objects.bulk_create(batch)
+
+    log(f"Seeding {counts['swap_requests']} swap requests...")
+    requests = (
+        Transaction(
+            transaction_id=random_uuid(rng), sender_id=sender, receiver_id=uploaders[index],
+            item_id=item_ids[index], method='swap', status='pending',
+        )
+        for sender, index in ((rng.choice(user_ids), popular_item()) for _ in range(counts['swap_requests']))
+        if sender != uploaders[index]
+    )
+    for batch in batches(requests, batch_size):
+        Transaction.objects.bulk_create(batch)
+    log('Seeding done.')
+    return user_ids
+
+
+def benchmark_matching(user_ids, samples=200, repeat=3, random_seed=1, log=None):
+    """
+    Build the want graph repeat times, keeping the fastest, then trace the
+    peak memory of one more build with tracemalloc, and time
+    GET /api/swaps/suggestions/ for `samples` random users once this
+    process's graph is loaded
+    """
+    log = log or (lambda message: None)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        graph = build_want_graph()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        build_want_graph()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    results = {'build': {
+        'users': graph.size - 1,
+        'edges': graph.edges,
+        'graph_mb': round(graph.nbytes / 2 ** 20, 1),
+        'peak_mb': round(peak / 2 ** 20, 1),
+        'build_ms': round(min(timings), 1),
+    }}
+    log(f"build        {results['build']}")
+
+    rebuild_want_graph()
+    client = APIClient()
+    rng = random.Random(random_seed)
+    users = User.objects.in_bulk(rng.sample(user_ids, min(samples, len(user_ids))))
+    timings, queries, found = [], 0, []
+    for user in users.values():
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get('/api/swaps/suggestions/')
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'Suggestions failed with {response.status_code}: {response.content[:200]}')
+        queries = max(queries, len(captured.captured_queries))
+        found.append(response.json()['count'])
+    results['suggestions'] = {
+        'users': len(found),
+        'with_matches': sum(1 for count in found if count),
+        'mean_results': round(sum(found) / max(1, len(found)), 1),
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+    log(f"suggestions  {results['suggestions']}")
+    return results
@@ -0,0 +1,116 @@
+"""
+Similar items benchmarks, behind the benchmark_similar_items management
+command: a fixture of items with varied features, the full rebuild, the
+incremental refresh and GET /api/items/<id>/similar/.
+"""
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..models import User, Item
+from ..recommendations import rebuild_similar_items, refresh_similar_items
+from . import BENCHMARK_PASSWORD, batches, percentile, random_uuid
+
+
+SIMILAR_ITEM_BRANDS = ['Levis', 'Zara', 'H&M', 'Uniqlo', 'Nike', 'Adidas', 'Mango', 'Gap', None]
+SIMILAR_ITEM_COLORS = ['black', 'white', 'blue', 'red', 'green', 'beige', 'grey', 'pink', None]
+SIMILAR_ITEM_TAGS = [
+    'vintage', 'casual', 'summer', 'winter', 'office', 'party', 'denim', 'cotton', 'wool', 'linen',
+    'oversized', 'slim', 'retro', 'boho', 'sporty', 'floral', 'striped', 'plain', 'leather', 'silk',
+]
+
+
+def _similar_item_rows(rng, count, user_ids):
+    categories = [choice for choice, _ in Item.ITEM_CATEGORIES]
+    sizes = [choice for choice, _ in Item.ITEM_SIZES]
+    conditions = [choice for choice, _ in Item.ITEM_CONDITIONS]
+    for i in range(count):
+        yield Item(
+            item_id=random_uuid(rng), uploader_id=rng.choice(user_ids), title=f'Similar Item {i}',
+            description='Gently used', category=rng.choice(categories), size=rng.choice(sizes),
+            condition=rng.choice(conditions), brand=rng.choice(SIMILAR_ITEM_BRANDS),
+            color=rng.choice(SIMILAR_ITEM_COLORS), tags=','.join(rng.sample(SIMILAR_ITEM_TAGS, rng.randint(0, 4))),
+            points_value=rng.randint(5, 200),
+        )
+
+
+def seed_similar_items(items=100_000, batch_size=5000, random_seed=1, log=None):
+    """
+    Bulk-insert available items with varied features, one uploader per 50
+    items, for the similar items benchmark. Returns the uploader pks.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    password = make_password(BENCHMARK_PASSWORD)
+    users = (
+        User(username=f'similar{i}', email=f'similar{i}@rewear.test', password=password, first_name='Similar', last_name=str(i))
+        for i in range(max(1, items // 50))
+    )
+    for batch in batches(users, batch_size):
+        User.objects.bulk_create(batch)
+    user_ids = list(User.objects.filter(username__startswith='similar').values_list('pk', flat=True))
+
+    log(f'Seeding {items} items...')
+    for batch in batches(_similar_item_rows(rng, items, user_ids), batch_size):
+        Item.objects.bulk_create(batch)
+    return user_ids
+
+
+def benchmark_similar_items(user_ids, new_items=1000, samples=100, repeat=3, random_seed=1, log=None):
+    """
+    Time a full rebuild (fastest of repeat, plus one run traced with
+    tracemalloc for peak memory), an incremental refresh after listing
+    new_items more items, and GET /api/items/<id>/similar/ for samples items
+    """
+    log = log or (lambda message: None)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = rebuild_similar_items()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        rebuild_similar_items()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    results = {'rebuild': {
+        'items': items,
+        'rebuild_ms': round(min(timings), 1),
+        'per_100k_ms': round(min(timings) * 100_000 / max(1, items), 1),
+        'peak_mb': round(peak / 2 ** 20, 1),
+    }}
+    log(f"rebuild   {results['rebuild']}")
+
+    # A different seed than seed_similar_items(), so the new item ids are too
+    rng = random.Random(random_seed + 1)
+    Item.objects.bulk_create(list(_similar_item_rows(rng, new_items, user_ids)))
+    start = time.perf_counter()
+    refreshed = refresh_similar_items()
+    results['refresh'] = {'new_items': refreshed, 'refresh_ms': round((time.perf_counter() - start) * 1000, 1)}
+    log(f"refresh   {results['refresh']}")
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user_ids[0]))
+    sample = Item.objects.filter(status='available').order_by('?').values_list('pk', flat=True)[:samples]
+    timings, queries = [], 0
+    for item_id in sample:
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(f'/api/items/{item_id}/similar/')
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200 or not response.json()['precomputed']:
+            raise RuntimeError(f'Similar items failed with {response.status_code}: {response.content[:200]}')
+        queries = max(queries, len(captured.captured_queries))
+    results['similar'] = {
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+    log(f"similar   {results['similar']}")
+    return results
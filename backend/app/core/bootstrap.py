@@ -0,0 +1,104 @@
+"""
+Deploy-time database bootstrap, run once per container boot by the
+bootstrap management command (entrypoint.sh).
+
+In one process it checks the schema, applies pending migrations and
+provisions the admin account. On an up-to-date database this is a handful
+of queries however many users exist: the migration plan comes from the
+django_migrations table, and ``migrate`` (with its post-migrate permission
+and content type sync) only runs when something is pending. The admin is
+updated only when it differs from the configured account, so a redeploy
+does not rewrite the password or revoke the admin's tokens.
+"""
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from .models import User
+
+
+def is_fresh_database(using=DEFAULT_DB_ALIAS):
+    """Whether the database has no tables yet"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        return not connection.introspection.table_names(cursor)
+
+
+def pending_migrations(using=DEFAULT_DB_ALIAS):
+    """Migrations not yet applied, as (app_label, name) pairs"""
+    executor = MigrationExecutor(connections[using])
+    targets = executor.loader.graph.leaf_nodes()
+    return [(migration.app_label, migration.name) for migration, _ in executor.migration_plan(targets)]
+
+
+def migrate(using=DEFAULT_DB_ALIAS, log=None):
+    """
+    Apply pending migrations. On an existing database that predates the
+    custom user model, a failed run is retried with --fake-initial.
+    """
+    log = log or (lambda message: None)
+    fresh = is_fresh_database(using)
+    pending = [] if fresh else pending_migrations(using)
+    if not fresh and not pending:
+        log('No pending migrations')
+        return []
+
+    log('Fresh database, applying all migrations' if fresh else f'Applying {len(pending)} migrations')
+    try:
+        call_command('migrate', database=using, interactive=False, verbosity=0)
+    except Exception as e:
+        if fresh:
+            raise
+        log(f'Migration conflict ({e}), retrying with --fake-initial')
+        call_command('migrate', database=using, interactive=False, verbosity=0, fake_initial=True)
+    return pending
+
+
+def provision_admin(email, password, username='admin'):
+    """
+    Make sure the admin account exists with this email and password and
+    staff/superuser rights. Returns 'created', 'updated' or 'unchanged'.
+    """
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        User.objects.create_superuser(
+            username=username, email=email, password=password, first_name='Admin', last_name='User',
+        )
+        return 'created'
+
+    changed = []
+    if not (user.is_staff and user.is_superuser):
+        user.is_staff = user.is_superuser = True
+        changed += ['is_staff', 'is_superuser']
+    if user.email != email:
+        user.email = email
+        changed.append('email')
+    if not user.check_password(password):
+        user.set_password(password)
+        changed.append('password')
+    if not changed:
+        return 'unchanged'
+    user.save(update_fields=changed)
+    return 'updated'
+
+
+def remove_users(usernames):
+    """Delete retired accounts by username; returns how many were deleted"""
+    if not usernames:
+        return 0
+    _, deleted = User.objects.filter(username__in=usernames).delete()
+    return deleted.get(User._meta.label, 0)
+
+
+def bootstrap(migrate_database=True, log=None):
+    """Run every deploy-time step; see the module docstring"""
+    log = log or (lambda message: None)
+    if migrate_database:
+        migrate(log=log)
+
+    removed = remove_users(settings.BOOTSTRAP_REMOVED_USERNAMES)
+    if removed:
+        log(f'Removed {removed} retired accounts')
+    status = provision_admin(settings.BOOTSTRAP_ADMIN_EMAIL, settings.BOOTSTRAP_ADMIN_PASSWORD)
+    log(f'Admin {settings.BOOTSTRAP_ADMIN_EMAIL} {status}')
@@ -0,0 +1,172 @@
+"""
+Response cache for the item browse feed.
+
+Pages are cached under a key built from the normalized filter parameters
+and a generation number. Writes to an available item bump the generation
+of its category and the global generation, which orphans every cached
+page that could contain it; untouched categories stay cached.
+
+Generations live in the cache, so invalidation reaches every worker only
+through a shared cache (Redis, REDIS_URL). With the per-process
+local-memory cache each worker would keep serving pages another worker
+invalidated, so BROWSE_CACHE_TIMEOUT defaults to 0 (off) without Redis.
+
+Browse leaves out the requester's own items. Users with no listed items
+(User.items_listed) have nothing to leave out and share one set of pages;
+a user with listings gets pages built without their items and cached
+under their own keys, so pages stay full and ``count`` excludes them.
+is_liked flags are applied to the cached payload after the lookup, as is
+a last pass over own items for a user whose items_listed is stale. Like
+counts are not invalidated and may lag by up to BROWSE_CACHE_TIMEOUT. The
+a-prefixed helpers are the async equivalents used by the async browse
+view.
+
+Pages are built from the primary even when the request reads from a
+replica: a page built from a lagging replica right after an invalidation
+would be cached under the new generation and served to everyone.
+"""
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Like
+from .replicas import primary_reads
+
+
+BROWSE_CACHE_PARAMS = (
+    'category', 'size', 'condition', 'min_points', 'max_points',
+    'search', 'near', 'radius_km', 'cursor', 'page_size', 'count',
+)
+
+ALL_CATEGORIES = '*'
+
+
+def _generation_key(category):
+    return f'browse:gen:{category or ALL_CATEGORIES}'
+
+
+def get_generation(category=None):
+    """Current generation for a category, or for the unfiltered feed"""
+    return cache.get_or_set(_generation_key(category), 1, None)
+
+
+async def aget_generation(category=None):
+    return await cache.aget_or_set(_generation_key(category), 1, None)
+
+
+def bump_generation(category=None):
+    key = _generation_key(category)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+        cache.incr(key)
+
+
+def _bump_generations(categories):
+    for category in categories:
+        bump_generation(category)
+
+
+def invalidate_browse_cache(*categories):
+    """
+    Invalidate cached browse pages that may contain items in categories.
+    Inside a transaction the bump is repeated on commit, so a page cached
+    by a concurrent reader before the commit does not survive it.
+    """
+    categories = {category for category in categories if category} | {ALL_CATEGORIES}
+    _bump_generations(categories)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump_generations(categories))
+
+
+def browse_owner(user):
+    """
+    The user whose items a browse page is built without: the requester when
+    they have listed items, otherwise None and the page is shared
+    """
+    return user if getattr(user, 'items_listed', 0) > 0 else None
+
+
+def browse_cache_key(request, generation=None, owner=None):
+    """Cache key for a browse request, shared by every user but owner (see browse_owner())"""
+    params = sorted(
+        (name, request.query_params.get(name))
+        for name in BROWSE_CACHE_PARAMS
+        if request.query_params.get(name)
+    )
+    category = request.query_params.get('category')
+    if generation is None:
+        generation = get_generation(category or ALL_CATEGORIES)
+    # Absolute URLs in the payload depend on scheme and host
+    digest = hashlib.sha1(
+        json.dumps([request.build_absolute_uri('/'), params]).encode()
+    ).hexdigest()
+    owner_id = owner.pk if owner is not None else 'shared'
+    return f'browse:page:{category or ALL_CATEGORIES}:{generation}:{owner_id}:{digest}'
+
+
+def _build_on_primary(build_page):
+    with primary_reads():
+        return build_page()
+
+
+def get_cached_browse_page(request, build_page, owner=None):
+    """Return the cached browse payload for request, building it on a miss"""
+    if not settings.BROWSE_CACHE_TIMEOUT:
+        return build_page()
+
+    key = browse_cache_key(request, owner=owner)
+    payload = cache.get(key)
+    if payload is None:
+        payload = _build_on_primary(build_page)
+        cache.set(key, payload, settings.BROWSE_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_cached_browse_page(request, build_page, owner=None):
+    """Async get_cached_browse_page; build_page is synchronous and runs in a worker thread"""
+    if not settings.BROWSE_CACHE_TIMEOUT:
+        return await sync_to_async(build_page)()
+
+    generation = await aget_generation(request.query_params.get('category') or ALL_CATEGORIES)
+    key = browse_cache_key(request, generation, owner)
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await sync_to_async(_build_on_primary)(build_page)
+        await cache.aset(key, payload, settings.BROWSE_CACHE_TIMEOUT)
+    return payload
+
+
+def exclude_own_items(payload, user):
+    """
+    Drop the requesting user's own items from a shared browse payload. Only
+    finds any when items_listed lagged behind a first listing (the page is
+    then short, with next_cursor and count unchanged).
+    """
+    user_id = str(user.user_id)
+    results = [row for row in payload['results'] if str(row['uploader']['user_id']) != user_id]
+    if len(results) == len(payload['results']):
+        return payload
+    return {**payload, 'results': results}
+
+
+def mark_liked_items(payload, user):
+    """Set is_liked on a shared browse payload for the requesting user"""
+    return _mark_liked(payload, Like.liked_item_ids(user, [row['item_id'] for row in payload['results']]))
+
+
+async def amark_liked_items(payload, user):
+    return _mark_liked(payload, await Like.aliked_item_ids(user, [row['item_id'] for row in payload['results']]))
+
+
+def _mark_liked(payload, liked):
+    liked = {str(pk) for pk in liked}
+    if not liked:
+        return payload
+    results = [{**row, 'is_liked': True} if str(row['item_id']) in liked else row for row in payload['results']]
+    return {**payload, 'results': results}
@@ -0,0 +1,181 @@
+"""
+Streaming table exports for analytics.
+
+Each export reads one table with ``values_list().iterator(chunk_size=...)``
+(a server-side cursor on PostgreSQL) and encodes rows as NDJSON or CSV as
+they arrive, optionally gzipped, so memory stays flat however large the
+table is. Used by the export_data management command and ExportView.
+Under ASGI, ExportView streams through aiter_chunks(); a plain iterator
+would be read into a list by Django's ASGI handler before sending.
+
+Rows are ordered by (updated_at, pk) and bounded by a watermark taken when
+the export starts: pass that watermark as ``since`` to fetch only rows
+changed afterwards. updated_at is stamped when a row is saved, before its
+transaction commits, so the watermark trails the clock by
+EXPORT_WATERMARK_LAG seconds; rows still uncommitted then would otherwise
+fall behind a later ``since`` and never be exported. Counters written with
+queryset updates (user stats, likes, views) do not touch updated_at, so
+only a full export refreshes them. Personal fields (passwords, emails,
+phone numbers, names, swap messages) are not exported.
+"""
+import csv
+import datetime
+import zlib
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import User, Item, Transaction, Rating
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    model: type
+    fields: tuple
+
+
+EXPORTS = {
+    'items': ExportSpec(Item, (
+        'item_id', 'uploader_id', 'title', 'description', 'category', 'type', 'size', 'condition',
+        'tags', 'status', 'brand', 'color', 'points_value', 'likes_count', 'views_count',
+        'created_at', 'updated_at',
+    )),
+    'transactions': ExportSpec(Transaction, (
+        'transaction_id', 'sender_id', 'receiver_id', 'item_id', 'method', 'status', 'points_amount',
+        'created_at', 'updated_at', 'completed_at',
+    )),
+    'ratings': ExportSpec(Rating, (
+        'rating_id', 'rater_id', 'rated_user_id', 'transaction_id', 'rating',
+        'created_at', 'updated_at',
+    )),
+    'users': ExportSpec(User, (
+        'id', 'user_id', 'role', 'is_active', 'is_suspended', 'location', 'points_balance',
+        'total_swaps', 'items_listed', 'completed_swaps', 'ongoing_swaps', 'rating_count', 'rating_sum',
+        'date_joined', 'created_at', 'updated_at',
+    )),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Encoded rows are yielded in pieces of about this many bytes
+OUTPUT_CHUNK_BYTES = 64 * 1024
+
+
+class ExportError(ValueError):
+    pass
+
+
+def export_rows(table, since=None, until=None):
+    """Iterate (fields, row tuples) of table changed in (since, until]"""
+    try:
+        spec = EXPORTS[table]
+    except KeyError:
+        raise ExportError(f"Unknown table '{table}'; choose from {', '.join(EXPORTS)}")
+
+    queryset = spec.model._default_manager.order_by('updated_at', 'pk')
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    if until is not None:
+        queryset = queryset.filter(updated_at__lte=until)
+    return spec.fields, queryset.values_list(*spec.fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+# ===============================
+# Encoders
+# ===============================
+
+def _ndjson_lines(fields, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+class _LineBuffer:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(fields, rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _chunked(lines):
+    """Join encoded lines into byte chunks of about OUTPUT_CHUNK_BYTES"""
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode()
+        parts.append(data)
+        size += len(data)
+        if size >= OUTPUT_CHUNK_BYTES:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(table, fmt='ndjson', since=None, until=None, compress=False):
+    """Return an iterator of encoded byte chunks for one table export"""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'; choose from {', '.join(FORMATS)}")
+    fields, rows = export_rows(table, since=since, until=until)
+    lines = _ndjson_lines(fields, rows) if fmt == 'ndjson' else _csv_lines(fields, rows)
+    chunks = _chunked(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+async def aiter_chunks(chunks):
+    """
+    Async iterator over a sync export, reading one chunk per thread hop so
+    an ASGI response stays constant-memory
+    """
+    chunks = iter(chunks)
+    read = sync_to_async(next)
+    try:
+        while (chunk := await read(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Releases the cursor when the client disconnects early
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def parse_since(value):
+    """Parse an ISO 8601 ``since`` watermark; naive values are taken as UTC"""
+    parsed = parse_datetime(value or '')
+    if parsed is None:
+        raise ExportError(f"Invalid since '{value}'; use an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def watermark():
+    """Upper bound for an export starting now; the next export's ``since``"""
+    return timezone.now() - datetime.timedelta(seconds=settings.EXPORT_WATERMARK_LAG)
+
+
+def format_watermark(value):
+    """ISO 8601 in UTC with a Z suffix, safe to paste into a query string"""
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
@@ -0,0 +1,227 @@
+"""
+Offline geocoding and the geohash index behind ``/api/items/?near=``.
+
+User.location is free text. It is resolved against the gazetteer shipped
+at GEOCODER_GAZETTEER (a CSV of place names and coordinates), so no
+network call is made: the whole text is looked up first, then each of
+its comma separated parts, e.g. "Koregaon Park, Pune" resolves to Pune.
+User.save() stores the coordinates and their geohash.
+
+A geohash interleaves the bits of longitude and latitude into base 32
+characters, so every prefix is a grid cell and the cells of a prefix
+share it. A radius search covers the circle's bounding box with at most
+GEO_MAX_COVER_CELLS cells, at the finest precision that allows, and turns
+them into ``geohash >= cell AND geohash < next cell`` ranges that a plain
+B-tree index answers on PostgreSQL and SQLite alike. The exact distance
+test then runs in SQL on the rows of those cells, with an equirectangular
+approximation that only needs arithmetic; it is within 1% of the great
+circle distance up to GEO_MAX_RADIUS_KM. Coordinates are clamped rather
+than wrapped at the antimeridian.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Characters stored in User.geohash, about 38 x 19 m per cell
+GEOHASH_PRECISION = 8
+
+KM_PER_DEGREE = 111.195
+
+GEO_MAX_COVER_CELLS = 16
+
+NON_WORD_RE = re.compile(r'[^\w,]+')
+
+
+class InvalidLocation(ValueError):
+    """Raised when a client sends near or radius_km that cannot be used"""
+
+
+# ===============================
+# Gazetteer
+# ===============================
+
+def normalize_place(text):
+    """Lowercase text with punctuation other than commas collapsed to single spaces"""
+    return ' '.join(NON_WORD_RE.sub(' ', text.lower()).split())
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path):
+    """Normalized place name -> (latitude, longitude) from a gazetteer CSV"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        return {
+            normalize_place(row['name']): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(handle)
+        }
+
+
+def geocode(location):
+    """``(latitude, longitude)`` of a free text location, or None if it is not in the gazetteer"""
+    if not location:
+        return None
+    gazetteer = load_gazetteer(str(settings.GEOCODER_GAZETTEER))
+    text = normalize_place(location)
+    for candidate in (text.replace(',', ' '), *text.split(',')):
+        candidate = ' '.join(candidate.split())
+        if candidate in gazetteer:
+            return gazetteer[candidate]
+    return None
+
+
+def locate(location):
+    """``(latitude, longitude, geohash)`` of a location, all None if it is not in the gazetteer"""
+    point = geocode(location)
+    if point is None:
+        return None, None, None
+    return (*point, encode_geohash(*point))
+
+
+def geocode_users(users, batch_size=1000):
+    """Re-resolve the location of every user in a queryset; returns how many changed"""
+    fields = ('latitude', 'longitude', 'geohash')
+    changed = []
+    total = 0
+    for user in users.only('pk', 'location', *fields).iterator(chunk_size=batch_size):
+        located = locate(user.location)
+        if located != tuple(getattr(user, name) for name in fields):
+            for name, value in zip(fields, located):
+                setattr(user, name, value)
+            changed.append(user)
+        if len(changed) >= batch_size:
+            users.model.objects.bulk_update(changed, fields)
+            total += len(changed)
+            changed = []
+    if changed:
+        users.model.objects.bulk_update(changed, fields)
+        total += len(changed)
+    return total
+
+
+# ===============================
+# Geohash
+# ===============================
+
+def _bits(precision):
+    """(latitude bits, longitude bits) of a geohash; longitude takes the first bit"""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def _cell_index(value, low, high, bits):
+    cells = 1 << bits
+    return min(cells - 1, max(0, int((value - low) / (high - low) * cells)))
+
+
+def _interleave(lat_index, lon_index, precision):
+    """Geohash of the cell at (lat_index, lon_index) of the grid at precision"""
+    lat_bits, lon_bits = _bits(precision)
+    value = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((lon_index >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((lat_index >> lat_bits) & 1)
+    return ''.join(
+        GEOHASH_ALPHABET[(value >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5)
+    )
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_bits, lon_bits = _bits(precision)
+    return _interleave(
+        _cell_index(latitude, -90.0, 90.0, lat_bits),
+        _cell_index(longitude, -180.0, 180.0, lon_bits),
+        precision,
+    )
+
+
+def next_prefix(prefix):
+    """The smallest string above every string starting with prefix, None if there is none"""
+    prefix = prefix.rstrip(GEOHASH_ALPHABET[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(prefix[-1]) + 1]
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, west, north, east) around a circle, clamped to valid coordinates"""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(89.0, abs(latitude) + dlat)))
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    return (
+        max(-90.0, latitude - dlat), max(-180.0, longitude - dlon),
+        min(90.0, latitude + dlat), min(180.0, longitude + dlon),
+    )
+
+
+def cover_cells(latitude, longitude, radius_km, max_cells=GEO_MAX_COVER_CELLS):
+    """
+    Sorted geohash cells covering a circle's bounding box, at the finest
+    precision up to GEOHASH_PRECISION needing at most max_cells cells
+    """
+    south, west, north, east = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_bits, lon_bits = _bits(precision)
+        rows = range(_cell_index(south, -90.0, 90.0, lat_bits), _cell_index(north, -90.0, 90.0, lat_bits) + 1)
+        columns = range(_cell_index(west, -180.0, 180.0, lon_bits), _cell_index(east, -180.0, 180.0, lon_bits) + 1)
+        if len(rows) * len(columns) <= max_cells or precision == 1:
+            return sorted(_interleave(row, column, precision) for row in rows for column in columns)
+
+
+def cover_ranges(cells):
+    """Merge sorted cells into ``[(low, high)]`` string ranges; high is None when unbounded"""
+    ranges = []
+    for cell in cells:
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], next_prefix(cell))
+        else:
+            ranges.append((cell, next_prefix(cell)))
+    return ranges
+
+
+# ===============================
+# Radius Queries
+# ===============================
+
+def parse_near(near, radius_km=None):
+    """``(latitude, longitude, radius_km)`` from the near and radius_km query parameters"""
+    try:
+        latitude, longitude = (float(part) for part in near.split(','))
+        radius_km = float(radius_km) if radius_km else settings.GEO_DEFAULT_RADIUS_KM
+    except ValueError:
+        raise InvalidLocation('near must be "latitude,longitude" and radius_km a number')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise InvalidLocation('near is outside valid coordinates')
+    if not 0 < radius_km <= settings.GEO_MAX_RADIUS_KM:
+        raise InvalidLocation(f'radius_km must be above 0 and at most {settings.GEO_MAX_RADIUS_KM}')
+    return latitude, longitude, radius_km
+
+
+def filter_near(queryset, latitude, longitude, radius_km, prefix=''):
+    """
+    Rows of queryset whose coordinates, at ``<prefix>latitude`` etc., are
+    within radius_km of a point; rows without coordinates are excluded
+    """
+    in_cells = Q()
+    for low, high in cover_ranges(cover_cells(latitude, longitude, radius_km)):
+        bounds = {f'{prefix}geohash__gte': low}
+        if high is not None:
+            bounds[f'{prefix}geohash__lt'] = high
+        in_cells |= Q(**bounds)
+
+    # Squared distance in degrees of latitude
+    dlat = F(f'{prefix}latitude') - Value(latitude)
+    dlon = (F(f'{prefix}longitude') - Value(longitude)) * Value(math.cos(math.radians(latitude)))
+    distance = ExpressionWrapper(dlat * dlat + dlon * dlon, output_field=FloatField())
+    return queryset.filter(in_cells).alias(near_distance=distance).filter(
+        near_distance__lte=(radius_km / KM_PER_DEGREE) ** 2
+    )
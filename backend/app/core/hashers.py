@@ -0,0 +1,34 @@
+"""
+Password hashers whose cost parameters come from settings.
+
+PASSWORD_HASHER selects the hasher for new passwords (argon2, bcrypt or
+pbkdf2). The others stay in PASSWORD_HASHERS so existing hashes still
+verify, and Django rehashes a password with the preferred hasher and
+current parameters on the next successful login (see User.check_password).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, BCryptSHA256PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with ARGON2_TIME_COST, ARGON2_MEMORY_COST (KiB) and ARGON2_PARALLELISM"""
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """bcrypt with BCRYPT_ROUNDS, applied to a SHA-256 digest of the password"""
+
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
@@ -0,0 +1,233 @@
+"""
+Image processing for item uploads.
+
+submit_upload() writes an EXIF-stripped copy of the original before it
+returns, so a stored upload survives a failed resize or a restart. Resized
+variants in WebP (and AVIF when Pillow supports it) are generated by a
+worker pool; at most IMAGE_PROCESSING_MAX_PENDING uploads wait for it, and
+beyond that the caller generates the variants itself. Variant names are
+derived from the original's name, so serializers build srcsets and point
+feeds at a small variant without extra queries. Until every variant is
+written they serve the original instead: variants_ready() asks storage
+and caches the answer once it is yes. The generate_image_variants command
+fills in variants that were lost.
+"""
+import io
+import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Upload names look like items/<uuid>.<ext>, or items/<uuid>_<7 characters>.<ext>
+# when storage had to pick another name
+UPLOAD_NAME_RE = re.compile(
+    r'(items/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(?:_[0-9A-Za-z]{7})?)\.\w+$'
+)
+
+# Cache key marking an upload whose variants have all been written
+VARIANTS_READY_KEY = 'image-variants-ready:{}'
+VARIANTS_READY_TIMEOUT = 24 * 60 * 60
+
+
+def variant_formats():
+    """Formats to generate variants in, best compression first"""
+    Image.init()
+    formats = ['webp']
+    if 'AVIF' in Image.SAVE:
+        formats.insert(0, 'avif')
+    return formats
+
+
+def variant_name(name, width, fmt):
+    """Storage name of a resized variant, or None for non-upload names"""
+    match = UPLOAD_NAME_RE.search(name or '')
+    if not match:
+        return None
+    return f'{match.group(1)}_{width}.{fmt}'
+
+
+def variants_ready(name):
+    """Whether every variant of a stored upload has been written"""
+    if variant_name(name, settings.IMAGE_FEED_WIDTH, 'webp') is None:
+        return False
+    key = VARIANTS_READY_KEY.format(name)
+    if cache.get(key):
+        return True
+    if missing_variants(name):
+        return False
+    cache.set(key, True, VARIANTS_READY_TIMEOUT)
+    return True
+
+
+def _srcset(name, fmt):
+    return ', '.join(
+        f'{default_storage.url(variant_name(name, width, fmt))} {width}w'
+        for width in settings.IMAGE_VARIANT_WIDTHS
+    )
+
+
+def build_srcset(name, fmt='webp'):
+    """HTML srcset of an upload's variants in fmt, or '' until they have been written"""
+    if not variants_ready(name):
+        return ''
+    return _srcset(name, fmt)
+
+
+def build_sources(name):
+    """
+    ``[{'type', 'srcset'}]`` for the <source> elements of a <picture>, one
+    per variant format with the best compression first, or [] until the
+    variants have been written
+    """
+    if not variants_ready(name):
+        return []
+    return [{'type': f'image/{fmt}', 'srcset': _srcset(name, fmt)} for fmt in variant_formats()]
+
+
+# ===============================
+# Processing
+# ===============================
+
+def original_extension(fmt):
+    """Extension an upload in Pillow format fmt is stored under; formats Pillow cannot write become PNG"""
+    Image.init()
+    if fmt not in Image.SAVE:
+        return 'png'
+    return {'JPEG': 'jpg', 'MPO': 'jpg'}.get(fmt, fmt.lower())
+
+
+def save_original(name, data):
+    """
+    Write the EXIF-stripped original of an upload; returns the name storage
+    saved it under, which differs from name if that was taken, and its
+    encoded bytes
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        original_format = source.format or 'JPEG'
+        # Bake the EXIF orientation into the pixels, then drop all metadata
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    # Pillow only writes EXIF/XMP when passed explicitly on save
+    image.info = {}
+    # Formats Pillow reads but cannot write are stored as PNG (see original_extension)
+    Image.init()
+    fmt = original_format if original_format in Image.SAVE else 'PNG'
+    if fmt in ('JPEG', 'MPO') and image.mode == 'RGBA':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=90)
+    return default_storage.save(name, ContentFile(buffer.getvalue())), buffer.getvalue()
+
+
+def process_variants(name, data):
+    """Write every resized variant of a stored original, given its bytes"""
+    with Image.open(io.BytesIO(data)) as source:
+        image = source.convert('RGBA' if source.mode == 'RGBA' else 'RGB')
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4))
+        for fmt in variant_formats():
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=settings.IMAGE_VARIANT_QUALITY)
+            # Serializers derive variant names, so one left by an earlier
+            # run is replaced rather than saved next to
+            variant = variant_name(name, width, fmt)
+            default_storage.delete(variant)
+            stored = default_storage.save(variant, ContentFile(buffer.getvalue()))
+            if stored != variant:
+                raise OSError(f'Storage saved {variant} as {stored}')
+    cache.set(VARIANTS_READY_KEY.format(name), True, VARIANTS_READY_TIMEOUT)
+    return name
+
+
+def missing_variants(name):
+    """Whether any variant of a stored upload is missing"""
+    return any(
+        not default_storage.exists(variant_name(name, width, fmt))
+        for width in settings.IMAGE_VARIANT_WIDTHS for fmt in variant_formats()
+    )
+
+
+def regenerate_variants(name):
+    """Generate the variants of a stored original again"""
+    with default_storage.open(name) as f:
+        return process_variants(name, f.read())
+
+
+_executor = None
+_pending = 0
+_executor_lock = threading.Lock()
+# Separate from _executor_lock, which shutdown_executor() holds while
+# workers finish and release their slots
+_pending_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='image-processing',
+            )
+        return _executor
+
+
+def shutdown_executor(wait=True):
+    """Stop the worker pool, optionally waiting for queued uploads"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def _reserve():
+    """Take a queue slot, or return False when IMAGE_PROCESSING_MAX_PENDING uploads are waiting"""
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.IMAGE_PROCESSING_MAX_PENDING:
+            return False
+        _pending += 1
+        return True
+
+
+def _finished(future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+    if future.exception():
+        logger.error('Image processing failed', exc_info=future.exception())
+
+
+def submit_upload(name, data):
+    """
+    Write the sanitized original of an upload now and queue its variants;
+    returns the name the original was stored under and a Future of it.
+    With IMAGE_PROCESSING_WORKERS = 0, or when the queue is full, the
+    variants are generated inline.
+    """
+    name, original = save_original(name, data)
+    if not settings.IMAGE_PROCESSING_WORKERS or not _reserve():
+        future = Future()
+        try:
+            future.set_result(process_variants(name, original))
+        except Exception as e:
+            logger.error('Image processing failed', exc_info=e)
+            future.set_exception(e)
+        return name, future
+
+    future = get_executor().submit(process_variants, name, original)
+    future.add_done_callback(_finished)
+    return name, future
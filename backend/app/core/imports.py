@@ -0,0 +1,323 @@
+"""
+Bulk item import for community drives.
+
+Rows come from CSV or NDJSON with the ItemCreateSerializer fields plus an
+optional ``uploader`` email (defaulting to the importing user); in CSV,
+``images`` separates references with ``|``. Rows are validated with one
+reused serializer and written in batches: each batch resolves uploaders
+with one query and inserts items and images with bulk_create in its own
+transaction. bulk_create skips post_save, so the batch applies the same
+side effects itself: items_listed counters, browse cache invalidation and
+the fallback search index.
+
+Image references are stored as-is, like ItemCreateSerializer does, except
+http(s) URLs and, for the management command, paths under an image root
+that are not already upload names. Those are fetched by a thread pool,
+checked with Pillow and handed to the image pipeline (app/core/images.py)
+once their batch has committed. URLs are only fetched from public
+addresses: every connection, including each redirect, resolves the host
+and refuses private, loopback, link-local and other reserved addresses,
+then connects to the address it checked. A row whose uploader or image
+cannot be resolved is reported and skipped.
+"""
+import csv
+import http.client
+import io
+import ipaddress
+import json
+import socket
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import HTTPHandler, HTTPSHandler, ProxyHandler, build_opener
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+from rest_framework import serializers
+
+from .cache import invalidate_browse_cache
+from .images import UPLOAD_NAME_RE, original_extension, submit_upload
+from .models import User, Item, ItemImage
+from .search import index_items
+from .serializers import ItemCreateSerializer
+
+
+FORMATS = ('csv', 'ndjson')
+IMAGE_SEPARATOR = '|'
+
+
+def detect_format(filename, default='ndjson'):
+    """Pick the input format from a file name's extension"""
+    suffix = Path(filename or '').suffix.lower()
+    if suffix == '.csv':
+        return 'csv'
+    if suffix in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, dict) from a binary stream; unparseable rows yield an error string"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            row = {key: value for key, value in row.items() if key and value not in (None, '')}
+            if 'images' in row:
+                row['images'] = [ref.strip() for ref in row['images'].split(IMAGE_SEPARATOR) if ref.strip()]
+            yield number, row
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, f'Invalid JSON: {e}'
+            continue
+        yield number, row if isinstance(row, dict) else 'Each line must be a JSON object'
+
+
+def count_rows(stream, fmt):
+    """Number of rows in a CSV or NDJSON binary stream, which is rewound afterwards"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            rows = max(0, sum(1 for _ in csv.reader(text)) - 1)
+        else:
+            rows = sum(1 for line in text if line.strip())
+    finally:
+        text.detach()
+    stream.seek(0)
+    return rows
+
+
+# ===============================
+# Images
+# ===============================
+
+def is_public_address(address):
+    """Whether an IP address is globally routable"""
+    address = ipaddress.ip_address(address)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection() that refuses hosts resolving to non-public addresses"""
+    host, port = address
+    resolved = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in resolved:
+        if not is_public_address(sockaddr[0]):
+            raise ValueError(f'{host} resolves to a non-public address')
+    # Connect to the checked address, not a second lookup of host
+    return socket.create_connection((resolved[0][4][0], port), timeout, source_address)
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+# Redirects are followed through the same handlers, so every hop is checked;
+# proxies from the environment are not used
+_opener = build_opener(ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler)
+
+
+def is_external(ref, image_root=None):
+    """Whether an image reference must be fetched rather than stored as-is"""
+    if urlparse(ref).scheme in ('http', 'https'):
+        return True
+    return image_root is not None and not UPLOAD_NAME_RE.fullmatch(ref)
+
+
+def fetch_image(ref, image_root=None):
+    """Return (bytes, extension) for an image URL or a file under image_root"""
+    if urlparse(ref).scheme in ('http', 'https'):
+        with _opener.open(ref, timeout=settings.ITEM_IMPORT_IMAGE_TIMEOUT) as response:
+            data = response.read(settings.ITEM_IMPORT_IMAGE_MAX_BYTES + 1)
+    else:
+        root = Path(image_root).resolve()
+        path = (root / ref).resolve()
+        if not path.is_relative_to(root):
+            raise ValueError('path is outside the image root')
+        data = path.read_bytes()
+
+    if len(data) > settings.ITEM_IMPORT_IMAGE_MAX_BYTES:
+        raise ValueError('image is too large')
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()
+        ext = original_extension(image.format)
+    return data, ext
+
+
+def _try_fetch(ref, image_root):
+    try:
+        return fetch_image(ref, image_root)
+    except Exception as e:
+        return e
+
+
+# ===============================
+# Import
+# ===============================
+
+class ItemImporter:
+    """
+    Validate and insert item rows in batches, collecting a per-row error
+    report. Use import_stream() or feed rows to add() and call finish().
+    """
+
+    def __init__(self, default_uploader, batch_size=None, image_root=None):
+        self.default_uploader = default_uploader
+        self.batch_size = batch_size or settings.ITEM_IMPORT_BATCH_SIZE
+        self.image_root = image_root
+        self.validator = ItemCreateSerializer()
+        self.pool = ThreadPoolExecutor(
+            max_workers=settings.ITEM_IMPORT_FETCH_WORKERS, thread_name_prefix='item-import',
+        )
+        self.batch = {}  # row number -> (uploader email, validated data)
+        self.imported = 0
+        self.images = 0
+        self.errors = []
+
+    def fail(self, number, errors):
+        self.errors.append({'row': number, 'errors': errors})
+
+    def add(self, number, row):
+        if isinstance(row, str):
+            self.fail(number, {'non_field_errors': [row]})
+            return
+        row = dict(row)
+        email = row.pop('uploader', None)
+        try:
+            data = self.validator.run_validation(row)
+        except serializers.ValidationError as e:
+            self.fail(number, e.detail)
+            return
+        self.batch[number] = (email, data)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        batch, self.batch = self.batch, {}
+        if batch:
+            self.write_batch(batch)
+
+    def resolve_uploaders(self, batch):
+        emails = {email for email, _ in batch.values() if email}
+        found = dict(User.objects.filter(email__in=emails).values_list('email', 'pk'))
+        uploaders = {}
+        for number, (email, _) in batch.items():
+            if email is None:
+                uploaders[number] = self.default_uploader.pk
+            elif email in found:
+                uploaders[number] = found[email]
+            else:
+                self.fail(number, {'uploader': [f'No user with email {email}']})
+        return uploaders
+
+    def fetch_images(self, batch, numbers):
+        """
+        Fetch the external images of rows in parallel. Returns the rows whose
+        images all resolved and {ref: (bytes, extension)} for fetched images.
+        """
+        refs = {
+            ref for number in numbers for ref in batch[number][1].get('images', [])
+            if is_external(ref, self.image_root)
+        }
+        results = dict(zip(refs, self.pool.map(lambda ref: _try_fetch(ref, self.image_root), refs)))
+        resolved = []
+        for number in numbers:
+            failed = [
+                f'{ref}: {results[ref]}' for ref in batch[number][1].get('images', [])
+                if isinstance(results.get(ref), Exception)
+            ]
+            if failed:
+                self.fail(number, {'images': failed})
+            else:
+                resolved.append(number)
+        return resolved, {ref: result for ref, result in results.items() if not isinstance(result, Exception)}
+
+    def write_batch(self, batch):
+        uploaders = self.resolve_uploaders(batch)
+        numbers, fetched = self.fetch_images(batch, [number for number in batch if number in uploaders])
+
+        # Fetched images are stored before their rows are written, so the
+        # rows record the names storage chose
+        items, images, stored, processing = [], [], {}, []
+        for number in numbers:
+            data = dict(batch[number][1])
+            refs = data.pop('images', [])
+            item = Item(uploader_id=uploaders[number], **data)
+            items.append(item)
+            for position, ref in enumerate(refs):
+                if ref in fetched:
+                    if ref not in stored:
+                        content, extension = fetched[ref]
+                        stored[ref], future = submit_upload(f'items/{uuid.uuid4()}.{extension}', content)
+                        processing.append(future)
+                    ref = stored[ref]
+                images.append(ItemImage(item=item, image=ref, is_primary=(position == 0)))
+
+        if not items:
+            return
+        with transaction.atomic():
+            Item.objects.bulk_create(items)
+            ItemImage.objects.bulk_create(images)
+            listed = defaultdict(list)
+            for uploader_id, count in Counter(item.uploader_id for item in items).items():
+                listed[count].append(uploader_id)
+            for count, uploader_ids in listed.items():
+                User.adjust_stats(uploader_ids, items_listed=count)
+            invalidate_browse_cache(*{item.category for item in items})
+        index_items(items)
+
+        # Process this batch's images before reading more, so memory stays bounded
+        wait(processing)
+        self.imported += len(items)
+        self.images += len(images)
+
+    def finish(self):
+        try:
+            self.flush()
+        finally:
+            self.pool.shutdown()
+        self.errors.sort(key=lambda error: error['row'])
+        return {
+            'imported': self.imported,
+            'images': self.images,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def import_stream(self, stream, fmt):
+        """Import every row of a CSV or NDJSON binary stream and return the report"""
+        try:
+            for number, row in read_rows(stream, fmt):
+                self.add(number, row)
+        except BaseException:
+            self.pool.shutdown(cancel_futures=True)
+            raise
+        return self.finish()
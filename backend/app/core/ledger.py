@@ -0,0 +1,121 @@
+"""
+Points ledger: every balance change is an F() update applied in the same
+database transaction as an append-only PointsLedgerEntry row.
+
+Purchases lock only the item being bought (select_for_update) and the
+two user rows touched by the balance UPDATEs, so unrelated purchases
+proceed in parallel.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import User, Item, Transaction, PointsLedgerEntry
+
+
+IDEMPOTENCY_KEY_MAX_LENGTH = Transaction._meta.get_field('idempotency_key').max_length
+
+
+class PurchaseError(Exception):
+    """Raised when a purchase cannot be completed; the message is user-facing"""
+
+
+class IdempotencyKeyReused(PurchaseError):
+    """Raised when an idempotency key already paid for a different item"""
+
+
+def _find_replay(buyer, idempotency_key, item_id):
+    if not idempotency_key:
+        return None
+    replay = Transaction.objects.filter(sender=buyer, idempotency_key=idempotency_key).first()
+    if replay is not None and str(replay.item_id) != str(item_id):
+        raise IdempotencyKeyReused('This Idempotency-Key was already used for another purchase')
+    return replay
+
+
+def _adjust_balances(debit_user_id, credit_user_id, points):
+    """
+    Move points between two users. Rows are updated in primary key order
+    so two opposite purchases cannot deadlock; the debit only applies if
+    the balance covers it.
+    """
+    if points <= 0:
+        raise PurchaseError('Points amount must be positive')
+    for user_id in sorted((debit_user_id, credit_user_id)):
+        if user_id == debit_user_id:
+            debited = User.objects.filter(pk=user_id, points_balance__gte=points).update(
+                points_balance=F('points_balance') - points
+            )
+            if not debited:
+                raise PurchaseError('Insufficient points balance')
+        else:
+            User.objects.filter(pk=user_id).update(points_balance=F('points_balance') + points)
+
+
+def purchase_with_points(buyer, item_id, points, idempotency_key=None):
+    """
+    Buy an item with points and return ``(transaction, replayed)``.
+
+    A request carrying an idempotency key that was already used by this
+    buyer returns the original transaction with ``replayed=True`` instead
+    of charging again; the same key for another item raises
+    IdempotencyKeyReused. points must equal the item's points_value.
+    """
+    if points <= 0:
+        raise PurchaseError('Points amount must be positive')
+    if idempotency_key and len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise PurchaseError(f'Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+
+    replay = _find_replay(buyer, idempotency_key, item_id)
+    if replay:
+        return replay, True
+
+    try:
+        with transaction.atomic():
+            try:
+                item = Item.objects.select_for_update().get(item_id=item_id)
+            except Item.DoesNotExist:
+                raise PurchaseError('Item not found')
+
+            # A concurrent retry may have committed while we waited on the lock
+            replay = _find_replay(buyer, idempotency_key, item_id)
+            if replay:
+                return replay, True
+
+            if item.uploader_id == buyer.pk:
+                raise PurchaseError('You cannot purchase your own item')
+            if item.status != 'available':
+                raise PurchaseError('This item is no longer available')
+            if item.points_value <= 0:
+                raise PurchaseError('This item cannot be bought with points')
+            if points != item.points_value:
+                raise PurchaseError(f'This item costs {item.points_value} points')
+
+            _adjust_balances(buyer.pk, item.uploader_id, points)
+
+            item.status = 'sold'
+            item.save(update_fields=['status', 'updated_at'])
+
+            purchase = Transaction.objects.create(
+                sender=buyer,
+                receiver_id=item.uploader_id,
+                item=item,
+                method='points',
+                points_amount=points,
+                status='completed',
+                completed_at=timezone.now(),
+                idempotency_key=idempotency_key or None,
+            )
+            PointsLedgerEntry.objects.bulk_create([
+                PointsLedgerEntry(user_id=buyer.pk, transaction=purchase, entry_type='purchase', amount=-points),
+                PointsLedgerEntry(user_id=item.uploader_id, transaction=purchase, entry_type='sale', amount=points),
+            ])
+    except IntegrityError:
+        # Lost a race on the (sender, idempotency_key) constraint
+        replay = _find_replay(buyer, idempotency_key, item_id)
+        if replay:
+            return replay, True
+        raise
+
+    buyer.refresh_from_db(fields=['points_balance'])
+    return purchase, False
@@ -0,0 +1,169 @@
+"""
+HTTP load test comparing the WSGI and ASGI deployments.
+
+Server modes:
+
+- wsgi: sync workers serving the sync views, the default deployment
+- wsgi_async: sync workers serving the async view variants through
+  async_to_sync, to measure what the thread hops cost
+- asgi: uvicorn workers serving the async view variants (SERVER_MODE=asgi)
+
+For each server mode a gunicorn process is started against an already
+seeded database, and a pool of client threads with keep-alive connections
+requests the read-heavy endpoints for a fixed duration. Results are
+requests per second and p50/p95/p99 latency, overall and per endpoint.
+Used by the load_test management command.
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+from .benchmarks import percentile
+
+
+# Same config and worker count as entrypoint.sh; only the worker class and
+# which view variants serve (settings.ASYNC_VIEWS) differ
+GUNICORN_CONFIG = 'python:config.gunicorn'
+WSGI_ARGS = ['config.wsgi:application']
+ASGI_ARGS = ['config.asgi:application', '--worker-class', 'uvicorn_worker.UvicornWorker']
+SERVER_MODES = {
+    'wsgi': (WSGI_ARGS, False),
+    'wsgi_async': (WSGI_ARGS, True),
+    'asgi': (ASGI_ARGS, True),
+}
+
+
+def database_url(settings_dict):
+    """DATABASE_URL for a server process using the given connection settings"""
+    if settings_dict['ENGINE'] == 'django.db.backends.sqlite3':
+        return f"sqlite:///{settings_dict['NAME']}"
+    return (
+        f"postgres://{settings_dict['USER']}:{settings_dict['PASSWORD']}@"
+        f"{settings_dict['HOST'] or 'localhost'}:{settings_dict['PORT'] or 5432}/{settings_dict['NAME']}"
+    )
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, db_url, workers=2, preload=True, log_level='warning', stderr=None):
+    """Start gunicorn in mode and return (process, port) once it answers"""
+    port = _free_port()
+    app_args, async_views = SERVER_MODES[mode]
+    env = {
+        **os.environ, 'DATABASE_URL': db_url, 'DEBUG': 'False', 'REQUEST_PROFILING_ENABLED': 'False',
+        'GUNICORN_PRELOAD': str(preload), 'ASYNC_VIEWS': str(async_views),
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', GUNICORN_CONFIG, *app_args,
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', log_level],
+        cwd=Path(settings.BASE_DIR), env=env, stderr=stderr,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} server exited with {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f'{mode} server did not start within 30s')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _client(port, paths, token, deadline, offset, samples, lock):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Authorization': f'Bearer {token}', 'Host': '127.0.0.1'}
+    local = []
+    i = offset
+    while time.monotonic() < deadline:
+        name, path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            ok = False
+        local.append((name, (time.perf_counter() - start) * 1000, ok))
+    connection.close()
+    with lock:
+        samples.extend(local)
+
+
+def drive(port, paths, token, concurrency=32, duration=10.0, warmup=2.0):
+    """Request paths from concurrency threads for duration seconds"""
+    if warmup:
+        drive(port, paths, token, concurrency, warmup, warmup=0)
+
+    samples, lock = [], threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=_client, args=(port, paths, token, deadline, n, samples, lock))
+        for n in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    by_name = defaultdict(list)
+    for name, latency, ok in samples:
+        by_name[name].append((latency, ok))
+    by_name['all'] = [(latency, ok) for _, latency, ok in samples]
+    return {name: _summarize(rows, duration) for name, rows in by_name.items()}
+
+
+def _summarize(rows, duration):
+    timings = [latency for latency, _ in rows] or [0.0]
+    return {
+        'requests': len(rows),
+        'errors': sum(1 for _, ok in rows if not ok),
+        'rps': round(len(rows) / duration, 1),
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+    }
+
+
+def run_load_test(ctx, token, db_url, modes=tuple(SERVER_MODES), workers=2, concurrency=32, duration=10.0, log=None):
+    """Run the same load against each server mode and return {mode: results}"""
+    log = log or (lambda message: None)
+    paths = [
+        ('items_browse', '/api/items/'),
+        ('item_detail', f'/api/items/{ctx.other_item.item_id}/'),
+        ('public_profile', f'/api/users/{ctx.other.user_id}/'),
+    ]
+    results = {}
+    for mode in modes:
+        process, port = start_server(mode, db_url, workers)
+        try:
+            results[mode] = drive(port, paths, token, concurrency, duration)
+        finally:
+            stop_server(process)
+        log(f'{mode}: {json.dumps(results[mode]["all"])}')
+    return results
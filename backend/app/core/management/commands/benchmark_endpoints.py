@@ -0,0 +1,82 @@
+"""
+Management command to benchmark every API endpoint against a seeded database
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from app.core.benchmarks.endpoints import seed, run_benchmarks, compare_with_baseline
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database, replay every route in app/core/urls.py and '
+        'record query counts, p50/p95 latency and response size. Fails when a '
+        'metric regresses beyond the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.01,
+                            help='Fraction of full volume (50k users, 500k items, 2M images, 1M transactions)')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per endpoint')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert while seeding')
+        parser.add_argument('--only', nargs='*', help='Only run these scenarios')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline')
+        parser.add_argument('--output', help='Also write results to this JSON file')
+        parser.add_argument('--latency-tolerance', type=float, default=2.0,
+                            help='Allowed p50/p95 growth factor over the baseline')
+        parser.add_argument('--keep-db', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keep_db'])
+        try:
+            self.stdout.write(f'Using {connection.vendor} database {connection.settings_dict["NAME"]}')
+            ctx = seed(options['scale'], batch_size=options['batch_size'], log=self.stdout.write)
+            results = run_benchmarks(
+                ctx, iterations=options['iterations'], warmup=options['warmup'],
+                only=options['only'], log=self.stdout.write,
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keep_db'])
+            teardown_test_environment()
+
+        report = {'scale': options['scale'], 'vendor': connection.vendor, 'results': results}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✅ Baseline written to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --update-baseline'))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('scale') != options['scale'] or baseline.get('vendor') != connection.vendor:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded at scale {baseline.get('scale')} on {baseline.get('vendor')}; "
+                'query counts still compare, sizes and latencies may not'
+            ))
+
+        regressions = compare_with_baseline(
+            results, baseline['results'], latency_tolerance=options['latency_tolerance'],
+        )
+        if regressions:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(results)} endpoints within baseline'))
@@ -0,0 +1,53 @@
+"""
+Management command to measure login throughput per password hasher
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from app.core.benchmarks.logins import measure_logins
+
+
+class Command(BaseCommand):
+    help = (
+        'Log in repeatedly from a single thread against a throwaway test database and '
+        'report logins per second (the ceiling of one sync gunicorn worker) and latency '
+        'for each password hasher, with the lean and the full login response.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashers', nargs='*', default=list(settings.PASSWORD_HASHER_CHOICES),
+                            help='Hashers to measure (keys of PASSWORD_HASHER_CHOICES)')
+        parser.add_argument('--duration', type=float, default=3.0, help='Seconds of logins per hasher and mode')
+        parser.add_argument('--users', type=int, default=20, help='Accounts to rotate through')
+        parser.add_argument('--output', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        unknown = set(options['hashers']) - set(settings.PASSWORD_HASHER_CHOICES)
+        if unknown:
+            raise CommandError(f'Unknown hashers: {", ".join(sorted(unknown))}')
+
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        results = []
+        try:
+            for hasher in options['hashers']:
+                for lean in (True, False):
+                    result = measure_logins(hasher, lean=lean, users=options['users'], duration=options['duration'])
+                    results.append(result)
+                    self.stdout.write(
+                        f"{result['hasher']:<8} {result['mode']:<5} {result['logins_per_s']:>8} logins/s  "
+                        f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  {result['queries']} queries"
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({'results': results}, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'✅ Measured {len(results)} login configurations'))
@@ -0,0 +1,77 @@
+"""
+Management command to benchmark the similar items job and endpoint
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from app.core.benchmarks.similar_items import benchmark_similar_items, seed_similar_items
+from app.core.startup import compare_startup
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'similar_items_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with available items, then time a full similar '
+        'items rebuild (reported per 100k items, with peak memory), an incremental refresh '
+        'and /api/items/<id>/similar/. Fails when a time regresses beyond the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100_000, help='Available items to seed')
+        parser.add_argument('--new-items', type=int, default=1000, help='Items listed before the incremental refresh')
+        parser.add_argument('--samples', type=int, default=100, help='Items whose similar items are requested')
+        parser.add_argument('--repeat', type=int, default=3, help='Full rebuilds; the fastest is kept')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert while seeding')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline')
+        parser.add_argument('--output', help='Also write results to this JSON file')
+        parser.add_argument('--tolerance', type=float, default=1.5, help='Allowed growth factor of each time')
+        parser.add_argument('--keep-db', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keep_db'])
+        try:
+            self.stdout.write(f'Using {connection.vendor} database {connection.settings_dict["NAME"]}')
+            user_ids = seed_similar_items(options['items'], batch_size=options['batch_size'], log=self.stdout.write)
+            results = benchmark_similar_items(
+                user_ids, new_items=options['new_items'], samples=options['samples'],
+                repeat=options['repeat'], log=self.stdout.write,
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keep_db'])
+            teardown_test_environment()
+
+        report = {'items': options['items'], 'vendor': connection.vendor, 'results': results}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✅ Baseline written to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --update-baseline'))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('items') != options['items'] or baseline.get('vendor') != connection.vendor:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with {baseline.get('items')} items on {baseline.get('vendor')}; "
+                'query counts still compare, times may not'
+            ))
+
+        regressions = compare_startup(results, baseline['results'], options['tolerance'])
+        if regressions:
+            raise CommandError('Similar items regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('✅ Similar items within baseline'))
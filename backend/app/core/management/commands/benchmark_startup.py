@@ -0,0 +1,68 @@
+"""
+Management command to measure cold start: imports, bootstrap and gunicorn boot
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from app.core.loadtest import database_url
+from app.core.startup import compare_startup, run_startup_benchmarks
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'startup_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure import time (-X importtime), the bootstrap command and gunicorn cold start '
+        'with and without --preload against a throwaway database. Fails when a time '
+        'regresses beyond the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Gunicorn worker processes')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best is kept')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline')
+        parser.add_argument('--output', help='Also write results to this JSON file')
+        parser.add_argument('--tolerance', type=float, default=1.5, help='Allowed growth factor of each time')
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = run_startup_benchmarks(
+                database_url(connection.settings_dict), workers=options['workers'],
+                repeat=options['repeat'], log=self.stdout.write,
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write('Slowest packages to import:')
+        for row in results['imports']['slowest']:
+            self.stdout.write(f"  {row['ms']:>8} ms  {row['package']}")
+
+        report = {'vendor': connection.vendor, 'results': results}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✅ Baseline written to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --update-baseline'))
+            return
+
+        regressions = compare_startup(results, json.loads(baseline_path.read_text())['results'], options['tolerance'])
+        if regressions:
+            raise CommandError('Startup regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('✅ Startup within baseline'))
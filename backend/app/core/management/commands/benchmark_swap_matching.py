@@ -0,0 +1,88 @@
+"""
+Management command to benchmark the swap matching engine at full volume
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from app.core.benchmarks.matching import benchmark_matching, seed_wants
+from app.core.startup import compare_startup
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'swap_matching_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with users, items, likes and swap requests, then '
+        'measure building the want graph (time and peak memory) and serving '
+        '/api/swaps/suggestions/. Fails when the build exceeds its budget or a metric '
+        'regresses beyond the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Fraction of full volume (50k users, 500k items, 1M likes, 100k swap requests)')
+        parser.add_argument('--samples', type=int, default=200, help='Users whose suggestions are timed')
+        parser.add_argument('--repeat', type=int, default=3, help='Graph builds; the fastest is kept')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert while seeding')
+        parser.add_argument('--max-build-seconds', type=float, default=60.0, help='Time budget of one graph build')
+        parser.add_argument('--max-memory-mb', type=float, default=256.0, help='Peak memory budget of one graph build')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline')
+        parser.add_argument('--output', help='Also write results to this JSON file')
+        parser.add_argument('--tolerance', type=float, default=1.5, help='Allowed growth factor of each time')
+        parser.add_argument('--keep-db', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keep_db'])
+        try:
+            self.stdout.write(f'Using {connection.vendor} database {connection.settings_dict["NAME"]}')
+            user_ids = seed_wants(options['scale'], batch_size=options['batch_size'], log=self.stdout.write)
+            results = benchmark_matching(
+                user_ids, samples=options['samples'], repeat=options['repeat'], log=self.stdout.write,
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keep_db'])
+            teardown_test_environment()
+
+        build = results['build']
+        over_budget = []
+        if build['build_ms'] > options['max_build_seconds'] * 1000:
+            over_budget.append(f"build took {build['build_ms']} ms (budget {options['max_build_seconds']} s)")
+        if build['peak_mb'] > options['max_memory_mb']:
+            over_budget.append(f"build peaked at {build['peak_mb']} MB (budget {options['max_memory_mb']} MB)")
+        if over_budget:
+            raise CommandError('Swap matching over budget:\n  ' + '\n  '.join(over_budget))
+
+        report = {'scale': options['scale'], 'vendor': connection.vendor, 'results': results}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✅ Baseline written to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --update-baseline'))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('scale') != options['scale'] or baseline.get('vendor') != connection.vendor:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded at scale {baseline.get('scale')} on {baseline.get('vendor')}; "
+                'query counts still compare, times may not'
+            ))
+
+        regressions = compare_startup(results, baseline['results'], options['tolerance'])
+        if regressions:
+            raise CommandError('Swap matching regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('✅ Swap matching within budget and baseline'))
@@ -0,0 +1,29 @@
+"""
+Management command to prepare the database on every deploy
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app.core.bootstrap import bootstrap
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the schema, apply pending migrations and provision the admin account '
+        'in one process. Safe to run on every boot.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-migrate', action='store_true', help='Only provision accounts')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            bootstrap(migrate_database=not options['skip_migrate'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Bootstrap finished in {(time.perf_counter() - start) * 1000:.0f} ms '
+            f'({len(queries)} queries)'
+        ))
@@ -0,0 +1,28 @@
+"""
+Management command to precompute similar items, run offline on a schedule
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.core.recommendations import rebuild_similar_items, refresh_similar_items
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the similar items of items listed or edited since the last run, or of '
+        'every available item with --full. Schedule the incremental run every few minutes '
+        'and --full nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every category')
+        parser.add_argument('--k', type=int, help='Similar items stored per item (default SIMILAR_ITEMS_K)')
+        parser.add_argument('--batch-size', type=int, help='Rows per matrix product (default SIMILAR_ITEMS_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        job = rebuild_similar_items if options['full'] else refresh_similar_items
+        start = time.perf_counter()
+        count = job(k=options['k'], batch_size=options['batch_size'], log=self.stdout.write)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'✅ Computed similar items for {count} items in {elapsed:.1f}s'))
@@ -0,0 +1,44 @@
+"""
+Management command to stream a table export for analytics
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.core.exports import EXPORTS, FORMATS, ExportError, format_watermark, parse_since, stream_export, watermark
+
+
+class Command(BaseCommand):
+    help = (
+        'Export items, transactions, ratings or users as NDJSON or CSV with constant memory. '
+        'Prints the watermark to pass as --since for the next incremental export.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(EXPORTS))
+        parser.add_argument('--format', dest='fmt', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--since', help='Only rows updated after this ISO 8601 datetime')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        until = watermark()
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+            chunks = stream_export(options['table'], options['fmt'], since=since, until=until, compress=options['gzip'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        written = 0
+        target = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                target.close()
+            else:
+                target.flush()
+
+        self.stderr.write(f'Exported {options["table"]} ({written} bytes); next --since {format_watermark(until)}')
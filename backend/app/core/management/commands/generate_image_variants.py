@@ -0,0 +1,28 @@
+"""
+Management command to generate resized variants lost to a failed or interrupted worker
+"""
+from django.core.management.base import BaseCommand
+
+from app.core.images import UPLOAD_NAME_RE, missing_variants, regenerate_variants
+from app.core.models import ItemImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Find item images whose stored original is missing resized variants, e.g. after '
+        'a worker crashed or a deploy interrupted the pool, and generate them. Run after deploys.'
+    )
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        names = ItemImage.objects.order_by().values_list('image', flat=True).distinct()
+        for name in names.iterator():
+            if not UPLOAD_NAME_RE.search(name or '') or not missing_variants(name):
+                continue
+            try:
+                regenerate_variants(name)
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{name}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'✅ Generated variants for {generated} images ({failed} failed)'))
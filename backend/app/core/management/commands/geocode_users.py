@@ -0,0 +1,24 @@
+"""
+Management command to geocode user locations again after the gazetteer changes
+"""
+from django.core.management.base import BaseCommand
+
+from app.core.cache import invalidate_browse_cache
+from app.core.geo import geocode_users
+from app.core.models import Item, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Resolve every user location against GEOCODER_GAZETTEER and store the coordinates '
+        'and geohash used by /api/items/?near=. Run after editing the gazetteer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users updated per query')
+
+    def handle(self, *args, **options):
+        changed = geocode_users(User.objects.all(), batch_size=options['batch_size'])
+        if changed:
+            invalidate_browse_cache(*(category for category, _ in Item.ITEM_CATEGORIES))
+        self.stdout.write(self.style.SUCCESS(f'✅ Geocoded {changed} changed user locations'))
@@ -0,0 +1,55 @@
+"""
+Management command to load test the WSGI and ASGI server modes
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from app.core.authentication import tokens_for_user
+from app.core.benchmarks.endpoints import seed
+from app.core.loadtest import SERVER_MODES, database_url, run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database, then serve it in turn with gunicorn sync workers and sync '
+        'views (wsgi), sync workers and async views (wsgi_async) and uvicorn workers and async '
+        'views (asgi), and compare requests/s and p50/p95/p99 latency of the read-heavy '
+        'endpoints under the same concurrent load.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.01, help='Seed volume, as for benchmark_endpoints')
+        parser.add_argument('--modes', nargs='*', default=list(SERVER_MODES), choices=list(SERVER_MODES))
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+        parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per mode')
+        parser.add_argument('--output', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            ctx = seed(options['scale'], log=self.stdout.write)
+            token = str(tokens_for_user(ctx.actor).access_token)
+            results = run_load_test(
+                ctx, token, database_url(connection.settings_dict), modes=options['modes'],
+                workers=options['workers'], concurrency=options['concurrency'],
+                duration=options['duration'], log=self.stdout.write,
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(f"{'mode':<10} {'endpoint':<16} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+        for mode, endpoints in results.items():
+            for name, row in endpoints.items():
+                self.stdout.write(
+                    f"{mode:<10} {name:<16} {row['rps']:>8} {row['p50_ms']:>8} "
+                    f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>7}"
+                )
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({'scale': options['scale'], 'results': results}, indent=2))
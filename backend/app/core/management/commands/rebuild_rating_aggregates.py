@@ -0,0 +1,36 @@
+"""
+Management command to rebuild the stored rating aggregates on users
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from app.core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_count and rating_sum for all users from the ratings table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of user ids to update per statement',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = User.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.WARNING('No users found in database'))
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            with transaction.atomic():
+                updated += User.rebuild_rating_aggregates(
+                    User.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt rating aggregates for {updated} users'))
@@ -0,0 +1,36 @@
+"""
+Management command to reconcile the stored user stats counters
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from app.core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recompute total_swaps, items_listed, completed_swaps and ongoing_swaps from items and transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of user ids to update per statement',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = User.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.WARNING('No users found in database'))
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            with transaction.atomic():
+                updated += User.rebuild_stats(
+                    User.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Recomputed stats counters for {updated} users'))
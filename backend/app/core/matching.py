@@ -0,0 +1,391 @@
+"""
+Swap matching: suggests exchanges in which everyone gets an item they want.
+
+The want graph has one node per user and an edge u -> v when u wants an
+available item of v, because u liked it or has a pending swap request
+for it. Its weight is how many such items there are. A two-way match is
+a pair of opposite edges; a swap cycle is a closed path through three or
+four users, in which every user receives an item from the next one.
+
+The graph is held per process in compressed sparse row form: a user's pk
+indexes an offsets array into flat arrays of neighbour pks, one set for
+each direction, so the neighbours of a user are one slice. Each user
+keeps at most SWAP_MATCHING_MAX_DEGREE out-edges, their strongest wants,
+which bounds memory and the work per suggestion however many items are
+listed. The snapshot is built from one grouped query, streamed
+SWAP_MATCHING_FETCH_SIZE rows at a time, in a background thread: first
+when a suggestion needs it, then after a response once it is
+SWAP_MATCHING_REFRESH_INTERVAL seconds old. Requests never wait for a
+build; they use the current snapshot, or an empty graph (two-way matches
+only) until the first build finishes. In between builds, likes and swap
+requests made in this process are added to the snapshot as they happen.
+
+Suggestions read the requesting user's own edges fresh from the database,
+so a two-way match shows up as soon as both wants exist, and every hop is
+checked against current items before it is returned: a stale snapshot can
+miss a cycle but never suggests an item that is gone.
+"""
+import logging
+import threading
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Max
+
+from .models import Like, Transaction, User
+
+
+logger = logging.getLogger(__name__)
+
+# Wanted users per user with the number of wanted items, strongest first
+WANT_GRAPH_SQL = """
+    SELECT src, dst, SUM(n) AS weight FROM (
+        SELECT l.user_id AS src, i.uploader_id AS dst, COUNT(*) AS n
+        FROM likes l JOIN items i ON i.item_id = l.item_id
+        WHERE i.status = 'available' AND i.uploader_id <> l.user_id
+        GROUP BY l.user_id, i.uploader_id
+        UNION ALL
+        SELECT t.sender_id, i.uploader_id, COUNT(*)
+        FROM transactions t JOIN items i ON i.item_id = t.item_id
+        WHERE t.method = 'swap' AND t.status = 'pending' AND i.status = 'available'
+            AND i.uploader_id <> t.sender_id
+        GROUP BY t.sender_id, i.uploader_id
+    ) wants
+    GROUP BY src, dst
+    ORDER BY src, weight DESC, dst
+"""
+
+# Candidate cycles looked up per suggestion returned, since some fail the
+# final check against current items
+CANDIDATES_PER_SUGGESTION = 3
+
+
+# ===============================
+# Want Graph
+# ===============================
+
+def _offsets(degrees):
+    offsets = array('I', [0]) * (len(degrees) + 1)
+    total = 0
+    for pk, degree in enumerate(degrees):
+        total += degree
+        offsets[pk + 1] = total
+    return offsets
+
+
+class WantGraph:
+    """
+    Snapshot of the want graph as adjacency arrays indexed by user pk, plus
+    the edges added in this process since it was built
+    """
+
+    def __init__(self, out_offsets, out_targets, in_offsets, in_targets):
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        # pk -> tuple of pks, replaced rather than mutated so readers need no lock
+        self._added_out = {}
+        self._added_in = {}
+
+    @classmethod
+    def from_rows(cls, size, rows, max_degree):
+        """
+        Build from (src, dst, weight) rows ordered by src and then by
+        weight descending, keeping the first max_degree edges of each src
+        """
+        out_degrees = array('I', [0]) * size
+        out_targets = array('I')
+        for src, dst, _ in rows:
+            # Users who signed up during the build are not in the snapshot
+            if src < size and dst < size and out_degrees[src] < max_degree:
+                out_degrees[src] += 1
+                out_targets.append(dst)
+        out_offsets = _offsets(out_degrees)
+        del out_degrees
+
+        # Reverse edges with a counting sort on the target
+        in_degrees = array('I', [0]) * size
+        for dst in out_targets:
+            in_degrees[dst] += 1
+        in_offsets = _offsets(in_degrees)
+        del in_degrees
+        positions = array('I', in_offsets)
+        in_targets = array('I', [0]) * len(out_targets)
+        for src in range(size):
+            for edge in range(out_offsets[src], out_offsets[src + 1]):
+                dst = out_targets[edge]
+                in_targets[positions[dst]] = src
+                positions[dst] += 1
+        return cls(out_offsets, out_targets, in_offsets, in_targets)
+
+    @property
+    def size(self):
+        return len(self.out_offsets) - 1
+
+    @property
+    def edges(self):
+        return len(self.out_targets)
+
+    @property
+    def nbytes(self):
+        arrays = (self.out_offsets, self.out_targets, self.in_offsets, self.in_targets)
+        return sum(len(values) * values.itemsize for values in arrays)
+
+    def age(self):
+        return time.monotonic() - self.built_at
+
+    def _neighbours(self, offsets, targets, added, pk):
+        found = targets[offsets[pk]:offsets[pk + 1]] if pk < self.size else ()
+        extra = added.get(pk)
+        if extra:
+            return list(found) + [other for other in extra if other not in found]
+        return found
+
+    def wants(self, pk):
+        """Users pk wants an item from, strongest want first"""
+        return self._neighbours(self.out_offsets, self.out_targets, self._added_out, pk)
+
+    def wanted_by(self, pk):
+        """Users who want an item of pk"""
+        return self._neighbours(self.in_offsets, self.in_targets, self._added_in, pk)
+
+    def add_want(self, src, dst):
+        with self._lock:
+            if dst not in self._added_out.get(src, ()):
+                self._added_out[src] = self._added_out.get(src, ()) + (dst,)
+                self._added_in[dst] = self._added_in.get(dst, ()) + (src,)
+
+
+def build_want_graph(using=DEFAULT_DB_ALIAS, max_degree=None, fetch_size=None):
+    """Build a WantGraph from the database; see the module docstring"""
+    max_degree = max_degree or settings.SWAP_MATCHING_MAX_DEGREE
+    fetch_size = fetch_size or settings.SWAP_MATCHING_FETCH_SIZE
+    size = (User.objects.using(using).aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    def rows(cursor):
+        while True:
+            batch = cursor.fetchmany(fetch_size)
+            if not batch:
+                return
+            yield from batch
+
+    # A server-side cursor on PostgreSQL, so rows are not all held at once
+    with connections[using].chunked_cursor() as cursor:
+        cursor.execute(WANT_GRAPH_SQL)
+        return WantGraph.from_rows(size, rows(cursor), max_degree)
+
+
+_graph = None
+# Held while a build runs, so each process builds one snapshot at a time
+_graph_lock = threading.Lock()
+_builder = None
+
+
+def _build_in_background():
+    global _graph
+    try:
+        _graph = build_want_graph()
+    except Exception:
+        logger.exception('Building the want graph failed')
+    finally:
+        connections.close_all()
+        _graph_lock.release()
+
+
+def schedule_rebuild():
+    """Start building a new snapshot in a background thread unless one is being built"""
+    global _builder
+    if not _graph_lock.acquire(blocking=False):
+        return
+    _builder = threading.Thread(target=_build_in_background, name='want-graph-build', daemon=True)
+    _builder.start()
+
+
+def get_want_graph():
+    """This process's snapshot; an empty graph while the first one is built"""
+    graph = _graph
+    if graph is None:
+        schedule_rebuild()
+        return WantGraph.from_rows(0, (), 0)
+    return graph
+
+
+def rebuild_want_graph():
+    """Build a new snapshot in this thread, e.g. in commands and tests"""
+    global _graph
+    with _graph_lock:
+        _graph = build_want_graph()
+    return _graph
+
+
+def reset_want_graph():
+    """Drop the snapshot once a running build is done; the next suggestion schedules a new one"""
+    global _graph
+    if _builder is not None:
+        _builder.join()
+    _graph = None
+
+
+def refresh_if_due(**kwargs):
+    """request_finished receiver: rebuild a loaded snapshot in the background once it is old"""
+    graph = _graph
+    if graph is not None and graph.age() >= settings.SWAP_MATCHING_REFRESH_INTERVAL:
+        schedule_rebuild()
+
+
+def want_added(sender, instance, created, **kwargs):
+    """post_save receiver for Like and Transaction adding new wants to the snapshot"""
+    graph = _graph
+    if graph is None or not created:
+        return
+    if isinstance(instance, Transaction):
+        if instance.method != 'swap' or instance.status != 'pending':
+            return
+        src, dst = instance.sender_id, instance.receiver_id
+    else:
+        src, dst = instance.user_id, instance.item.uploader_id
+    if src != dst:
+        graph.add_want(src, dst)
+
+
+# ===============================
+# Suggestions
+# ===============================
+
+@dataclass
+class SwapCycle:
+    """
+    A two-way match or swap cycle starting at the requesting user: users[i]
+    receives items[i] from users[i + 1], and the last user receives
+    items[-1] from the first
+    """
+    users: tuple
+    items: tuple = ()
+
+    @property
+    def hops(self):
+        return [(user, self.users[(i + 1) % len(self.users)]) for i, user in enumerate(self.users)]
+
+
+def _grouped(queryset, key):
+    return queryset.order_by().values_list(key).annotate(n=Count('pk'))
+
+
+def own_edges(user, max_degree=None):
+    """
+    ``(wants, wanted_by)`` of user read from the database, each a dict of
+    user pk to weight, strongest first
+    """
+    max_degree = max_degree or settings.SWAP_MATCHING_MAX_DEGREE
+    requests = Transaction.objects.filter(method='swap', status='pending', item__status='available')
+    likes = Like.objects.filter(item__status='available')
+
+    wants, wanted_by = Counter(), Counter()
+    for queryset, counter, key in (
+        (likes.filter(user=user).exclude(item__uploader=user), wants, 'item__uploader'),
+        (requests.filter(sender=user).exclude(item__uploader=user), wants, 'item__uploader'),
+        (likes.filter(item__uploader=user).exclude(user=user), wanted_by, 'user'),
+        (requests.filter(item__uploader=user).exclude(sender=user), wanted_by, 'sender'),
+    ):
+        for pk, n in _grouped(queryset, key):
+            counter[pk] += n
+    return dict(wants.most_common(max_degree)), dict(wanted_by.most_common(max_degree))
+
+
+def find_cycles(graph, pk, wants, wanted_by, limit):
+    """
+    Up to limit cycles through pk: two-way matches, then 3-cycles, then
+    4-cycles, each group ordered by the weight of pk's own two edges.
+    wants and wanted_by are pk's edges from own_edges(); the hops between
+    other users come from graph. 4-cycles pk -> v -> w -> x -> pk meet in
+    the middle at w, so the work is bounded by the squared degree cap.
+    """
+    def weight(v, x):
+        return wants[v] + wanted_by[x]
+
+    two_way = [(pk, v) for v in wants if v in wanted_by]
+    two_way.sort(key=lambda users: -weight(users[1], users[1]))
+    cycles = two_way[:limit]
+    if len(cycles) >= limit:
+        return [SwapCycle(users) for users in cycles]
+
+    three_way = []
+    for v in wants:
+        for w in graph.wants(v):
+            if w in wanted_by and w != pk and w != v:
+                three_way.append((pk, v, w))
+        if len(three_way) >= limit:
+            break
+    three_way.sort(key=lambda users: -weight(users[1], users[2]))
+    cycles += three_way[:limit - len(cycles)]
+    if len(cycles) >= limit:
+        return [SwapCycle(users) for users in cycles]
+
+    # Users w with an edge w -> x into pk's wanted_by, keyed by w
+    before = {}
+    for x in wanted_by:
+        for w in graph.wanted_by(x):
+            if w != pk and w != x:
+                before.setdefault(w, []).append(x)
+    four_way = []
+    for v in wants:
+        for w in graph.wants(v):
+            if w == pk or w == v:
+                continue
+            four_way.extend((pk, v, w, x) for x in before.get(w, ()) if x != v)
+        if len(four_way) >= limit:
+            break
+    four_way.sort(key=lambda users: -weight(users[1], users[3]))
+    cycles += four_way[:limit - len(cycles)]
+    return [SwapCycle(users) for users in cycles]
+
+
+def hop_items(hops):
+    """
+    ``{(receiver, giver): item pk}`` with an available item of giver that
+    receiver wants, for each hop that still has one. Swap requests win over
+    likes, newer over older. Two queries however many hops there are.
+    """
+    receivers = {receiver for receiver, _ in hops}
+    givers = {giver for _, giver in hops}
+    wanted = {}
+    for queryset, key in (
+        (Transaction.objects.filter(method='swap', status='pending', sender__in=receivers), 'sender'),
+        (Like.objects.filter(user__in=receivers), 'user'),
+    ):
+        rows = queryset.filter(item__status='available', item__uploader__in=givers).order_by('-created_at')
+        for receiver, giver, item_id in rows.values_list(key, 'item__uploader', 'item'):
+            if (receiver, giver) in hops:
+                wanted.setdefault((receiver, giver), item_id)
+    return wanted
+
+
+def suggest_swaps(user, limit=20):
+    """
+    Two-way matches and swap cycles for user, as SwapCycles with their
+    items filled in, best first
+    """
+    wants, wanted_by = own_edges(user)
+    if not wants or not wanted_by:
+        return []
+    candidates = find_cycles(get_want_graph(), user.pk, wants, wanted_by, limit * CANDIDATES_PER_SUGGESTION)
+    if not candidates:
+        return []
+
+    items = hop_items({hop for cycle in candidates for hop in cycle.hops})
+    suggestions = []
+    for cycle in candidates:
+        cycle_items = tuple(items.get(hop) for hop in cycle.hops)
+        if None not in cycle_items:
+            cycle.items = cycle_items
+            suggestions.append(cycle)
+            if len(suggestions) >= limit:
+                break
+    return suggestions
@@ -0,0 +1,253 @@
+"""
+Per-request SQL and serializer profiling, and static file serving.
+
+RequestProfilingMiddleware is opt-in (REQUEST_PROFILING_ENABLED) and
+sampled (REQUEST_PROFILING_SAMPLE_RATE), so it can stay installed in
+production. For a sampled request it records query count, total DB time,
+the slowest queries, repeated query fingerprints (N+1 candidates) and the
+time spent in outermost DRF serializer ``.data`` calls. The results are
+emitted as a Server-Timing header and as one structured log line.
+
+Every middleware here supports both sync and async requests, so under
+ASGI the middleware chain and async views stay on the event loop.
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+logger = logging.getLogger('app.core.profiling')
+
+_active_profile = contextvars.ContextVar('active_profile', default=None)
+
+FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(sql):
+    """Normalize SQL so queries differing only in literals compare equal"""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class RequestProfile:
+    """Measurements collected for one request"""
+
+    def __init__(self):
+        self.queries = []  # (duration seconds, sql)
+        self.serializer_time = 0.0
+        self.serializer_db_time = 0.0
+        self.serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append((duration, sql))
+            if self.serializer_depth:
+                self.serializer_db_time += duration
+
+    @property
+    def db_time(self):
+        return sum(duration for duration, _ in self.queries)
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[:limit]
+
+    def duplicates(self, threshold):
+        counts = Counter(fingerprint(sql) for _, sql in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+
+# ===============================
+# Serializer Timing
+# ===============================
+
+def _timed_data(data_property):
+    """Wrap a serializer ``data`` property to time the outermost call"""
+
+    def data(self):
+        profile = _active_profile.get()
+        if profile is None:
+            return data_property.fget(self)
+        profile.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return data_property.fget(self)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - start
+
+    data._profiled = True
+    return property(data)
+
+
+def install_serializer_timing():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, '_profiled', False):
+            cls.data = _timed_data(cls.data)
+
+
+# ===============================
+# Middleware
+# ===============================
+
+class RequestProfilingMiddleware:
+    """
+    Profile a sample of requests; see the module docstring. Settings:
+
+    REQUEST_PROFILING_ENABLED      master switch (default False)
+    REQUEST_PROFILING_SAMPLE_RATE  fraction of requests profiled (default 0.01)
+    REQUEST_PROFILING_SLOW_QUERIES how many of the slowest queries to log
+    REQUEST_PROFILING_DUPLICATE_THRESHOLD  repeats of one fingerprint to flag
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def should_profile(self, request):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+            return False
+        return random.random() < getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.01)
+
+    @staticmethod
+    @contextmanager
+    def capture_queries(profile):
+        """Record queries on the calling thread's connections into profile"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record_query))
+            yield
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        install_serializer_timing()
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            with self.capture_queries(profile):
+                response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        self.report(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.should_profile(request):
+            return await self.get_response(request)
+
+        install_serializer_timing()
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        # Connections are per thread and the ORM runs in the request's
+        # sync_to_async thread, so the query wrapper is installed there
+        capture = self.capture_queries(profile)
+        start = time.perf_counter()
+        await sync_to_async(capture.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(capture.__exit__)(None, None, None)
+            _active_profile.reset(token)
+        self.report(request, response, profile, time.perf_counter() - start)
+        return response
+
+    def report(self, request, response, profile, total):
+        slow_limit = getattr(settings, 'REQUEST_PROFILING_SLOW_QUERIES', 3)
+        threshold = getattr(settings, 'REQUEST_PROFILING_DUPLICATE_THRESHOLD', 3)
+        duplicates = profile.duplicates(threshold)
+
+        timings = [
+            f'db;dur={profile.db_time * 1000:.2f};desc="{len(profile.queries)} queries"',
+            f'serializer;dur={profile.serializer_time * 1000:.2f}',
+            f'serializer-db;dur={profile.serializer_db_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ]
+        if duplicates:
+            timings.append(f'n-plus-one;desc="{len(duplicates)} repeated queries"')
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = ', '.join(([existing] if existing else []) + timings)
+
+        logger.info(json.dumps({
+            'event': 'request_profile',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'query_count': len(profile.queries),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'serializer_ms': round(profile.serializer_time * 1000, 2),
+            'serializer_db_ms': round(profile.serializer_db_time * 1000, 2),
+            'slowest_queries': [
+                {'ms': round(duration * 1000, 2), 'sql': sql[:500]}
+                for duration, sql in profile.slowest(slow_limit)
+            ],
+            'duplicate_queries': [
+                {'count': count, 'fingerprint': sql[:500]} for sql, count in duplicates
+            ],
+        }))
+
+
+# ===============================
+# Static Files
+# ===============================
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that also runs natively under ASGI. WhiteNoise
+    itself is sync-only, which makes Django adapt the rest of the chain and
+    run every request through one thread; here only static hits leave the
+    event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+
+# The search vector is maintained entirely in PostgreSQL: it is not a
+# model field, so browse queries never load it. Other backends fall back
+# to the in-process index in app/core/search.py.
+FORWARD_SQL = [
+    'ALTER TABLE "items" ADD COLUMN "search_vector" tsvector',
+    '''
+    CREATE FUNCTION items_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.brand, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.tags, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER items_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, brand, tags ON "items"
+    FOR EACH ROW EXECUTE FUNCTION items_search_vector_update()
+    ''',
+    'UPDATE "items" SET "title" = "title"',
+    'CREATE INDEX "items_search_vector_gin" ON "items" USING gin ("search_vector")',
+]
+
+REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS items_search_vector_trigger ON "items"',
+    'DROP FUNCTION IF EXISTS items_search_vector_update()',
+    'ALTER TABLE "items" DROP COLUMN IF EXISTS "search_vector"',
+]
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in FORWARD_SQL:
+            schema_editor.execute(sql)
+
+
+def remove_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in REVERSE_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, remove_search_vector),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_item_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['-created_at', '-item_id'], name='items_available_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['category', '-created_at', '-item_id'], name='items_available_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['size', '-created_at', '-item_id'], name='items_available_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['condition', '-created_at', '-item_id'], name='items_available_cond_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['uploader', 'status', '-created_at'], name='items_uploader_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender', 'status', '-created_at'], name='txn_sender_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['receiver', 'status', '-created_at'], name='txn_receiver_status_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:52
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Rating = apps.get_model('core', 'Rating')
+    ratings = Rating.objects.filter(rated_user=models.OuterRef('pk')).order_by().values('rated_user')
+    User.objects.update(
+        rating_count=Coalesce(models.Subquery(ratings.annotate(c=models.Count('pk')).values('c')), 0),
+        rating_sum=Coalesce(models.Subquery(ratings.annotate(s=models.Sum('rating')).values('s')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:54
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_user_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsLedgerEntry',
+            fields=[
+                ('entry_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('entry_type', models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sale'), ('adjustment', 'Adjustment')], max_length=15)),
+                ('amount', models.IntegerField(help_text="Signed change to the user's points balance")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Points Ledger Entry',
+                'verbose_name_plural': 'Points Ledger',
+                'db_table': 'points_ledger',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Client key that makes retried purchases safe', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('sender', 'idempotency_key'), name='txn_sender_idempotency_key_uniq'),
+        ),
+        migrations.AddField(
+            model_name='pointsledgerentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='core.transaction'),
+        ),
+        migrations.AddField(
+            model_name='pointsledgerentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='pointsledgerentry',
+            index=models.Index(fields=['user', '-created_at'], name='ledger_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:30
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Item = apps.get_model('core', 'Item')
+    Transaction = apps.get_model('core', 'Transaction')
+
+    def count(rows):
+        rows = rows.order_by().annotate(c=models.Func(models.F('pk'), function='COUNT')).values('c')
+        return Coalesce(models.Subquery(rows), 0)
+
+    swaps = Transaction.objects.filter(
+        models.Q(sender=models.OuterRef('pk')) | models.Q(receiver=models.OuterRef('pk'))
+    )
+    User.objects.update(
+        total_swaps=count(swaps),
+        ongoing_swaps=count(swaps.filter(status__in=('pending', 'accepted'))),
+        completed_swaps=count(swaps.filter(status='completed')),
+        items_listed=count(
+            Item.objects.filter(uploader=models.OuterRef('pk')).exclude(status__in=('removed', 'deleted'))
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_points_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:14
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_user_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+                ('like_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='core.item')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Like',
+                'verbose_name_plural': 'Likes',
+                'db_table': 'likes',
+                'constraints': [models.UniqueConstraint(fields=('user', 'item'), name='like_user_item_uniq')],
+            },
+        ),
+    ]
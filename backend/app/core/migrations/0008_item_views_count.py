@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_likes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='views_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+# Admin search and autocomplete match emails and usernames with iexact and
+# istartswith, which PostgreSQL compiles to UPPER(column) = / LIKE. The
+# pattern operator class serves both. Other backends have no equivalent
+# expression index and keep scanning.
+FORWARD_SQL = [
+    'CREATE INDEX IF NOT EXISTS "users_email_upper_idx" ON "users" (UPPER("email"::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS "users_username_upper_idx" ON "users" (UPPER("username"::text) text_pattern_ops)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX IF EXISTS "users_email_upper_idx"',
+    'DROP INDEX IF EXISTS "users_username_upper_idx"',
+]
+
+
+def add_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in FORWARD_SQL:
+            schema_editor.execute(sql)
+
+
+def remove_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in REVERSE_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
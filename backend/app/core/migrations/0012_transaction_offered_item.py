@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='offered_item',
+            field=models.ForeignKey(blank=True, help_text="The sender's item offered in exchange, for swaps", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='offered_in_transactions', to='core.item'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_transaction_offered_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarItems',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar', serialize=False, to='core.item')),
+                ('similar_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('min_score', models.FloatField(default=-1.0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Similar Items',
+                'verbose_name_plural': 'Similar Items',
+                'db_table': 'similar_items',
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:33
+
+import csv
+import re
+from pathlib import Path
+
+from django.db import migrations, models
+
+
+# A frozen copy of the app.core.geo lookup and geohash encoding at the time
+# of this migration, so later changes to that module or to settings cannot
+# change what it does. geocode_users re-resolves locations after that.
+GAZETTEER = Path(__file__).resolve().parent.parent / 'data' / 'gazetteer.csv'
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 8
+NON_WORD_RE = re.compile(r'[^\w,]+')
+
+
+def normalize_place(text):
+    return ' '.join(NON_WORD_RE.sub(' ', text.lower()).split())
+
+
+def load_gazetteer():
+    with open(GAZETTEER, newline='', encoding='utf-8') as handle:
+        return {
+            normalize_place(row['name']): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(handle)
+        }
+
+
+def geocode(gazetteer, location):
+    text = normalize_place(location)
+    for candidate in (text.replace(',', ' '), *text.split(',')):
+        candidate = ' '.join(candidate.split())
+        if candidate in gazetteer:
+            return gazetteer[candidate]
+    return None
+
+
+def encode_geohash(latitude, longitude):
+    total = 5 * GEOHASH_PRECISION
+    lat_bits, lon_bits = total // 2, total - total // 2
+    lat_index = min((1 << lat_bits) - 1, max(0, int((latitude + 90.0) / 180.0 * (1 << lat_bits))))
+    lon_index = min((1 << lon_bits) - 1, max(0, int((longitude + 180.0) / 360.0 * (1 << lon_bits))))
+    value = 0
+    for bit in range(total):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((lon_index >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((lat_index >> lat_bits) & 1)
+    return ''.join(GEOHASH_ALPHABET[(value >> shift) & 31] for shift in range(total - 5, -1, -5))
+
+
+def geocode_existing_users(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    gazetteer = load_gazetteer()
+    located = []
+    users = User.objects.exclude(location__isnull=True).exclude(location='').only('pk', 'location')
+    for user in users.iterator(chunk_size=1000):
+        point = geocode(gazetteer, user.location)
+        if point is not None:
+            user.latitude, user.longitude = point
+            user.geohash = encode_geohash(*point)
+            located.append(user)
+        if len(located) >= 1000:
+            User.objects.bulk_update(located, ['latitude', 'longitude', 'geohash'])
+            located = []
+    User.objects.bulk_update(located, ['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0013_similar_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('geohash__isnull', False)), fields=['geohash'], name='users_geohash_idx'),
+        ),
+        migrations.RunPython(geocode_existing_users, migrations.RunPython.noop),
+    ]
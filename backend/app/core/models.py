@@ -1,9 +1,13 @@
 from django.db import models
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 import uuid
 
+from .geo import locate
+
 # Extended User Model
 class User(AbstractUser):
     """
@@ -31,12 +35,24 @@ class User(AbstractUser):
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     
-    # Stats (will be calculated fields)
+    # Geocoded from location on save (see app/core/geo.py); null when not in the gazetteer
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    geohash = models.CharField(max_length=12, blank=True, null=True, editable=False)
+    
+    # Stats counters, maintained by app/core/signals.py
     total_swaps = models.IntegerField(default=0)
     items_listed = models.IntegerField(default=0)
     completed_swaps = models.IntegerField(default=0)
     ongoing_swaps = models.IntegerField(default=0)
     
+    # Rating aggregates, maintained by app/core/signals.py
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    
+    # Embedded in access tokens; bumped to revoke them (see app/core/authentication.py)
+    token_version = models.IntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -49,21 +65,131 @@ class User(AbstractUser):
         db_table = 'users'
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Incremental analytics exports
+            models.Index(fields=['updated_at'], name='users_updated_idx'),
+            # Radius searches: one range per covering geohash cell
+            models.Index(fields=['geohash'], condition=models.Q(geohash__isnull=False), name='users_geohash_idx'),
+        ]
+    
+    # Changing any of these revokes the user's tokens
+    TOKEN_STATE_FIELDS = ('password', 'is_active', 'is_suspended', 'role')
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_token_state()
+        return instance
+    
+    def _remember_token_state(self):
+        """Remember the loaded values of TOKEN_STATE_FIELDS"""
+        self._token_state = {name: self.__dict__.get(name) for name in self.TOKEN_STATE_FIELDS}
+    
+    def save(self, *args, **kwargs):
+        """
+        Bump token_version when a field that tokens depend on changes, and
+        geocode location when it is saved
+        """
+        remembered = getattr(self, '_token_state', None)
+        update_fields = kwargs.get('update_fields')
+        self._moved = False
+        if update_fields is None or 'location' in update_fields:
+            geohash = self.geohash
+            self.geocode_location()
+            # Read by signals.user_located to invalidate cached radius searches
+            self._moved = self.geohash != geohash and not self._state.adding
+            if update_fields is not None:
+                update_fields = kwargs['update_fields'] = [*update_fields, 'latitude', 'longitude', 'geohash']
+        if remembered is not None:
+            fields = [
+                name for name in self.TOKEN_STATE_FIELDS
+                if update_fields is None or name in update_fields
+            ]
+            if any(remembered[name] is not None and remembered[name] != getattr(self, name) for name in fields):
+                self.token_version += 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = [*update_fields, 'token_version']
+        super().save(*args, **kwargs)
+        self._remember_token_state()
+    
+    def geocode_location(self):
+        """Set latitude, longitude and geohash from location"""
+        self.latitude, self.longitude, self.geohash = locate(self.location)
+    
+    def check_password(self, raw_password):
+        """
+        Verify a password, upgrading an outdated hash in place. The upgrade
+        stores the same password, so it does not revoke existing tokens.
+        """
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            if getattr(self, '_token_state', None):
+                self._token_state['password'] = self.password
+            self.save(update_fields=['password'])
+        return check_password(raw_password, self.password, setter)
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
     @property
     def average_rating(self):
-        """Calculate average rating from all ratings received"""
-        ratings = self.received_ratings.all()
-        if ratings.exists():
-            return round(ratings.aggregate(models.Avg('rating'))['rating__avg'], 1)
+        """Average rating received, from the stored rating aggregates"""
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
         return 0.0
+    
+    @classmethod
+    def adjust_rating_aggregates(cls, user_id, count_delta, sum_delta):
+        """Atomically apply a delta to a user's rating aggregates"""
+        cls.objects.filter(pk=user_id).update(
+            rating_count=models.F('rating_count') + count_delta,
+            rating_sum=models.F('rating_sum') + sum_delta,
+        )
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, queryset=None):
+        """Recompute rating aggregates from the ratings table in one UPDATE"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        ratings = Rating.objects.filter(rated_user=models.OuterRef('pk')).order_by().values('rated_user')
+        return queryset.update(
+            rating_count=Coalesce(models.Subquery(ratings.annotate(c=models.Count('pk')).values('c')), 0),
+            rating_sum=Coalesce(models.Subquery(ratings.annotate(s=models.Sum('rating')).values('s')), 0),
+        )
+    
+    @classmethod
+    def adjust_stats(cls, user_ids, **deltas):
+        """Atomically apply counter deltas, e.g. ``ongoing_swaps=-1``, to users"""
+        changes = {name: models.F(name) + delta for name, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(pk__in=user_ids).update(**changes)
+    
+    @classmethod
+    def rebuild_stats(cls, queryset=None):
+        """Recompute the stats counters from items and transactions in one UPDATE"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        
+        def count(rows):
+            rows = rows.order_by().annotate(c=models.Func(models.F('pk'), function='COUNT')).values('c')
+            return Coalesce(models.Subquery(rows), 0)
+        
+        swaps = Transaction.objects.filter(
+            models.Q(sender=models.OuterRef('pk')) | models.Q(receiver=models.OuterRef('pk'))
+        )
+        return queryset.update(
+            total_swaps=count(swaps),
+            ongoing_swaps=count(swaps.filter(status__in=Transaction.ONGOING_STATUSES)),
+            completed_swaps=count(swaps.filter(status='completed')),
+            items_listed=count(
+                Item.objects.filter(uploader=models.OuterRef('pk')).exclude(status__in=Item.UNLISTED_STATUSES)
+            ),
+        )
 
 
 class Item(models.Model):
@@ -116,6 +242,9 @@ class Item(models.Model):
         ('removed', 'Removed'),
     ]
     
+    # Statuses that do not count towards the uploader's items_listed
+    UNLISTED_STATUSES = ('removed', 'deleted')
+    
     # Primary fields
     item_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploaded_items')
@@ -135,6 +264,11 @@ class Item(models.Model):
     color = models.CharField(max_length=50, blank=True, null=True)
     points_value = models.IntegerField(default=0, help_text="Points required for exchange")
     
+    # Like counter, maintained by app/core/signals.py
+    likes_count = models.IntegerField(default=0)
+    # View counter, written in batches by app/core/view_counts.py
+    views_count = models.IntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -144,6 +278,17 @@ class Item(models.Model):
         verbose_name = 'Item'
         verbose_name_plural = 'Items'
         ordering = ['-created_at']
+        indexes = [
+            # Browse feed: available items, newest first, optionally by category/size/condition
+            models.Index(fields=['-created_at', '-item_id'], condition=models.Q(status='available'), name='items_available_recent_idx'),
+            models.Index(fields=['category', '-created_at', '-item_id'], condition=models.Q(status='available'), name='items_available_cat_idx'),
+            models.Index(fields=['size', '-created_at', '-item_id'], condition=models.Q(status='available'), name='items_available_size_idx'),
+            models.Index(fields=['condition', '-created_at', '-item_id'], condition=models.Q(status='available'), name='items_available_cond_idx'),
+            # My items: by uploader, optionally by status, newest first
+            models.Index(fields=['uploader', 'status', '-created_at'], name='items_uploader_status_idx'),
+            # Incremental analytics exports
+            models.Index(fields=['updated_at'], name='items_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.uploader.full_name}"
@@ -152,6 +297,21 @@ class Item(models.Model):
     def tag_list(self):
         """Return tags as a list"""
         return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_browse_state()
+        instance._remember_listing()
+        return instance
+    
+    def _remember_browse_state(self):
+        """Remember the (category, status) the browse cache last saw for this row"""
+        self._browse_state = (self.__dict__.get('category'), self.__dict__.get('status'))
+    
+    def _remember_listing(self):
+        """Remember the (uploader_id, status) counted in items_listed for this row"""
+        self._listing = (self.__dict__.get('uploader_id'), self.__dict__.get('status'))
 
 
 class ItemImage(models.Model):
@@ -195,11 +355,18 @@ class Transaction(models.Model):
         ('disputed', 'Disputed'),
     ]
     
+    # Statuses counted in the parties' ongoing_swaps
+    ONGOING_STATUSES = ('pending', 'accepted')
+    
     # Primary fields
     transaction_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_transactions')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_transactions')
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='transactions')
+    offered_item = models.ForeignKey(
+        Item, on_delete=models.SET_NULL, null=True, blank=True, related_name='offered_in_transactions',
+        help_text="The sender's item offered in exchange, for swaps"
+    )
     
     # Transaction details
     method = models.CharField(max_length=15, choices=TRANSACTION_METHODS)
@@ -209,6 +376,7 @@ class Transaction(models.Model):
     # Additional fields
     message = models.TextField(blank=True, null=True, max_length=500)
     admin_notes = models.TextField(blank=True, null=True)
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, help_text="Client key that makes retried purchases safe")
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -220,6 +388,16 @@ class Transaction(models.Model):
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         ordering = ['-created_at']
+        indexes = [
+            # My swaps: sender OR receiver, optionally by status, newest first
+            models.Index(fields=['sender', 'status', '-created_at'], name='txn_sender_status_idx'),
+            models.Index(fields=['receiver', 'status', '-created_at'], name='txn_receiver_status_idx'),
+            # Incremental analytics exports
+            models.Index(fields=['updated_at'], name='txn_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['sender', 'idempotency_key'], name='txn_sender_idempotency_key_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.method.title()} - {self.sender.full_name} to {self.receiver.full_name}"
@@ -229,6 +407,55 @@ class Transaction(models.Model):
         self.status = 'completed'
         self.completed_at = timezone.now()
         self.save()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_stats_state()
+        return instance
+    
+    def _remember_stats_state(self):
+        """Remember the (sender_id, receiver_id, status) counted in the parties' stats"""
+        self._stats_state = (
+            self.__dict__.get('sender_id'), self.__dict__.get('receiver_id'), self.__dict__.get('status')
+        )
+
+
+class PointsLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a user's points balance
+    """
+    ENTRY_TYPES = [
+        ('purchase', 'Purchase'),
+        ('sale', 'Sale'),
+        ('adjustment', 'Adjustment'),
+    ]
+    
+    entry_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries')
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, related_name='ledger_entries', null=True, blank=True)
+    entry_type = models.CharField(max_length=15, choices=ENTRY_TYPES)
+    amount = models.IntegerField(help_text="Signed change to the user's points balance")
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'points_ledger'
+        verbose_name = 'Points Ledger Entry'
+        verbose_name_plural = 'Points Ledger'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='ledger_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.amount:+d} pts ({self.entry_type}) for user {self.user_id}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
 
 
 class Rating(models.Model):
@@ -254,6 +481,82 @@ class Rating(models.Model):
         verbose_name_plural = 'Ratings'
         ordering = ['-created_at']
         unique_together = ['rater', 'rated_user', 'transaction']
+        indexes = [
+            # Incremental analytics exports
+            models.Index(fields=['updated_at'], name='ratings_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.rating}★ - {self.rater.full_name} rated {self.rated_user.full_name}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_aggregated_values()
+        return instance
+    
+    def _remember_aggregated_values(self):
+        """Remember what this row contributes to its user's rating aggregates"""
+        self._aggregated_values = (self.__dict__.get('rated_user_id'), self.__dict__.get('rating'))
+
+
+class Like(models.Model):
+    """
+    Model for a user liking an item
+    """
+    like_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='likes')
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'likes'
+        verbose_name = 'Like'
+        verbose_name_plural = 'Likes'
+        constraints = [
+            # Also serves the (user, item IN page) lookup behind is_liked
+            models.UniqueConstraint(fields=['user', 'item'], name='like_user_item_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.full_name} likes {self.item.title}"
+    
+    @classmethod
+    def liked_item_ids(cls, user, item_ids):
+        """Return the subset of item_ids liked by user, in one query"""
+        item_ids = list(item_ids)
+        if not item_ids or not user or not user.is_authenticated:
+            return set()
+        return set(cls.objects.filter(user=user, item_id__in=item_ids).values_list('item_id', flat=True))
+    
+    @classmethod
+    async def aliked_item_ids(cls, user, item_ids):
+        """Async liked_item_ids"""
+        item_ids = list(item_ids)
+        if not item_ids or not user or not user.is_authenticated:
+            return set()
+        return {pk async for pk in cls.objects.filter(user=user, item_id__in=item_ids).values_list('item_id', flat=True)}
+
+
+class SimilarItems(models.Model):
+    """
+    Precomputed most similar available items of an item, written by the
+    build_similar_items job (app/core/recommendations.py)
+    """
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, primary_key=True, related_name='similar')
+    # Item ids, most similar first, and their cosine similarities
+    similar_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    # Score an item must beat to enter a full list, -1 while the list is short
+    min_score = models.FloatField(default=-1.0)
+    computed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'similar_items'
+        verbose_name = 'Similar Items'
+        verbose_name_plural = 'Similar Items'
+    
+    def __str__(self):
+        return f"{len(self.similar_ids)} items similar to {self.item_id}"
@@ -0,0 +1,183 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import DateTimeField, FloatField, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.utils.urls import replace_query_param
+
+
+# ===============================
+# Cursor Helpers
+# ===============================
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded"""
+
+
+def encode_cursor(ordering, position, pk):
+    """Encode a (position, pk) keyset position under an ordering field as an opaque URL-safe token"""
+    if hasattr(position, 'isoformat'):
+        position = position.isoformat()
+    raw = json.dumps([ordering, position, str(pk)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, ordering, field):
+    """
+    Decode a token produced by encode_cursor back into (position, pk).
+    Tokens issued for another ordering are rejected, and the position must
+    be a value of the ordering's field: a datetime for a DateTimeField
+    (e.g. created_at), a number for a FloatField (e.g. search_rank).
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_ordering, position, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if cursor_ordering != ordering:
+            position = None
+        elif isinstance(field, DateTimeField):
+            position = parse_datetime(position) if isinstance(position, str) else None
+        elif isinstance(field, FloatField):
+            is_number = isinstance(position, (int, float)) and not isinstance(position, bool)
+            position = float(position) if is_number else None
+        else:
+            position = None
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if position is None:
+        raise InvalidCursor('Invalid cursor')
+    return position, pk
+
+
+def approximate_count(queryset, exact_below=1000):
+    """
+    Return a cheap row count for a queryset.
+
+    On PostgreSQL the planner's row estimate is used instead of a full
+    COUNT(*); small estimates are re-counted exactly since that is cheap.
+    Other backends always count exactly.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < exact_below:
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Page-number paginator counting with approximate_count(), for admin
+    changelists over large tables: lists estimated above
+    ADMIN_EXACT_COUNT_BELOW rows skip the full COUNT(*)
+    """
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list, exact_below=settings.ADMIN_EXACT_COUNT_BELOW)
+
+
+# ===============================
+# Keyset Pagination
+# ===============================
+
+class KeysetPagination:
+    """
+    Keyset (cursor) pagination ordered by (ordering_field, pk) descending.
+
+    Each page is fetched with a range predicate on the last row seen, so
+    page N costs the same index scan as page 1. The total count is only
+    computed when the client asks for it with ?count=exact or ?count=approx.
+    """
+    ordering_field = 'created_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    max_page_size = 100
+
+    def __init__(self, ordering_field=None):
+        if ordering_field:
+            self.ordering_field = ordering_field
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        pk_field = queryset.model._meta.pk
+        pk_name = pk_field.name
+
+        self.count = None
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'approx':
+            self.count = approximate_count(queryset)
+
+        queryset = queryset.order_by(f'-{self.ordering_field}', f'-{pk_name}')
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            position, pk = decode_cursor(token, self.ordering_field, self.get_ordering_output_field(queryset))
+            try:
+                pk = pk_field.to_python(pk)
+            except ValidationError:
+                raise InvalidCursor('Invalid cursor')
+            queryset = queryset.filter(
+                Q(**{f'{self.ordering_field}__lt': position}) |
+                Q(**{self.ordering_field: position, f'{pk_name}__lt': pk})
+            )
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        page = rows[:self.page_size_value]
+
+        self.next_cursor = None
+        if self.has_next and page:
+            last = page[-1]
+            self.next_cursor = encode_cursor(self.ordering_field, getattr(last, self.ordering_field), last.pk)
+        return page
+
+    def get_ordering_output_field(self, queryset):
+        """The model field or annotation output field the queryset is ordered by"""
+        annotation = queryset.query.annotations.get(self.ordering_field)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(self.ordering_field)
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        payload = {
+            'success': True,
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'page_size': self.page_size_value,
+            'results': data,
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+        return payload
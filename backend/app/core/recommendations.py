@@ -0,0 +1,295 @@
+"""
+Similar item recommendations, precomputed offline.
+
+Every available item is encoded as a unit feature vector: one-hot size and
+condition, hashed buckets for brand, colour and tags, and the points value
+as an angle, so the dot product of two vectors is their cosine similarity.
+Each block is scaled by FEATURE_WEIGHTS. Items are only compared within
+their category. For each category the vectors are stacked into a matrix,
+which is multiplied by SIMILAR_ITEMS_BATCH_SIZE rows of itself at a time;
+argpartition then keeps the top SIMILAR_ITEMS_K of each row. Results are
+stored one SimilarItems row per item, which /api/items/<id>/similar/ reads
+with a single lookup.
+
+The build_similar_items command runs either job:
+
+- rebuild_similar_items() recomputes every category. Run it nightly.
+- refresh_similar_items() handles items listed or edited since their row
+  was written. It computes their neighbours, removes edited items from the
+  lists they were in (including lists of a category they left), and adds
+  them to the lists of existing items they now rank in. Run it every few
+  minutes.
+"""
+import math
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Item, SimilarItems
+
+
+FEATURE_FIELDS = ('item_id', 'size', 'condition', 'brand', 'color', 'tags', 'points_value')
+
+# Relative weights of the feature blocks in the cosine similarity
+FEATURE_WEIGHTS = {
+    'size': 1.0,
+    'condition': 0.5,
+    'brand': 1.0,
+    'color': 0.75,
+    'tags': 1.5,
+    'points': 0.5,
+}
+
+SIZES = {choice: i for i, (choice, _) in enumerate(Item.ITEM_SIZES)}
+CONDITIONS = {choice: i for i, (choice, _) in enumerate(Item.ITEM_CONDITIONS)}
+HASH_BUCKETS = {'brand': 32, 'color': 16, 'tags': 64}
+# Points values at or above this are at the end of the points scale
+POINTS_CEILING = 500
+
+# Column offset of each block
+BLOCKS = {}
+DIMENSIONS = 0
+for _name, _width in (
+    ('size', len(SIZES)), ('condition', len(CONDITIONS)), ('brand', HASH_BUCKETS['brand']),
+    ('color', HASH_BUCKETS['color']), ('tags', HASH_BUCKETS['tags']), ('points', 2),
+):
+    BLOCKS[_name] = DIMENSIONS
+    DIMENSIONS += _width
+
+# Categories with more new items than this fraction are rebuilt by refresh
+FULL_REFRESH_FRACTION = 0.2
+
+ITERATOR_CHUNK_SIZE = 5000
+
+
+# ===============================
+# Feature Vectors
+# ===============================
+
+def _bucket(text, buckets):
+    # crc32 rather than hash(), which differs between processes
+    return zlib.crc32(text.strip().lower().encode()) % buckets
+
+
+def encode_items(rows):
+    """
+    ``(item_ids, matrix)`` for rows of FEATURE_FIELDS, the matrix holding
+    one float32 unit vector per row
+    """
+    item_ids, points = [], []
+    coords, values = ([], []), []
+
+    def put(row, column, value):
+        coords[0].append(row)
+        coords[1].append(column)
+        values.append(value)
+
+    weights = {name: math.sqrt(weight) for name, weight in FEATURE_WEIGHTS.items()}
+    for row, (item_id, size, condition, brand, color, tags, points_value) in enumerate(rows):
+        item_ids.append(item_id)
+        points.append(points_value or 0)
+        if size in SIZES:
+            put(row, BLOCKS['size'] + SIZES[size], weights['size'])
+        if condition in CONDITIONS:
+            put(row, BLOCKS['condition'] + CONDITIONS[condition], weights['condition'])
+        for name, text in (('brand', brand), ('color', color)):
+            if text and text.strip():
+                put(row, BLOCKS[name] + _bucket(text, HASH_BUCKETS[name]), weights[name])
+        tag_list = [tag for tag in (tags or '').split(',') if tag.strip()]
+        for tag in tag_list:
+            put(row, BLOCKS['tags'] + _bucket(tag, HASH_BUCKETS['tags']), weights['tags'] / math.sqrt(len(tag_list)))
+
+    matrix = np.zeros((len(item_ids), DIMENSIONS), dtype=np.float32)
+    # add.at, as tags can hash to the same bucket
+    np.add.at(matrix, (np.array(coords[0], dtype=np.intp), np.array(coords[1], dtype=np.intp)), values)
+    angles = np.minimum(np.log1p(np.maximum(points, 0)) / math.log1p(POINTS_CEILING), 1.0) * (math.pi / 2)
+    matrix[:, BLOCKS['points']] = np.cos(angles) * weights['points']
+    matrix[:, BLOCKS['points'] + 1] = np.sin(angles) * weights['points']
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return item_ids, matrix
+
+
+def encode_category(category):
+    """``(item_ids, matrix)`` of the available items in category"""
+    rows = Item.objects.filter(status='available', category=category).order_by().values_list(*FEATURE_FIELDS)
+    return encode_items(rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+
+
+# ===============================
+# Nearest Neighbours
+# ===============================
+
+def top_k(matrix, rows, k, batch_size):
+    """
+    Yield ``(rows, neighbours, scores)`` per batch of the given row indices:
+    for each row the indices and scores of its k most similar other rows,
+    best first
+    """
+    k = min(k, len(matrix) - 1)
+    for start in range(0, len(rows), batch_size):
+        batch = np.asarray(rows[start:start + batch_size], dtype=np.intp)
+        if k <= 0:
+            empty = np.empty((len(batch), 0))
+            yield batch, empty.astype(np.intp), empty
+            continue
+        scores = matrix[batch] @ matrix.T
+        scores[np.arange(len(batch)), batch] = -np.inf
+        neighbours = np.argpartition(scores, -k, axis=1)[:, -k:]
+        best = np.take_along_axis(scores, neighbours, axis=1)
+        order = np.argsort(-best, axis=1, kind='stable')
+        yield batch, np.take_along_axis(neighbours, order, axis=1), np.take_along_axis(best, order, axis=1)
+
+
+def _similar_items(item_id, similar_ids, scores, k, now):
+    """A SimilarItems row from similar_ids as strings and scores rounded to 4 places"""
+    return SimilarItems(
+        item_id=item_id, similar_ids=similar_ids, scores=scores,
+        min_score=scores[-1] if len(scores) >= k else -1.0, computed_at=now,
+    )
+
+
+def _save(rows):
+    SimilarItems.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['item'],
+        update_fields=['similar_ids', 'scores', 'min_score', 'computed_at'],
+    )
+
+
+def _save_neighbours(item_ids, matrix, rows, k, batch_size):
+    now = timezone.now()
+    # Each item is in many lists, so convert its id once
+    keys = [str(pk) for pk in item_ids]
+    for batch, neighbours, scores in top_k(matrix, rows, k, batch_size):
+        scores = scores.astype(np.float64).round(4).tolist()
+        _save([
+            _similar_items(item_ids[row], [keys[n] for n in row_neighbours], row_scores, k, now)
+            for row, row_neighbours, row_scores in zip(batch.tolist(), neighbours.tolist(), scores)
+        ])
+
+
+def _available_categories():
+    return Item.objects.filter(status='available').order_by().values_list('category', flat=True).distinct()
+
+
+def rebuild_similar_items(k=None, batch_size=None, log=None):
+    """Recompute the similar items of every available item; returns how many"""
+    k = k or settings.SIMILAR_ITEMS_K
+    batch_size = batch_size or settings.SIMILAR_ITEMS_BATCH_SIZE
+    log = log or (lambda message: None)
+    total = 0
+    for category in list(_available_categories()):
+        item_ids, matrix = encode_category(category)
+        _save_neighbours(item_ids, matrix, np.arange(len(item_ids)), k, batch_size)
+        log(f'{category}: {len(item_ids)} items')
+        total += len(item_ids)
+    # Rows of items that were swapped, donated or removed
+    SimilarItems.objects.exclude(item__status='available').delete()
+    return total
+
+
+def refresh_similar_items(k=None, batch_size=None, log=None):
+    """
+    Compute the similar items of items listed or edited since their row
+    was written, and add them to existing lists they now rank in. Returns
+    how many items were refreshed.
+    """
+    k = k or settings.SIMILAR_ITEMS_K
+    batch_size = batch_size or settings.SIMILAR_ITEMS_BATCH_SIZE
+    log = log or (lambda message: None)
+    stale = Item.objects.filter(status='available').filter(
+        Q(similar__isnull=True) | Q(updated_at__gt=F('similar__computed_at'))
+    )
+    by_category = defaultdict(set)
+    for category, item_id in stale.order_by().values_list('category', 'item_id').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        by_category[category].add(item_id)
+    edited = list(stale.filter(similar__isnull=False).values_list('item_id', flat=True))
+    if edited:
+        _drop_from_existing(edited, set(by_category), k, batch_size)
+
+    for category, new_ids in by_category.items():
+        item_ids, matrix = encode_category(category)
+        if len(new_ids) > len(item_ids) * FULL_REFRESH_FRACTION:
+            _save_neighbours(item_ids, matrix, np.arange(len(item_ids)), k, batch_size)
+            log(f'{category}: rebuilt {len(item_ids)} items')
+            continue
+
+        rows = np.array([row for row, item_id in enumerate(item_ids) if item_id in new_ids], dtype=np.intp)
+        _save_neighbours(item_ids, matrix, rows, k, batch_size)
+        _insert_into_existing(category, item_ids, matrix, rows, k, batch_size)
+        log(f'{category}: {len(rows)} new of {len(item_ids)} items')
+    return sum(len(new_ids) for new_ids in by_category.values())
+
+
+def _drop_from_existing(edited_ids, categories, k, batch_size):
+    """
+    Remove edited items from the stored lists of other items, so a score
+    from before the edit, or from a category the item has left, does not
+    linger. Lists are only compared within a category, so the lists of
+    categories and of each item's previous category (that of its first
+    stored neighbour) are searched. Refresh then adds the items back where
+    they still rank.
+    """
+    keys = {str(pk) for pk in edited_ids}
+    previous = [
+        similar_ids[0]
+        for similar_ids in SimilarItems.objects.filter(item_id__in=edited_ids).values_list('similar_ids', flat=True)
+        if similar_ids
+    ]
+    categories = set(categories) | set(
+        Item.objects.filter(pk__in=previous).order_by().values_list('category', flat=True).distinct()
+    )
+    lists = SimilarItems.objects.filter(item__category__in=categories).exclude(item_id__in=edited_ids)
+
+    now = timezone.now()
+    updated = []
+    for item_id, similar_ids, scores in lists.values_list('item_id', 'similar_ids', 'scores').iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    ):
+        if keys.isdisjoint(similar_ids):
+            continue
+        kept = [(pk, score) for pk, score in zip(similar_ids, scores) if pk not in keys]
+        updated.append(_similar_items(item_id, [pk for pk, _ in kept], [score for _, score in kept], k, now))
+    for start in range(0, len(updated), batch_size):
+        _save(updated[start:start + batch_size])
+
+
+def _insert_into_existing(category, item_ids, matrix, new_rows, k, batch_size):
+    """Add the items at new_rows to the stored lists of other items they now rank in"""
+    new_ids = {item_ids[row] for row in new_rows}
+    stored = SimilarItems.objects.filter(item__category=category, item__status='available')
+    min_scores = {
+        item_id: min_score
+        for item_id, min_score in stored.values_list('item_id', 'min_score').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        if item_id not in new_ids
+    }
+    if not min_scores:
+        return
+    existing = np.array([row for row, item_id in enumerate(item_ids) if item_id in min_scores], dtype=np.intp)
+    thresholds = np.array([min_scores[item_ids[row]] for row in existing], dtype=np.float32)
+
+    # existing row -> [(score, new item id)] beating its current k-th score
+    candidates = defaultdict(list)
+    for start in range(0, len(new_rows), batch_size):
+        batch = new_rows[start:start + batch_size]
+        scores = matrix[existing] @ matrix[batch].T
+        for i, j in zip(*np.nonzero(scores > thresholds[:, None])):
+            candidates[existing[i]].append((float(scores[i, j]), item_ids[batch[j]]))
+    if not candidates:
+        return
+
+    now = timezone.now()
+    stored = SimilarItems.objects.in_bulk([item_ids[row] for row in candidates])
+    updated = []
+    for row, found in candidates.items():
+        current = stored[item_ids[row]]
+        merged = {pk: score for pk, score in zip(current.similar_ids, current.scores)}
+        merged.update((str(pk), round(score, 4)) for score, pk in found)
+        best = sorted(merged.items(), key=lambda pair: -pair[1])[:k]
+        updated.append(_similar_items(item_ids[row], [pk for pk, _ in best], [score for _, score in best], k, now))
+    for start in range(0, len(updated), batch_size):
+        _save(updated[start:start + batch_size])
+
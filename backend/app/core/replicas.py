@@ -0,0 +1,157 @@
+"""
+Read replica routing with read-your-writes stickiness.
+
+Reads go to the primary unless a view opts in with ReplicaReadMixin: its
+safe-method requests read from a random alias in DATABASE_REPLICAS, after
+authentication and permission checks (which stay on the primary). A
+request that writes switches back to the primary for the rest of the
+request, and ReplicaPinMiddleware then pins the writing user to the
+primary for DATABASE_REPLICA_PIN_SECONDS so their next reads see the
+write despite replication lag. Pins live in the cache, so with several
+worker processes they need a shared cache (REDIS_URL).
+
+Reads inside a transaction on the primary always use the primary, and
+nothing is migrated on a replica. With no replicas configured every read
+goes to the primary and the middleware does nothing.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Alias safe reads go to in the current request, or None for the primary
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+# Whether the current request has written to the primary
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """Send user's reads to the primary for DATABASE_REPLICA_PIN_SECONDS"""
+    cache.set(_pin_key(user.pk), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return bool(cache.get(_pin_key(user.pk)))
+
+
+def pick_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary within the block, e.g. to build a shared cache entry"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Database router for DATABASE_REPLICAS; see the module docstring"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Read your own write for the rest of the request
+        _read_alias.set(None)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+    """
+    APIView mixin sending the view's GET/HEAD/OPTIONS reads to a replica,
+    unless the requesting user is pinned to the primary by a recent write.
+    Works with APIView and AsyncAPIView.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and request.method in SAFE_METHODS:
+            user = request.user
+            if not (user.is_authenticated and is_pinned(user)):
+                _read_alias.set(pick_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Under WSGI the context outlives the request, so always clear it
+        _read_alias.set(None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """Pin a user to the primary after a request in which they wrote"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                self.pin(request)
+        finally:
+            _wrote.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        token = _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            if _wrote.get():
+                await self.apin(request)
+        finally:
+            _wrote.reset(token)
+        return response
+
+    @staticmethod
+    def _writer(request):
+        # DRF sets the authenticated user on the underlying request
+        user = getattr(request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def pin(self, request):
+        user = self._writer(request)
+        if user is not None:
+            pin_to_primary(user)
+
+    async def apin(self, request):
+        # request.user may still be the lazy session user, which queries
+        await sync_to_async(self.pin)(request)
@@ -0,0 +1,213 @@
+"""
+Full-text search for items.
+
+On PostgreSQL, items carry a weighted ``search_vector`` tsvector column that
+a trigger keeps up to date (see migration 0002), backed by a GIN index.
+Queries are ranked with ts_rank and the last term is prefix-matched so
+the frontend search box works as type-ahead.
+
+Other backends (SQLite in tests and local development) use an in-process
+inverted index with the same weighting and prefix semantics.
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_CONFIG = 'english'
+
+# Same relative weights PostgreSQL's ts_rank uses for labels A/B/C
+FIELD_WEIGHTS = {
+    'title': 1.0,
+    'brand': 0.4,
+    'tags': 0.4,
+    'description': 0.2,
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lower-cased word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def build_tsquery(search):
+    """
+    Build a to_tsquery() expression from free text: every term must match
+    and the last one is a prefix match, e.g. 'denim jack' -> 'denim & jack:*'
+    """
+    terms = tokenize(search)
+    if not terms:
+        return None
+    terms[-1] = f'{terms[-1]}:*'
+    return ' & '.join(terms)
+
+
+# ===============================
+# Fallback Inverted Index
+# ===============================
+
+class InvertedIndex:
+    """
+    Thread-safe in-memory inverted index over item text fields, used when
+    the database has no native full-text search
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # term -> {pk: score}
+        self._documents = {}  # pk -> set of terms
+        self._vocabulary = []  # sorted terms, for prefix lookups
+        self.loaded = False
+
+    def _add(self, pk, fields):
+        self._remove(pk)
+        terms = set()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(fields.get(field)):
+                postings = self._postings[term]
+                postings[pk] = postings.get(pk, 0.0) + weight
+                if term not in terms:
+                    terms.add(term)
+                    index = bisect.bisect_left(self._vocabulary, term)
+                    if index == len(self._vocabulary) or self._vocabulary[index] != term:
+                        self._vocabulary.insert(index, term)
+        self._documents[pk] = terms
+
+    def _remove(self, pk):
+        for term in self._documents.pop(pk, ()):
+            self._postings[term].pop(pk, None)
+
+    def add(self, pk, fields):
+        with self._lock:
+            self._add(pk, fields)
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def load(self, rows):
+        """Replace the index contents with (pk, fields) rows"""
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._vocabulary = []
+            for pk, fields in rows:
+                self._add(pk, fields)
+            self.loaded = True
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, text):
+        """Return {pk: score} for documents matching every term in text"""
+        terms = tokenize(text)
+        if not terms:
+            return {}
+
+        with self._lock:
+            scores = None
+            for position, term in enumerate(terms):
+                if position == len(terms) - 1:
+                    matched = defaultdict(float)
+                    for candidate in self._prefix_terms(term):
+                        for pk, score in self._postings[candidate].items():
+                            matched[pk] += score
+                else:
+                    matched = dict(self._postings.get(term, {}))
+
+                if scores is None:
+                    scores = dict(matched)
+                else:
+                    scores = {pk: scores[pk] + score for pk, score in matched.items() if pk in scores}
+                if not scores:
+                    return {}
+        return scores
+
+
+fallback_index = InvertedIndex()
+
+
+def _item_fields(item):
+    return {field: getattr(item, field) for field in FIELD_WEIGHTS}
+
+
+def _ensure_fallback_index(model, using):
+    if not fallback_index.loaded:
+        rows = model._default_manager.using(using).values_list('pk', *FIELD_WEIGHTS)
+        fallback_index.load(
+            (row[0], dict(zip(FIELD_WEIGHTS, row[1:])))
+            for row in rows.iterator()
+        )
+
+
+def index_item(sender, instance, using, **kwargs):
+    """post_save receiver keeping the fallback index in sync"""
+    if connections[using].vendor != 'postgresql' and fallback_index.loaded:
+        fallback_index.add(instance.pk, _item_fields(instance))
+
+
+def index_items(items, using='default'):
+    """Add bulk-created items, which send no post_save, to the fallback index"""
+    if connections[using].vendor != 'postgresql' and fallback_index.loaded:
+        for item in items:
+            fallback_index.add(item.pk, _item_fields(item))
+
+
+def unindex_item(sender, instance, using, **kwargs):
+    """post_delete receiver keeping the fallback index in sync"""
+    if connections[using].vendor != 'postgresql' and fallback_index.loaded:
+        fallback_index.remove(instance.pk)
+
+
+# ===============================
+# Queryset Search
+# ===============================
+
+def _no_matches(queryset):
+    return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_items(queryset, search):
+    """
+    Filter an Item queryset to rows matching ``search`` and annotate each
+    with a ``search_rank`` (higher is better)
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        tsquery = build_tsquery(search)
+        if tsquery is None:
+            return _no_matches(queryset)
+        table = queryset.model._meta.db_table
+        params = (SEARCH_CONFIG, tsquery)
+        return queryset.filter(
+            RawSQL(f'"{table}"."search_vector" @@ to_tsquery(%s, %s)', params, output_field=BooleanField())
+        ).annotate(
+            # ts_rank is a real; as double precision it round-trips through a
+            # cursor's JSON float, so the keyset's tie comparison matches
+            search_rank=RawSQL(
+                f'ts_rank("{table}"."search_vector", to_tsquery(%s, %s))::double precision',
+                params, output_field=FloatField(),
+            )
+        )
+
+    _ensure_fallback_index(queryset.model, queryset.db)
+    scores = fallback_index.search(search)
+    if not scores:
+        return _no_matches(queryset)
+    return queryset.filter(pk__in=scores.keys()).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in scores.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
@@ -1,7 +1,11 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.files.storage import default_storage
 from django.contrib.auth.password_validation import validate_password
-from .models import User, Item, ItemImage, Transaction, Rating
+from .images import build_sources, build_srcset, variant_name, variants_ready
+from .view_counts import pending_views
+from .models import User, Item, ItemImage, Transaction, Rating, Like
 
 
 # ===============================
@@ -94,13 +98,41 @@ class UserPublicProfileSerializer(serializers.ModelSerializer):
 # Item Serializers
 # ===============================
 
+def get_primary_image_url(item, request=None):
+    """
+    Resolve the primary image URL of an item from item.images.all(), so
+    views that prefetch 'images' pay no extra query per item. Uploads
+    resolve to their IMAGE_FEED_WIDTH WebP variant rather than the original
+    once their variants have been written.
+    """
+    primary_image = next((image for image in item.images.all() if image.is_primary), None)
+    if primary_image:
+        name = primary_image.image.name
+        if variants_ready(name):
+            url = default_storage.url(variant_name(name, settings.IMAGE_FEED_WIDTH, 'webp'))
+        else:
+            url = primary_image.image.url
+        if request:
+            return request.build_absolute_uri(url)
+        return url
+    return None
+
+
 class ItemImageSerializer(serializers.ModelSerializer):
     """Serializer for item images"""
+    srcset = serializers.SerializerMethodField()
+    sources = serializers.SerializerMethodField()
     
     class Meta:
         model = ItemImage
-        fields = ('image_id', 'image', 'is_primary', 'alt_text', 'created_at')
+        fields = ('image_id', 'image', 'srcset', 'sources', 'is_primary', 'alt_text', 'created_at')
         read_only_fields = ('image_id', 'created_at')
+    
+    def get_srcset(self, obj):
+        return build_srcset(obj.image.name)
+    
+    def get_sources(self, obj):
+        return build_sources(obj.image.name)
 
 
 class ItemCreateSerializer(serializers.ModelSerializer):
@@ -135,38 +167,62 @@ class ItemCreateSerializer(serializers.ModelSerializer):
         return item
 
 
+def is_liked_by_requester(item, context):
+    """
+    Whether the requesting user likes item: from a 'liked_item_ids' set in
+    the context, otherwise with one query
+    """
+    liked = context.get('liked_item_ids')
+    if liked is not None:
+        return item.pk in liked
+    request = context.get('request')
+    if request is None or not request.user.is_authenticated:
+        return False
+    return Like.objects.filter(user=request.user, item=item).exists()
+
+
+class ItemBatchListSerializer(serializers.ListSerializer):
+    """
+    Resolve is_liked for every item in the list with one query. A
+    'liked_item_ids' set in the context is used instead, e.g. an empty
+    set for browse pages that are cached and shared between users.
+    """
+    
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        liked = self.context.get('liked_item_ids')
+        if liked is None:
+            request = self.context.get('request')
+            liked = Like.liked_item_ids(request and request.user, [item.pk for item in items])
+        self.child.liked_item_ids = liked
+        return super().to_representation(items)
+
+
 class ItemListSerializer(serializers.ModelSerializer):
     """Serializer for item listing (browse items)"""
     uploader = UserPublicProfileSerializer(read_only=True)
     images = ItemImageSerializer(many=True, read_only=True)
     primary_image = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     
     class Meta:
         model = Item
         fields = (
-            'item_id', 'title', 'primary_image', 'condition', 'points_value',
+            'item_id', 'title', 'primary_image', 'images', 'condition', 'points_value',
             'category', 'size', 'brand', 'likes_count', 'is_liked', 'uploader',
             'created_at', 'status'
         )
+        read_only_fields = ('likes_count',)
+        list_serializer_class = ItemBatchListSerializer
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
-        if primary_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary_image.image.url)
-            return primary_image.image.url
-        return None
-    
-    def get_likes_count(self, obj):
-        # TODO: Implement likes functionality
-        return 0
+        return get_primary_image_url(obj, self.context.get('request'))
     
     def get_is_liked(self, obj):
-        # TODO: Implement likes functionality
-        return False
+        liked = getattr(self, 'liked_item_ids', None)
+        if liked is None:
+            return is_liked_by_requester(obj, self.context)
+        return obj.pk in liked
 
 
 class ItemDetailSerializer(serializers.ModelSerializer):
@@ -174,7 +230,6 @@ class ItemDetailSerializer(serializers.ModelSerializer):
     uploader = UserPublicProfileSerializer(read_only=True)
     images = ItemImageSerializer(many=True, read_only=True)
     tag_list = serializers.ReadOnlyField()
-    likes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     views_count = serializers.SerializerMethodField()
     
@@ -186,52 +241,38 @@ class ItemDetailSerializer(serializers.ModelSerializer):
             'tags', 'tag_list', 'status', 'images', 'likes_count', 'is_liked',
             'views_count', 'created_at', 'updated_at'
         )
-    
-    def get_likes_count(self, obj):
-        # TODO: Implement likes functionality
-        return 0
+        read_only_fields = ('likes_count',)
     
     def get_is_liked(self, obj):
-        # TODO: Implement likes functionality
-        return False
+        return is_liked_by_requester(obj, self.context)
     
     def get_views_count(self, obj):
-        # TODO: Implement views tracking
-        return 0
+        # Include this process's unflushed views so a viewer sees their own view
+        return obj.views_count + pending_views(obj)
 
 
 class UserItemsSerializer(serializers.ModelSerializer):
     """Serializer for user's own items (My Items)"""
     images = ItemImageSerializer(many=True, read_only=True)
     primary_image = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
     views_count = serializers.SerializerMethodField()
     messages_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Item
         fields = (
-            'item_id', 'title', 'primary_image', 'status', 'views_count',
+            'item_id', 'title', 'primary_image', 'images', 'status', 'views_count',
             'likes_count', 'messages_count', 'created_at', 'points_value',
             'condition'
         )
+        read_only_fields = ('likes_count',)
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
-        if primary_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary_image.image.url)
-            return primary_image.image.url
-        return None
-    
-    def get_likes_count(self, obj):
-        # TODO: Implement likes functionality
-        return 0
+        return get_primary_image_url(obj, self.context.get('request'))
     
     def get_views_count(self, obj):
-        # TODO: Implement views tracking
-        return 0
+        # Include this process's unflushed views so a viewer sees their own view
+        return obj.views_count + pending_views(obj)
     
     def get_messages_count(self, obj):
         # TODO: Implement messaging functionality
@@ -265,6 +306,19 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class TransactionBatchListSerializer(serializers.ListSerializer):
+    """
+    Batch mode for TransactionListSerializer(many=True): the users and items
+    of the whole list are loaded in bulk and serialized once each, then rows
+    are assembled from those lookup dicts
+    """
+    
+    def to_representation(self, data):
+        transactions = list(data.all() if hasattr(data, 'all') else data)
+        users, items = self.child.serialize_related(transactions)
+        return [self.child.assemble(transaction, users, items) for transaction in transactions]
+
+
 class TransactionListSerializer(serializers.ModelSerializer):
     """Serializer for transaction list (user's swaps)"""
     sender = UserPublicProfileSerializer(read_only=True)
@@ -277,41 +331,66 @@ class TransactionListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = (
-            'transaction_id', 'method', 'status', 'my_item', 'their_item',
-            'partner', 'points_amount', 'created_at', 'updated_at'
+            'transaction_id', 'method', 'status', 'sender', 'receiver', 'item',
+            'my_item', 'their_item', 'partner', 'points_amount', 'created_at', 'updated_at'
+        )
+        list_serializer_class = TransactionBatchListSerializer
+    
+    def serialize_related(self, transactions):
+        """
+        Return ``(users, items)`` dicts of serialized data keyed by primary
+        key, loaded with three queries however many transactions there are
+        """
+        item_ids = {t.item_id for t in transactions} | {t.offered_item_id for t in transactions if t.offered_item_id}
+        items = list(Item.objects.filter(pk__in=item_ids).prefetch_related('images'))
+        user_ids = {t.sender_id for t in transactions} | {t.receiver_id for t in transactions}
+        users = User.objects.in_bulk(user_ids | {item.uploader_id for item in items})
+        for item in items:
+            item.uploader = users[item.uploader_id]
+        
+        # One many=True serializer per type builds its fields once, not per object
+        users = list(users.values())
+        user_data = UserPublicProfileSerializer(users, many=True).data
+        item_data = ItemListSerializer(items, many=True, context=self.context).data
+        return (
+            {user.pk: data for user, data in zip(users, user_data)},
+            {item.pk: data for item, data in zip(items, item_data)},
         )
     
-    def get_partner(self, obj):
-        request_user = self.context['request'].user
-        if obj.sender == request_user:
-            return UserPublicProfileSerializer(obj.receiver).data
-        else:
-            return UserPublicProfileSerializer(obj.sender).data
-    
-    def get_my_item(self, obj):
-        request_user = self.context['request'].user
-        if obj.sender == request_user:
-            # For the sender, their item might be the offered item in the transaction
-            # TODO: Implement proper item tracking for swaps
-            return None
-        else:
-            return ItemListSerializer(obj.item, context=self.context).data
+    def assemble(self, obj, users, items):
+        """Build one row from the lookup dicts of serialize_related()"""
+        is_sender = obj.sender_id == self.context['request'].user.pk
+        item = items[obj.item_id]
+        offered_item = items.get(obj.offered_item_id)
+        related = {
+            'sender': users[obj.sender_id],
+            'receiver': users[obj.receiver_id],
+            'item': item,
+            'partner': users[obj.receiver_id if is_sender else obj.sender_id],
+            # The sender offers offered_item in exchange for item
+            'my_item': offered_item if is_sender else item,
+            'their_item': item if is_sender else offered_item,
+        }
+        
+        row = {}
+        for name in self.Meta.fields:
+            if name in related:
+                row[name] = related[name]
+            else:
+                value = getattr(obj, name)
+                row[name] = None if value is None else self.fields[name].to_representation(value)
+        return row
     
-    def get_their_item(self, obj):
-        request_user = self.context['request'].user
-        if obj.sender == request_user:
-            return ItemListSerializer(obj.item, context=self.context).data
-        else:
-            # For the receiver, their item might be the offered item
-            # TODO: Implement proper item tracking for swaps
-            return None
+    def to_representation(self, instance):
+        users, items = self.serialize_related([instance])
+        return self.assemble(instance, users, items)
 
 
 class PurchaseSerializer(serializers.Serializer):
     """Serializer for item purchase"""
     mode = serializers.ChoiceField(choices=['currency', 'points'])
     amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
-    points_used = serializers.IntegerField(required=False)
+    points_used = serializers.IntegerField(min_value=1, required=False)
     
     def validate(self, attrs):
         mode = attrs.get('mode')
@@ -377,3 +456,10 @@ class ImageUploadSerializer(serializers.Serializer):
                 raise serializers.ValidationError("Each image must be less than 5MB")
         
         return value
+
+
+class ItemImportSerializer(serializers.Serializer):
+    """Serializer for bulk item import uploads"""
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=('csv', 'ndjson'), required=False)
+    batch_size = serializers.IntegerField(min_value=1, max_value=10000, required=False)
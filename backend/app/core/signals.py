@@ -0,0 +1,145 @@
+"""
+Signal receivers that keep denormalized counters in sync with their
+source rows. Receivers are connected in CoreConfig.ready().
+"""
+from django.db.models import F
+
+from .authentication import evict_cached_user
+from .cache import invalidate_browse_cache
+from .models import User, Item, Transaction
+
+
+# ===============================
+# Rating Aggregates
+# ===============================
+
+def rating_saved(sender, instance, created, **kwargs):
+    """Add a new rating to, or move an edited one between, user aggregates"""
+    old_user_id, old_rating = getattr(instance, '_aggregated_values', (None, None))
+    if created or old_user_id is None or old_rating is None:
+        User.adjust_rating_aggregates(instance.rated_user_id, 1, instance.rating)
+    elif old_user_id != instance.rated_user_id:
+        User.adjust_rating_aggregates(old_user_id, -1, -old_rating)
+        User.adjust_rating_aggregates(instance.rated_user_id, 1, instance.rating)
+    elif old_rating != instance.rating:
+        User.adjust_rating_aggregates(instance.rated_user_id, 0, instance.rating - old_rating)
+    instance._remember_aggregated_values()
+
+
+def rating_deleted(sender, instance, **kwargs):
+    """Remove a deleted rating from its user's aggregates"""
+    User.adjust_rating_aggregates(instance.rated_user_id, -1, -instance.rating)
+
+
+# ===============================
+# Browse Cache Invalidation
+# ===============================
+
+def item_saved(sender, instance, created, **kwargs):
+    """Invalidate browse pages when an item enters, leaves or changes in the feed"""
+    old_category, old_status = getattr(instance, '_browse_state', (None, None))
+    if created or 'available' in (old_status, instance.status):
+        invalidate_browse_cache(old_category, instance.category)
+    instance._remember_browse_state()
+
+
+def item_deleted(sender, instance, **kwargs):
+    if instance.status == 'available':
+        invalidate_browse_cache(instance.category)
+
+
+def item_image_changed(sender, instance, **kwargs):
+    """Images are embedded in browse pages, so image writes invalidate too"""
+    row = Item.objects.filter(pk=instance.item_id).values_list('category', 'status').first()
+    if row and row[1] == 'available':
+        invalidate_browse_cache(row[0])
+
+
+# ===============================
+# User Stats Counters
+# ===============================
+
+def _listing_counts(status):
+    return status is not None and status not in Item.UNLISTED_STATUSES
+
+
+def item_listing_saved(sender, instance, created, **kwargs):
+    """Keep the uploader's items_listed in step with the item's status"""
+    old_uploader_id, old_status = (None, None) if created else getattr(instance, '_listing', (None, None))
+    if not created and old_status is None:
+        return  # Loaded without its status, so a save cannot have changed it
+    was_listed = _listing_counts(old_status)
+    is_listed = _listing_counts(instance.status)
+    if (old_uploader_id, was_listed) != (instance.uploader_id, is_listed):
+        if was_listed:
+            User.adjust_stats([old_uploader_id], items_listed=-1)
+        if is_listed:
+            User.adjust_stats([instance.uploader_id], items_listed=1)
+    instance._remember_listing()
+
+
+def item_listing_deleted(sender, instance, **kwargs):
+    if _listing_counts(instance.status):
+        User.adjust_stats([instance.uploader_id], items_listed=-1)
+
+
+def _swap_counts(status, sign=1):
+    return {
+        'total_swaps': sign,
+        'ongoing_swaps': sign * (status in Transaction.ONGOING_STATUSES),
+        'completed_swaps': sign * (status == 'completed'),
+    }
+
+
+def transaction_saved(sender, instance, created, **kwargs):
+    """Move a transaction's contribution between swap counters on status changes"""
+    old_sender_id, old_receiver_id, old_status = getattr(instance, '_stats_state', (None, None, None))
+    parties = [instance.sender_id, instance.receiver_id]
+    if created:
+        User.adjust_stats(parties, **_swap_counts(instance.status))
+    elif old_status is None:
+        pass  # Loaded without its status, so a save cannot have changed it
+    elif [old_sender_id, old_receiver_id] != parties:
+        User.adjust_stats([old_sender_id, old_receiver_id], **_swap_counts(old_status, -1))
+        User.adjust_stats(parties, **_swap_counts(instance.status))
+    elif old_status != instance.status:
+        old, new = _swap_counts(old_status, -1), _swap_counts(instance.status)
+        User.adjust_stats(parties, **{name: old[name] + new[name] for name in new})
+    instance._remember_stats_state()
+
+
+def transaction_deleted(sender, instance, **kwargs):
+    User.adjust_stats([instance.sender_id, instance.receiver_id], **_swap_counts(instance.status, -1))
+
+
+# ===============================
+# Like Counters
+# ===============================
+
+def like_saved(sender, instance, created, **kwargs):
+    if created:
+        Item.objects.filter(pk=instance.item_id).update(likes_count=F('likes_count') + 1)
+
+
+def like_deleted(sender, instance, **kwargs):
+    Item.objects.filter(pk=instance.item_id).update(likes_count=F('likes_count') - 1)
+
+
+# ===============================
+# Authentication Cache
+# ===============================
+
+def user_changed(sender, instance, **kwargs):
+    """Evict the cached user so token version and flags are re-read"""
+    evict_cached_user(instance.pk)
+
+
+# ===============================
+# Location Index
+# ===============================
+
+def user_located(sender, instance, **kwargs):
+    """Invalidate browse pages that may show a user's items at their old location"""
+    if getattr(instance, '_moved', False):
+        categories = instance.uploaded_items.filter(status='available').values_list('category', flat=True)
+        invalidate_browse_cache(*set(categories))
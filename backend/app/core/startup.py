@@ -0,0 +1,159 @@
+"""
+Startup benchmarks: how long a deploy takes from container boot to
+serving requests. Used by the benchmark_startup management command.
+
+- imports: ``python -X importtime`` of the WSGI application and URL conf,
+  i.e. what each worker (or, with --preload, the master) loads, with the
+  slowest packages
+- bootstrap: ``manage.py bootstrap`` on an up-to-date database, wall time
+  including interpreter start and django.setup(), and its query count
+- gunicorn / gunicorn_preload: spawn to the first 200 from /api/, and the
+  slowest worker's fork-to-ready time as logged by config/gunicorn.py
+
+Each measurement is the best of ``repeat`` runs, since cold starts on a
+shared machine are noisy.
+"""
+import http.client
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+from .loadtest import start_server, stop_server
+
+
+IMPORT_STATEMENT = 'import config.wsgi; from django.urls import get_resolver; get_resolver().url_patterns'
+
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+BOOTSTRAP_QUERIES_RE = re.compile(r'\((\d+) queries\)')
+WORKER_READY_RE = re.compile(r'ready ([\d.]+) ms after fork')
+
+
+def _env(db_url):
+    return {**os.environ, 'DATABASE_URL': db_url, 'DJANGO_SETTINGS_MODULE': 'config.settings', 'DEBUG': 'False'}
+
+
+def _run(args, db_url):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args], cwd=Path(settings.BASE_DIR), env=_env(db_url),
+        capture_output=True, text=True, check=True,
+    )
+    return result, (time.perf_counter() - start) * 1000
+
+
+def parse_import_times(stderr):
+    """[(module, self µs, cumulative µs, nesting)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            rows.append((match[4], int(match[1]), int(match[2]), len(match[3])))
+    return rows
+
+
+def measure_imports(db_url, repeat=3, top=10):
+    best = None
+    for _ in range(repeat):
+        result, wall_ms = _run(['-X', 'importtime', '-c', IMPORT_STATEMENT], db_url)
+        rows = parse_import_times(result.stderr)
+        import_ms = sum(row[1] for row in rows) / 1000
+        if best is None or import_ms < best[0]:
+            best = (import_ms, wall_ms, rows)
+
+    import_ms, wall_ms, rows = best
+    # Own import time summed per top-level package, e.g. all of django.*
+    packages = Counter()
+    for name, self_us, _, _ in rows:
+        packages[name.split('.')[0]] += self_us
+    return {
+        'import_ms': round(import_ms, 1),
+        'wall_ms': round(wall_ms, 1),
+        'modules': len(rows),
+        'slowest': [{'package': name, 'ms': round(us / 1000, 1)} for name, us in packages.most_common(top)],
+    }
+
+
+def measure_bootstrap(db_url, repeat=3):
+    _run(['manage.py', 'bootstrap'], db_url)  # provisions the admin; later runs are redeploys
+    runs = [_run(['manage.py', 'bootstrap'], db_url) for _ in range(repeat)]
+    result, wall_ms = min(runs, key=lambda run: run[1])
+    return {
+        'wall_ms': round(wall_ms, 1),
+        'queries': int(BOOTSTRAP_QUERIES_RE.search(result.stdout)[1]),
+    }
+
+
+def _first_response(port, deadline):
+    while time.monotonic() < deadline:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        try:
+            connection.request('GET', '/api/', headers={'Host': '127.0.0.1'})
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.02)
+        finally:
+            connection.close()
+    raise RuntimeError('gunicorn did not answer /api/ within 60s')
+
+
+def measure_cold_start(db_url, preload, workers=2, repeat=3):
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryFile('w+') as log:
+            start = time.perf_counter()
+            process, port = start_server('wsgi', db_url, workers, preload=preload, log_level='info', stderr=log)
+            try:
+                deadline = time.monotonic() + 60
+                _first_response(port, deadline)
+                first_ms = (time.perf_counter() - start) * 1000
+                ready = []
+                while len(ready) < workers and time.monotonic() < deadline:
+                    time.sleep(0.1)
+                    log.seek(0)
+                    ready = [float(ms) for ms in WORKER_READY_RE.findall(log.read())]
+            finally:
+                stop_server(process)
+        run = {'first_response_ms': round(first_ms, 1), 'worker_ready_ms': round(max(ready, default=0.0), 1)}
+        if best is None or run['first_response_ms'] < best['first_response_ms']:
+            best = run
+    return best
+
+
+def run_startup_benchmarks(db_url, workers=2, repeat=3, log=None):
+    log = log or (lambda message: None)
+    results = {'imports': measure_imports(db_url, repeat)}
+    log(f"imports            {results['imports']['import_ms']} ms, {results['imports']['modules']} modules")
+    results['bootstrap'] = measure_bootstrap(db_url, repeat)
+    log(f"bootstrap          {results['bootstrap']}")
+    for name, preload in (('gunicorn', False), ('gunicorn_preload', True)):
+        results[name] = measure_cold_start(db_url, preload, workers, repeat)
+        log(f'{name:<18} {results[name]}')
+    return results
+
+
+def compare_startup(results, baseline, tolerance=1.5, slack_ms=100.0):
+    """
+    Regressions of results against a baseline: query counts must not grow
+    and times may grow by tolerance times plus slack_ms
+    """
+    regressions = []
+    for group, expected in baseline.items():
+        actual = results.get(group, {})
+        for metric, value in expected.items():
+            if metric not in actual:
+                continue
+            if metric == 'queries' and actual[metric] > value:
+                regressions.append(f'{group}: {actual[metric]} queries (baseline {value})')
+            elif metric.endswith('_ms'):
+                limit = value * tolerance + slack_ms
+                if actual[metric] > limit:
+                    regressions.append(f'{group}: {metric} {actual[metric]} (baseline {value}, limit {limit:.1f})')
+    return regressions
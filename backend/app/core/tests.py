@@ -1,3 +1,1993 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.apps import apps as django_apps
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.db import close_old_connections
+from django.db.models import F
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import URLPattern, include, path, resolve
+from django.utils import timezone
+from PIL import Image
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .async_views import AsyncAPIView
+from .authentication import tokens_for_user
+from .bootstrap import pending_migrations
+from .exports import aiter_chunks
+from .geo import cover_cells, cover_ranges, encode_geohash
+from .benchmarks.endpoints import seed, build_scenarios, run_benchmarks, compare_with_baseline
+from .imports import fetch_image
+from .ledger import PurchaseError, purchase_with_points
+from .images import (
+    original_extension, process_variants, regenerate_variants, save_original, shutdown_executor, submit_upload,
+)
+from . import matching
+from .matching import WantGraph, rebuild_want_graph, reset_want_graph
+from .recommendations import FEATURE_FIELDS, encode_items, rebuild_similar_items, refresh_similar_items
+from .middleware import RequestProfile, fingerprint
+from .pagination import approximate_count, decode_cursor, encode_cursor
+from .view_counts import buffer as view_buffer
+from .models import User, Item, ItemImage, Transaction, Rating, PointsLedgerEntry, Like, SimilarItems
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@rewear.test',
+        password='testpass123',
+        first_name=username.title(),
+        last_name='Tester',
+        **extra
+    )
+
+
+def make_item(uploader, images=1, **extra):
+    fields = {
+        'title': 'Denim Jacket',
+        'description': 'Lightly worn',
+        'category': 'outerwear',
+        'size': 'm',
+        'condition': 'good',
+        'points_value': 50,
+    }
+    fields.update(extra)
+    item = Item.objects.create(uploader=uploader, **fields)
+    for i in range(images):
+        ItemImage.objects.create(item=item, image=f'item_images/{item.item_id}_{i}.jpg', is_primary=(i == 0))
+    return item
+
+
+class APITestCase(TestCase):
+    """Base test case with an authenticated API client"""
+
+    def setUp(self):
+        cache.clear()
+        # Views recorded by a test refer to rows its rollback removes
+        self.addCleanup(view_buffer.clear)
+        self.user = make_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries), response.json()
+
+
+# ===============================
+# Query Count Regression Tests
+# ===============================
+
+class PrimaryImageQueryCountTests(APITestCase):
+
+    def test_primary_image_resolved_from_prefetch(self):
+        item = make_item(self.user, images=3)
+        data = self.count_queries('/api/users/me/items/')[1]
+        self.assertTrue(data['results'][0]['primary_image'].endswith(f'{item.item_id}_0.jpg'))
+
+    def test_my_items_query_count_is_constant(self):
+        make_item(self.user, images=2)
+        baseline = self.count_queries('/api/users/me/items/')[0]
+
+        for _ in range(10):
+            make_item(self.user, images=3)
+        self.assertEqual(self.count_queries('/api/users/me/items/')[0], baseline)
+
+    def test_browse_query_count_independent_of_images(self):
+        uploader = make_user('uploader')
+        for _ in range(5):
+            make_item(uploader, images=1)
+        baseline = self.count_queries('/api/items/')[0]
+
+        for item in Item.objects.all():
+            for i in range(1, 4):
+                ItemImage.objects.create(item=item, image=f'item_images/extra_{i}.jpg')
+        self.assertEqual(self.count_queries('/api/items/')[0], baseline)
+
+
+    def test_browse_query_count_is_constant(self):
+        make_item(make_user('first'))
+        baseline = self.count_queries('/api/items/')[0]
+
+        for i in range(10):
+            uploader = make_user(f'uploader{i}')
+            Rating.objects.create(rater=self.user, rated_user=uploader, rating=4)
+            make_item(uploader)
+        self.assertEqual(self.count_queries('/api/items/')[0], baseline)
+
+    def test_swaps_query_count_is_constant(self):
+        def add_swaps(count):
+            for i in range(count):
+                partner = make_user(f'partner{Transaction.objects.count()}')
+                sender, receiver = (self.user, partner) if i % 2 else (partner, self.user)
+                Transaction.objects.create(
+                    sender=sender, receiver=receiver, item=make_item(receiver, images=2), method='swap'
+                )
+
+        add_swaps(2)
+        baseline, data = self.count_queries('/api/swaps/')
+        self.assertEqual(len(data['results']), 2)
+
+        add_swaps(20)
+        queries, data = self.count_queries('/api/swaps/')
+        self.assertEqual(queries, baseline)
+        for row in data['results']:
+            is_sender = row['sender']['user_id'] == str(self.user.user_id)
+            partner = row['receiver'] if is_sender else row['sender']
+            self.assertEqual(row['partner'], partner)
+            self.assertEqual(row['their_item' if is_sender else 'my_item'], row['item'])
+            self.assertIsNone(row['my_item' if is_sender else 'their_item'])
+
+    def test_swaps_are_paged_by_cursor(self):
+        partner = make_user('partner')
+        item = make_item(partner, images=0)
+        swaps = Transaction.objects.bulk_create([
+            Transaction(sender=self.user, receiver=partner, item=item, method='swap') for _ in range(5)
+        ])
+        # Equal timestamps are ordered by primary key
+        Transaction.objects.update(created_at=timezone.now())
+
+        seen, url = [], '/api/swaps/?page_size=2&count=exact'
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(data['count'], 5)
+            self.assertLessEqual(len(data['results']), 2)
+            seen += [row['transaction_id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(sorted(seen), sorted(str(swap.pk) for swap in swaps))
+        self.assertEqual(len(set(seen)), 5)
+
+        self.assertEqual(self.client.get('/api/swaps/?cursor=garbage').status_code, 400)
+
+
+# ===============================
+# Keyset Pagination Tests
+# ===============================
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        uploader = make_user('uploader')
+        self.items = [make_item(uploader, images=0) for _ in range(7)]
+        # Every row ties on created_at, so only the pk orders them
+        Item.objects.update(created_at=timezone.now())
+
+    def test_next_cursor_walks_ties_without_gaps_or_repeats(self):
+        seen, sizes, url = [], [], '/api/items/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            sizes.append(len(data['results']))
+            seen += [row['item_id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(sizes, [3, 3, 1])
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(set(seen), {str(item.item_id) for item in self.items})
+
+    def test_invalid_cursors_are_rejected(self):
+        created_at = self.items[0].created_at
+        self.assertEqual(
+            decode_cursor(
+                encode_cursor('created_at', created_at, self.items[0].pk), 'created_at', Item._meta.get_field('created_at'),
+            ),
+            (created_at, str(self.items[0].pk)),
+        )
+        for token in (
+            'garbage',
+            encode_cursor('created_at', 'not a date', 1),
+            encode_cursor('created_at', created_at, 'not-a-uuid'),
+            encode_cursor('search_rank', created_at, self.items[0].pk),
+        ):
+            response = self.client.get(f'/api/items/?cursor={token}')
+            self.assertEqual(response.status_code, 400, token)
+            self.assertEqual(response.json()['error'], 'Invalid cursor')
+
+    def test_count_is_computed_only_on_request(self):
+        self.assertNotIn('count', self.client.get('/api/items/?page_size=2').json())
+        for mode in ('exact', 'approx'):
+            data = self.client.get(f'/api/items/?page_size=2&count={mode}').json()
+            self.assertEqual(data['count'], 7, mode)
+            self.assertEqual(len(data['results']), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'planner estimates are PostgreSQL only')
+    def test_approx_count_uses_the_planner_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE items')
+        with CaptureQueriesContext(connection) as ctx:
+            estimate = approximate_count(Item.objects.filter(status='available'), exact_below=0)
+        self.assertIsInstance(estimate, int)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertTrue(ctx.captured_queries[0]['sql'].startswith('EXPLAIN'))
+
+
+# ===============================
+# Admin Changelist Tests
+# ===============================
+
+class AdminChangelistTests(TestCase):
+    """Admin changelists cost a constant number of queries and search through indexed lookups"""
+
+    changelists = ('user', 'item', 'itemimage', 'transaction', 'rating', 'like', 'pointsledgerentry')
+
+    def setUp(self):
+        self.moderator = make_user('moderator', is_staff=True, is_superuser=True)
+        self.client.force_login(self.moderator)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            n = User.objects.count()
+            seller, buyer = make_user(f'seller{n}'), make_user(f'buyer{n}')
+            item = make_item(seller, title=f'Wool Scarf {n}')
+            swap = Transaction.objects.create(
+                sender=buyer, receiver=seller, item=item, method='points', points_amount=10
+            )
+            Rating.objects.create(rater=buyer, rated_user=seller, transaction=swap, rating=5)
+            Like.objects.create(user=buyer, item=item)
+            PointsLedgerEntry.objects.create(user=buyer, transaction=swap, entry_type='purchase', amount=-10)
+
+    def changelist(self, model, **params):
+        response = self.client.get(f'/admin/core/{model}/', params)
+        self.assertEqual(response.status_code, 200, model)
+        return response
+
+    def count_queries(self, model):
+        with CaptureQueriesContext(connection) as ctx:
+            self.changelist(model)
+        return len(ctx.captured_queries)
+
+    def test_changelist_query_counts_are_constant(self):
+        self.add_rows(2)
+        baseline = {model: self.count_queries(model) for model in self.changelists}
+        self.add_rows(15)
+        for model in self.changelists:
+            self.assertEqual(self.count_queries(model), baseline[model], model)
+
+    def test_search_uses_email_uuid_and_full_text(self):
+        self.add_rows(3)
+        swap = Transaction.objects.select_related('sender', 'item').first()
+
+        response = self.changelist('transaction', q=swap.sender.email.upper())
+        self.assertEqual(list(response.context['cl'].result_list), [swap])
+        response = self.changelist('transaction', q=str(swap.transaction_id))
+        self.assertEqual(list(response.context['cl'].result_list), [swap])
+        response = self.changelist('transaction', q=swap.item.title)
+        self.assertEqual(list(response.context['cl'].result_list), [swap])
+        response = self.changelist('user', q=swap.sender.email[:6])
+        self.assertIn(swap.sender, response.context['cl'].result_list)
+
+    @override_settings(ADMIN_EXACT_COUNT_BELOW=5)
+    def test_changelist_skips_full_count(self):
+        self.add_rows(3)
+        response = self.changelist('item', status='available')
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_ledger_entries_cannot_be_deleted(self):
+        self.add_rows(1)
+        entry = PointsLedgerEntry.objects.get()
+        response = self.client.post('/admin/core/pointsledgerentry/', {
+            'action': 'delete_selected', '_selected_action': [entry.pk], 'post': 'yes',
+        })
+        self.assertIn(response.status_code, (200, 302))
+        self.assertTrue(PointsLedgerEntry.objects.filter(pk=entry.pk).exists())
+        response = self.client.post(f'/admin/core/pointsledgerentry/{entry.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(PointsLedgerEntry.objects.filter(pk=entry.pk).exists())
+
+
+# ===============================
+# Rating Aggregate Tests
+# ===============================
+
+class RatingAggregateTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rated = make_user('rated')
+        self.other = make_user('other')
+
+    def assertAggregates(self, user, count, total):
+        user.refresh_from_db()
+        self.assertEqual((user.rating_count, user.rating_sum), (count, total))
+
+    def test_rating_endpoint_updates_aggregates(self):
+        response = self.client.post(f'/api/users/{self.rated.user_id}/rate/', {'rating': 4})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['rating']['rated_user']['average_rating'], 4.0)
+
+        Rating.objects.create(rater=self.other, rated_user=self.rated, rating=5)
+        self.assertAggregates(self.rated, 2, 9)
+        self.assertEqual(self.rated.average_rating, 4.5)
+
+    def test_edits_and_deletes_update_aggregates(self):
+        rating = Rating.objects.create(rater=self.user, rated_user=self.rated, rating=2)
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.rating = 5
+        rating.save()
+        self.assertAggregates(self.rated, 1, 5)
+
+        rating.rated_user = self.other
+        rating.save()
+        self.assertAggregates(self.rated, 0, 0)
+        self.assertAggregates(self.other, 1, 5)
+
+        Rating.objects.filter(pk=rating.pk).delete()
+        self.assertAggregates(self.other, 0, 0)
+
+    def test_rebuild_command_reconciles_drift(self):
+        Rating.objects.create(rater=self.user, rated_user=self.rated, rating=3)
+        Rating.objects.create(rater=self.other, rated_user=self.rated, rating=4)
+        User.objects.update(rating_count=99, rating_sum=1)
+
+        call_command('rebuild_rating_aggregates', batch_size=1, stdout=StringIO())
+        self.assertAggregates(self.rated, 2, 7)
+        self.assertAggregates(self.other, 0, 0)
+
+    def test_profile_serialization_costs_no_queries(self):
+        Rating.objects.create(rater=self.user, rated_user=self.rated, rating=3)
+        self.rated.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.rated.average_rating, 3.0)
+
+
+# ===============================
+# User Stats Counter Tests
+# ===============================
+
+class UserStatsCounterTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('owner')
+
+    def assertStats(self, user, total, listed, completed, ongoing):
+        user.refresh_from_db()
+        self.assertEqual(
+            (user.total_swaps, user.items_listed, user.completed_swaps, user.ongoing_swaps),
+            (total, listed, completed, ongoing),
+        )
+
+    def test_item_create_and_delete_update_items_listed(self):
+        item = make_item(self.owner)
+        make_item(self.owner)
+        self.assertStats(self.owner, 0, 2, 0, 0)
+
+        self.client.force_authenticate(self.owner)
+        self.client.delete(f'/api/items/{item.item_id}/')
+        self.assertStats(self.owner, 0, 1, 0, 0)
+
+        Item.objects.get(uploader=self.owner, status='available').delete()
+        self.assertStats(self.owner, 0, 0, 0, 0)
+
+    def test_swap_lifecycle_updates_both_parties(self):
+        item = make_item(self.owner)
+        response = self.client.post('/api/swaps/', {
+            'requested_item_id': item.item_id, 'method': 'points', 'points_amount': 10,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        swap_url = f"/api/swaps/{response.json()['transaction']['transaction_id']}/"
+        self.assertStats(self.user, 1, 0, 0, 1)
+        self.assertStats(self.owner, 1, 1, 0, 1)
+
+        self.client.force_authenticate(self.owner)
+        self.client.put(swap_url, {'action': 'accept'})
+        self.assertStats(self.owner, 1, 1, 0, 1)
+        self.client.put(swap_url, {'action': 'complete'})
+        self.assertStats(self.user, 1, 0, 1, 0)
+        self.assertStats(self.owner, 1, 1, 1, 0)
+
+    def test_purchase_counts_as_completed_swap(self):
+        item = make_item(self.owner)
+        response = self.client.post(f'/api/items/{item.item_id}/purchase/', {'mode': 'points', 'points_used': 50})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertStats(self.user, 1, 0, 1, 0)
+        self.assertStats(self.owner, 1, 1, 1, 0)
+
+    def test_recompute_command_reconciles_drift(self):
+        item = make_item(self.owner)
+        make_item(self.owner, status='removed')
+        Transaction.objects.create(sender=self.user, receiver=self.owner, item=item, method='swap')
+        Transaction.objects.create(
+            sender=self.user, receiver=self.owner, item=item, method='swap', status='completed'
+        )
+        User.objects.update(total_swaps=42, items_listed=-3, completed_swaps=7, ongoing_swaps=9)
+
+        call_command('recompute_user_stats', batch_size=1, stdout=StringIO())
+        self.assertStats(self.user, 2, 0, 1, 1)
+        self.assertStats(self.owner, 2, 1, 1, 1)
+
+
+# ===============================
+# Authentication Tests
+# ===============================
+
+class CachedJWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.item = make_item(make_user('uploader'))
+        self.client = APIClient()
+
+    def login(self, password='testpass123'):
+        response = self.client.post('/api/auth/login/', {'email': self.user.email, 'password': password})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['token']['access']}")
+
+    def get_detail(self):
+        return self.client.get(f'/api/items/{self.item.item_id}/')
+
+    def test_warm_cache_authenticates_without_queries(self):
+        self.login()
+        self.assertEqual(self.get_detail().status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get_detail().status_code, 200)
+
+        # Same cost as a request that skips authentication entirely
+        baseline = APIClient()
+        baseline.force_authenticate(self.user)
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            baseline.get(f'/api/items/{self.item.item_id}/')
+
+    def test_suspension_and_password_change_revoke_tokens(self):
+        self.login()
+        self.assertEqual(self.get_detail().status_code, 200)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_suspended = True
+        user.save()
+        self.assertEqual(self.get_detail().status_code, 401)
+        user.is_suspended = False
+        user.save()
+        self.assertEqual(self.get_detail().status_code, 401)
+
+        self.client.credentials()
+        self.login()
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('n3w-passphrase')
+        user.save()
+        self.assertEqual(self.get_detail().status_code, 401)
+
+        self.client.credentials()
+        self.login('n3w-passphrase')
+        self.assertEqual(self.get_detail().status_code, 200)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_uncached_users_see_revocations_from_other_workers(self):
+        self.login()
+        self.assertEqual(self.get_detail().status_code, 200)
+        # As saved by another worker whose eviction cannot reach this cache
+        User.objects.filter(pk=self.user.pk).update(token_version=F('token_version') + 1)
+        self.assertEqual(self.get_detail().status_code, 401)
+
+    def test_profile_is_read_fresh_despite_cached_user(self):
+        self.login()
+        self.client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(points_balance=F('points_balance') + 25)
+        self.assertEqual(self.client.get('/api/users/me/').json()['points_balance'], 125)
+
+    def test_lean_login_returns_only_tokens(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/auth/login/?lean=1', {'email': self.user.email, 'password': 'testpass123'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(response.json()), {'success', 'message', 'token'})
+        self.assertEqual(set(response.json()['token']), {'access', 'refresh'})
+
+    def test_legacy_hash_is_upgraded_without_revoking_tokens(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('testpass123', hasher='pbkdf2_sha256'))
+        self.login()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.password.startswith('argon2$'))
+        self.assertEqual(user.token_version, self.user.token_version)
+        self.assertEqual(self.get_detail().status_code, 200)
+
+
+# ===============================
+# Like Tests
+# ===============================
+
+class ItemLikeTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.uploader = make_user('uploader')
+        self.item = make_item(self.uploader)
+        self.url = f'/api/items/{self.item.item_id}/like/'
+
+    def test_like_and_unlike_are_idempotent(self):
+        self.assertEqual(self.client.post(self.url).json()['likes_count'], 1)
+        self.assertEqual(self.client.post(self.url).json()['likes_count'], 1)
+
+        self.client.force_authenticate(self.uploader)
+        self.assertEqual(self.client.post(self.url).json()['likes_count'], 2)
+
+        response = self.client.delete(self.url).json()
+        self.assertEqual((response['is_liked'], response['likes_count']), (False, 1))
+        self.assertEqual(self.client.delete(self.url).json()['likes_count'], 1)
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_detail_and_my_items_expose_likes(self):
+        self.client.post(self.url)
+        data = self.client.get(f'/api/items/{self.item.item_id}/').json()
+        self.assertEqual((data['likes_count'], data['is_liked']), (1, True))
+
+        self.client.force_authenticate(self.uploader)
+        self.assertFalse(self.client.get(f'/api/items/{self.item.item_id}/').json()['is_liked'])
+        self.assertEqual(self.client.get('/api/users/me/items/').json()['results'][0]['likes_count'], 1)
+
+    @override_settings(BROWSE_CACHE_TIMEOUT=60)
+    def test_browse_is_liked_is_per_user_and_one_query(self):
+        items = [make_item(self.uploader) for _ in range(5)]
+        for item in items[:3]:
+            Like.objects.create(user=self.user, item=item)
+        self.count_queries('/api/items/')
+
+        # Cached page plus one is_liked lookup, whatever the number of likes
+        with self.assertNumQueries(1):
+            rows = self.client.get('/api/items/').json()['results']
+        liked = {row['item_id'] for row in rows if row['is_liked']}
+        self.assertEqual(liked, {str(item.item_id) for item in items[:3]})
+
+        self.client.force_authenticate(make_user('stranger'))
+        rows = self.client.get('/api/items/').json()['results']
+        self.assertFalse(any(row['is_liked'] for row in rows))
+
+
+# ===============================
+# Swap Matching Tests
+# ===============================
+
+class SwapMatchingTests(APITestCase):
+    """Suggestions from the want graph: viewer wants an item of users[1], ..."""
+
+    url = '/api/swaps/suggestions/'
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(reset_want_graph)
+        self.others = [make_user(name) for name in ('alice', 'bob', 'carol')]
+        self.items = {user.pk: make_item(user, images=0) for user in [self.user, *self.others]}
+
+    def want(self, user, owner):
+        Like.objects.create(user=user, item=self.items[owner.pk])
+
+    def suggestions(self):
+        return self.client.get(self.url).json()['results']
+
+    def test_swap_request_records_offered_item(self):
+        alice = self.others[0]
+        response = self.client.post('/api/swaps/', {
+            'requested_item_id': self.items[alice.pk].item_id, 'method': 'swap',
+            'offered_item_id': self.items[self.user.pk].item_id,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        swap = Transaction.objects.get()
+        self.assertEqual(swap.offered_item, self.items[self.user.pk])
+        row = response.json()['transaction']
+        self.assertEqual(row['my_item']['item_id'], str(self.items[self.user.pk].item_id))
+
+        response = self.client.post('/api/swaps/', {
+            'requested_item_id': self.items[alice.pk].item_id, 'method': 'swap',
+            'offered_item_id': self.items[self.others[1].pk].item_id,
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_two_way_match_is_read_fresh(self):
+        alice = self.others[0]
+        rebuild_want_graph()
+        self.want(self.user, alice)
+        Transaction.objects.create(
+            sender=alice, receiver=self.user, item=self.items[self.user.pk], method='swap',
+        )
+        [match] = self.suggestions()
+        self.assertEqual((match['type'], match['size']), ('two_way', 2))
+        self.assertEqual(match['you_get']['item_id'], str(self.items[alice.pk].item_id))
+        self.assertEqual(match['you_give']['item_id'], str(self.items[self.user.pk].item_id))
+
+    def test_three_and_four_user_cycles(self):
+        alice, bob, carol = self.others
+        self.want(self.user, alice)
+        self.want(alice, bob)
+        self.want(bob, self.user)
+        self.want(bob, carol)
+        self.want(carol, self.user)
+        rebuild_want_graph()
+
+        cycles = self.suggestions()
+        self.assertEqual([cycle['size'] for cycle in cycles], [3, 4])
+        # Each swap goes to the previous user, starting with the viewer
+        chain = [(swap['from']['first_name'], swap['to']['first_name']) for swap in cycles[1]['swaps']]
+        self.assertEqual(chain, [('Alice', 'Viewer'), ('Bob', 'Alice'), ('Carol', 'Bob'), ('Viewer', 'Carol')])
+
+    def test_stale_graph_never_suggests_gone_items(self):
+        alice, bob, _ = self.others
+        self.want(self.user, alice)
+        self.want(alice, bob)
+        self.want(bob, self.user)
+        rebuild_want_graph()
+        self.assertEqual(len(self.suggestions()), 1)
+
+        Item.objects.filter(pk=self.items[bob.pk].pk).update(status='swapped')
+        self.assertEqual(self.suggestions(), [])
+
+    def test_new_wants_are_added_to_the_loaded_graph(self):
+        alice, bob, _ = self.others
+        self.want(self.user, alice)
+        self.want(bob, self.user)
+        rebuild_want_graph()
+        self.assertEqual(self.suggestions(), [])
+
+        self.client.force_authenticate(alice)
+        self.client.post(f'/api/items/{self.items[bob.pk].item_id}/like/')
+        self.client.force_authenticate(self.user)
+        self.assertEqual([cycle['size'] for cycle in self.suggestions()], [3])
+
+    def test_query_count_is_constant(self):
+        alice, bob, carol = self.others
+        self.want(self.user, alice)
+        self.want(alice, self.user)
+        rebuild_want_graph()
+        baseline, data = self.count_queries(self.url)
+        self.assertEqual(data['count'], 1)
+
+        for user in (bob, carol):
+            self.want(self.user, user)
+            self.want(user, self.user)
+        self.want(alice, bob)
+        self.want(bob, carol)
+        rebuild_want_graph()
+        queries, data = self.count_queries(self.url)
+        self.assertEqual(queries, baseline)
+        self.assertGreater(data['count'], 3)
+
+    def test_graph_keeps_strongest_wants_and_reverse_edges(self):
+        rows = [(1, 3, 5), (1, 2, 4), (1, 4, 1), (2, 1, 2), (3, 1, 1)]
+        graph = WantGraph.from_rows(5, rows, max_degree=2)
+        self.assertEqual(list(graph.wants(1)), [3, 2])
+        self.assertEqual(list(graph.wanted_by(1)), [2, 3])
+        self.assertEqual(list(graph.wanted_by(4)), [])
+        graph.add_want(4, 1)
+        self.assertEqual(list(graph.wanted_by(1)), [2, 3, 4])
+        self.assertEqual(list(graph.wants(9)), [])
+
+
+class WantGraphBuildTests(TransactionTestCase):
+    """The want graph is built in a background thread, never inside a request"""
+
+    def test_requests_do_not_wait_for_the_build(self):
+        self.addCleanup(reset_want_graph)
+        viewer, alice, bob = (make_user(name) for name in ('viewer', 'alice', 'bob'))
+        items = {user.pk: make_item(user, images=0) for user in (viewer, alice, bob)}
+        for user, owner in ((viewer, alice), (alice, viewer), (alice, bob), (bob, viewer)):
+            Like.objects.create(user=user, item=items[owner.pk])
+        reset_want_graph()
+
+        built_in = []
+
+        def build(*args, **kwargs):
+            built_in.append(threading.current_thread().name)
+            return real_build(*args, **kwargs)
+
+        real_build = matching.build_want_graph
+        client = APIClient()
+        client.force_authenticate(viewer)
+        with mock.patch('app.core.matching.build_want_graph', side_effect=build):
+            response = client.get('/api/swaps/suggestions/')
+            matching._builder.join()
+        # Two-way matches are read fresh while the graph is being built
+        self.assertEqual([cycle['size'] for cycle in response.json()['results']], [2])
+        self.assertEqual(built_in, ['want-graph-build'])
+
+        response = client.get('/api/swaps/suggestions/')
+        self.assertEqual([cycle['size'] for cycle in response.json()['results']], [2, 3])
+
+
+# ===============================
+# Similar Items Tests
+# ===============================
+
+class SimilarItemsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('owner')
+        features = {'brand': 'Levis', 'color': 'blue', 'tags': 'denim,vintage', 'points_value': 40}
+        self.item = make_item(self.owner, **features)
+        self.twin = make_item(self.owner, **features)
+        self.near = make_item(self.owner, **{**features, 'color': 'red'})
+        self.far = make_item(self.owner, size='xl', condition='worn', brand='Zara', color='pink', tags='party', points_value=5)
+        self.other_category = make_item(self.owner, category='dresses', **features)
+
+    def similar(self, item):
+        return self.client.get(f'/api/items/{item.item_id}/similar/').json()
+
+    def test_vectors_are_unit_length_and_shared_features_score_higher(self):
+        rows = [
+            (1, 'm', 'good', 'Levis', 'blue', 'denim, vintage', 40),
+            (2, 'm', 'good', 'levis ', 'Blue', 'vintage,denim', 45),
+            (3, 'xl', 'worn', None, None, '', 0),
+        ]
+        item_ids, matrix = encode_items(rows)
+        self.assertEqual(item_ids, [1, 2, 3])
+        for norm in (matrix ** 2).sum(axis=1):
+            self.assertAlmostEqual(float(norm), 1.0, places=5)
+        scores = matrix @ matrix[0]
+        self.assertGreater(scores[1], 0.99)
+        self.assertLess(scores[2], 0.5)
+
+    def test_rebuild_serves_most_similar_in_category(self):
+        self.assertEqual(rebuild_similar_items(), 5)
+        data = self.similar(self.item)
+        self.assertTrue(data['precomputed'])
+        ranked = [row['item_id'] for row in data['results']]
+        self.assertEqual(ranked, [str(item.item_id) for item in (self.twin, self.near, self.far)])
+
+        # Items that are no longer available drop out without a rebuild
+        Item.objects.filter(pk=self.twin.pk).update(status='swapped')
+        ranked = [row['item_id'] for row in self.similar(self.item)['results']]
+        self.assertEqual(ranked, [str(self.near.item_id), str(self.far.item_id)])
+
+    def test_sold_neighbours_do_not_shorten_the_list(self):
+        features = {'brand': 'Levis', 'color': 'blue', 'tags': 'denim,vintage', 'points_value': 40}
+        for _ in range(12):
+            make_item(self.owner, **features)
+        rebuild_similar_items()
+        stored = SimilarItems.objects.get(item=self.item).similar_ids
+        self.assertEqual(len(stored), 15)
+
+        Item.objects.filter(pk__in=stored[:3]).update(status='sold')
+        ranked = [row['item_id'] for row in self.similar(self.item)['results']]
+        self.assertEqual(ranked, stored[3:15])
+
+    def test_new_item_falls_back_until_refreshed(self):
+        rebuild_similar_items()
+        new = make_item(self.owner, brand='Levis', color='blue', tags='denim,vintage', points_value=40)
+        data = self.similar(new)
+        self.assertFalse(data['precomputed'])
+        self.assertNotIn(str(new.item_id), [row['item_id'] for row in data['results']])
+        self.assertEqual({row['category'] for row in data['results']}, {'outerwear'})
+
+        self.assertEqual(refresh_similar_items(), 1)
+        self.assertTrue(self.similar(new)['precomputed'])
+        # Existing lists take the new item in where it ranks
+        self.assertIn(str(new.item_id), SimilarItems.objects.get(item=self.item).similar_ids[:2])
+        self.assertEqual(refresh_similar_items(), 0)
+
+    def test_edited_items_leave_lists_they_no_longer_rank_in(self):
+        # Enough items that refreshing one edit does not rebuild the category
+        for _ in range(6):
+            make_item(self.owner, size='s', brand='Gap', color='green', tags='office', points_value=20)
+        rebuild_similar_items(k=2)
+        self.assertEqual(
+            SimilarItems.objects.get(item=self.item).similar_ids, [str(self.twin.item_id), str(self.near.item_id)],
+        )
+
+        self.near.brand, self.near.color, self.near.tags, self.near.size = 'Zara', 'pink', 'party', 'xl'
+        self.near.save()
+        self.twin.category = 'dresses'
+        self.twin.save()
+        refresh_similar_items(k=2)
+
+        stored = SimilarItems.objects.get(item=self.item)
+        self.assertNotIn(str(self.twin.item_id), stored.similar_ids)
+        _, matrix = encode_items(Item.objects.filter(pk__in=[self.item.pk, self.near.pk]).values_list(*FEATURE_FIELDS))
+        score = round(float(matrix[0] @ matrix[1]), 4)
+        self.assertEqual(dict(zip(stored.similar_ids, stored.scores)).get(str(self.near.item_id), score), score)
+        self.assertIn(
+            str(self.twin.item_id), SimilarItems.objects.get(item=self.other_category).similar_ids,
+        )
+
+    def test_query_count_is_constant(self):
+        rebuild_similar_items()
+        baseline, data = self.count_queries(f'/api/items/{self.far.item_id}/similar/')
+        self.assertEqual(data['count'], 3)
+
+        for _ in range(8):
+            make_item(self.owner, brand='Zara', color='pink', tags='party')
+        rebuild_similar_items()
+        queries, data = self.count_queries(f'/api/items/{self.far.item_id}/similar/')
+        self.assertEqual(queries, baseline)
+        self.assertEqual(data['count'], 11)
+
+
+# ===============================
+# View Counter Tests
+# ===============================
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_DEDUP_WINDOW=600)
+class ItemViewCountTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        view_buffer.clear()
+        self.uploader = make_user('uploader')
+        self.item = make_item(self.uploader)
+        self.url = f'/api/items/{self.item.item_id}/'
+
+    def view_as(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(self.url).json()['views_count']
+
+    def stored_views(self, item=None):
+        return Item.objects.values_list('views_count', flat=True).get(pk=(item or self.item).pk)
+
+    def test_views_are_buffered_deduplicated_and_flushed(self):
+        viewers = [make_user(f'viewer{i}') for i in range(3)]
+        for viewer in viewers:
+            self.view_as(viewer)
+        self.assertEqual(self.view_as(viewers[0]), 3)
+        self.assertEqual(self.view_as(self.uploader), 3)
+        self.assertEqual(self.stored_views(), 0)
+
+        self.assertEqual(view_buffer.flush(), 3)
+        self.assertEqual(self.stored_views(), 3)
+        self.assertEqual(view_buffer.stats()['pending_views'], 0)
+
+    @override_settings(VIEW_COUNT_DEDUP_WINDOW=0)
+    def test_dedup_window_can_be_disabled(self):
+        for _ in range(3):
+            self.view_as(self.user)
+        self.assertEqual(view_buffer.stats()['pending_views'], 3)
+
+    @override_settings(VIEW_COUNT_FLUSH_BATCH_SIZE=2)
+    def test_flush_coalesces_items_into_batched_updates(self):
+        items = [self.item] + [make_item(self.uploader) for _ in range(4)]
+        for i, item in enumerate(items):
+            self.client.get(f'/api/items/{item.item_id}/')
+            self.client.force_authenticate(make_user(f'viewer{i}'))
+            self.client.get(f'/api/items/{item.item_id}/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            view_buffer.flush()
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual([self.stored_views(item) for item in items], [2] * 5)
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+    def test_due_buffer_is_flushed_after_the_response(self):
+        self.view_as(self.user)
+        self.assertEqual(self.stored_views(), 1)
+        self.assertEqual(view_buffer.stats()['pending_items'], 0)
+
+    def test_staff_can_read_buffer_stats(self):
+        self.view_as(self.user)
+        self.assertEqual(self.client.get('/api/metrics/view-counts/').status_code, 403)
+        self.client.force_authenticate(make_user('ops', is_staff=True))
+        stats = self.client.get('/api/metrics/view-counts/').json()['view_counts']
+        self.assertEqual((stats['pending_items'], stats['pending_views']), (1, 1))
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0.2, VIEW_COUNT_DEDUP_WINDOW=0)
+class IdleViewCountFlushTests(TransactionTestCase):
+
+    def test_views_are_flushed_without_further_requests(self):
+        self.addCleanup(view_buffer.clear)
+        item = make_item(make_user('uploader'))
+        client = APIClient()
+        client.force_authenticate(make_user('viewer'))
+        client.get(f'/api/items/{item.item_id}/')
+
+        # The buffer empties before the flush writes, so wait for the row
+        deadline = time.monotonic() + 10
+        while Item.objects.get(pk=item.pk).views_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertEqual(Item.objects.get(pk=item.pk).views_count, 1)
+
+
+# ===============================
+# Search Tests
+# ===============================
+
+class ItemSearchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.uploader = make_user('uploader')
+
+    def search(self, text, **params):
+        response = self.client.get('/api/items/', {'search': text, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_title_match_ranks_above_description_match(self):
+        in_description = make_item(self.uploader, title='Plain Shirt', description='Goes well with denim')
+        in_title = make_item(self.uploader, title='Denim Jacket', description='Classic cut')
+        make_item(self.uploader, title='Wool Scarf', description='Warm')
+
+        ids = [row['item_id'] for row in self.search('denim')['results']]
+        self.assertEqual(ids, [str(in_title.item_id), str(in_description.item_id)])
+
+    def test_last_term_is_prefix_matched(self):
+        item = make_item(self.uploader, title='Denim Jacket', brand='Levis')
+        self.assertEqual(self.search('den')['results'][0]['item_id'], str(item.item_id))
+        self.assertEqual(self.search('jacket lev')['results'][0]['item_id'], str(item.item_id))
+        self.assertEqual(self.search('jac lev')['results'], [])
+
+    def test_search_results_page_with_cursor(self):
+        for i in range(7):
+            make_item(self.uploader, title=f'Denim Jacket {i}', tags='denim' if i % 2 else '')
+        seen = []
+        data = self.search('denim', page_size=3)
+        while True:
+            seen += [row['item_id'] for row in data['results']]
+            if not data['next_cursor']:
+                break
+            data = self.search('denim', page_size=3, cursor=data['next_cursor'])
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_cursors_of_another_ordering_are_rejected(self):
+        for i in range(4):
+            make_item(self.uploader, title=f'Denim Jacket {i}')
+        rank_cursor = self.search('denim', page_size=2)['next_cursor']
+        browse_cursor = self.client.get('/api/items/', {'page_size': 2}).json()['next_cursor']
+        item = Item.objects.first()
+
+        for params in (
+            {'search': 'denim', 'cursor': browse_cursor},
+            {'cursor': rank_cursor},
+            # A datetime or string position under search_rank is no rank
+            {'search': 'denim', 'cursor': encode_cursor('search_rank', item.created_at, item.pk)},
+            {'search': 'denim', 'cursor': encode_cursor('search_rank', '0.5', item.pk)},
+        ):
+            response = self.client.get('/api/items/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json()['error'], 'Invalid cursor')
+        self.assertEqual(self.search('denim', page_size=2, cursor=rank_cursor)['results'][0]['title'][:5], 'Denim')
+
+    def test_tied_ranks_page_without_gaps_or_repeats(self):
+        # Same text, same rank: only the pk orders them, on PostgreSQL from
+        # a ts_rank that went through the cursor's JSON float
+        items = [make_item(self.uploader, title='Denim Jacket', description='Classic cut') for _ in range(7)]
+        seen = []
+        data = self.search('denim jacket', page_size=2)
+        while True:
+            seen += [row['item_id'] for row in data['results']]
+            if not data['next_cursor']:
+                break
+            data = self.search('denim jacket', page_size=2, cursor=data['next_cursor'])
+        self.assertEqual(sorted(seen), sorted(str(item.item_id) for item in items))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_updates_and_deletes_are_reindexed(self):
+        item = make_item(self.uploader, title='Denim Jacket')
+        self.assertEqual(len(self.search('denim')['results']), 1)
+        item.title = 'Leather Jacket'
+        item.save()
+        self.assertEqual(self.search('denim')['results'], [])
+        item.delete()
+        self.assertEqual(self.search('leather')['results'], [])
+
+
+# ===============================
+# Location Tests
+# ===============================
+
+class LocationBrowseTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pune = make_item(make_user('punekar', location='Koregaon Park, Pune'))
+        self.mumbai = make_item(make_user('mumbaikar', location='Mumbai'))
+        self.delhi = make_item(make_user('dilliwala', location='New Delhi, India'))
+        self.nowhere = make_item(make_user('wanderer', location='Somewhere Else'))
+
+    def browse_near(self, near='18.5204,73.8567', **params):
+        response = self.client.get('/api/items/', {'near': near, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row['item_id'] for row in response.json()['results']}
+
+    def test_locations_are_geocoded_from_the_gazetteer(self):
+        user = User.objects.get(username='punekar')
+        self.assertEqual((user.latitude, user.longitude), (18.5204, 73.8567))
+        self.assertEqual(user.geohash, encode_geohash(18.5204, 73.8567))
+        self.assertIsNone(User.objects.get(username='wanderer').geohash)
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_migration_backfill_matches_the_geo_module(self):
+        migration = importlib.import_module('app.core.migrations.0014_user_location')
+        rng = random.Random(11)
+        for _ in range(200):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            self.assertEqual(migration.encode_geohash(lat, lon), encode_geohash(lat, lon))
+
+        expected = dict(User.objects.values_list('pk', 'geohash'))
+        User.objects.update(latitude=None, longitude=None, geohash=None)
+        migration.geocode_existing_users(django_apps, None)
+        self.assertEqual(dict(User.objects.values_list('pk', 'geohash')), expected)
+
+    def test_cover_ranges_contain_the_circle(self):
+        rng = random.Random(7)
+        ranges = cover_ranges(cover_cells(18.5204, 73.8567, 25))
+        self.assertLessEqual(len(ranges), 16)
+        for _ in range(200):
+            lat = 18.5204 + rng.uniform(-0.2, 0.2)
+            lon = 73.8567 + rng.uniform(-0.2, 0.2)
+            geohash = encode_geohash(lat, lon)
+            self.assertTrue(any(low <= geohash and (high is None or geohash < high) for low, high in ranges))
+
+    def test_near_filters_by_radius(self):
+        self.assertEqual(self.browse_near(), {str(self.pune.item_id)})
+        self.assertEqual(
+            self.browse_near(radius_km=150), {str(self.pune.item_id), str(self.mumbai.item_id)}
+        )
+        self.assertEqual(len(self.browse_near(radius_km=200) | self.browse_near('28.6139,77.2090')), 3)
+
+    def test_invalid_near_is_rejected(self):
+        for params in ({'near': 'pune'}, {'near': '95,73'}, {'near': '18.5,73.8', 'radius_km': 5000}):
+            response = self.client.get('/api/items/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_moving_updates_the_index_and_cached_pages(self):
+        self.assertEqual(self.browse_near(), {str(self.pune.item_id)})
+        self.client.force_authenticate(User.objects.get(username='mumbaikar'))
+        response = self.client.put('/api/users/me/', {'location': 'Pune'})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.browse_near(), {str(self.pune.item_id), str(self.mumbai.item_id)})
+
+    def test_radius_search_uses_geohash_index(self):
+        places = ['Pune', 'Mumbai', 'Delhi', 'Chennai', 'Kolkata', 'Jaipur', 'Bangalore', 'Hyderabad']
+        User.objects.bulk_create([
+            User(username=f'seed{i}', email=f'seed{i}@rewear.test', location=places[i % len(places)])
+            for i in range(800)
+        ])
+        call_command('geocode_users', stdout=StringIO())
+        Item.objects.bulk_create([
+            Item(uploader=user, title='Seeded', description='Seeded', category='tops', size='m', condition='good')
+            for user in User.objects.filter(username__startswith='seed') for _ in range(5)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as ctx:
+            self.browse_near()
+        sql = next(query['sql'] for query in ctx.captured_queries if 'ORDER BY' in query['sql'])
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            plan = '\n'.join(str(row) for row in cursor.fetchall())
+        self.assertIn('users_geohash_idx', plan)
+
+
+# ===============================
+# Index Usage Tests
+# ===============================
+
+class AccessPatternIndexTests(APITestCase):
+    """
+    Seed a skewed dataset, replay the view queries and assert on the
+    planner's EXPLAIN output that the composite indexes are used
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        User.objects.bulk_create([
+            User(username=f'seed{i}', email=f'seed{i}@rewear.test', first_name='Seed', last_name=str(i))
+            for i in range(200)
+        ])
+        users = list(User.objects.all())
+        categories = [choice for choice, _ in Item.ITEM_CATEGORIES]
+        sizes = [choice for choice, _ in Item.ITEM_SIZES]
+        conditions = [choice for choice, _ in Item.ITEM_CONDITIONS]
+        Item.objects.bulk_create([
+            Item(
+                uploader=rng.choice(users), title=f'Item {i}', description='Seeded',
+                category=rng.choice(categories), size=rng.choice(sizes),
+                condition=rng.choice(conditions),
+                status='available' if i % 10 == 0 else 'swapped',
+            )
+            for i in range(5000)
+        ])
+        items = list(Item.objects.all())
+        Transaction.objects.bulk_create([
+            Transaction(
+                sender=rng.choice(users), receiver=rng.choice(users), item=rng.choice(items),
+                method='swap', status=rng.choice(['pending', 'completed', 'cancelled']),
+            )
+            for i in range(5000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def explain_view_query(self, url, table):
+        """Return the query plan for the view's main query against ``table``"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        sql = next(
+            query['sql'] for query in ctx.captured_queries
+            if f'FROM "{table}"' in query['sql'] and 'ORDER BY' in query['sql']
+        )
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return '\n'.join(str(row) for row in cursor.fetchall())
+
+    def test_browse_uses_available_recent_index(self):
+        plan = self.explain_view_query('/api/items/', 'items')
+        self.assertIn('items_available_recent_idx', plan)
+
+    def test_browse_by_category_uses_category_index(self):
+        plan = self.explain_view_query('/api/items/?category=tops', 'items')
+        self.assertIn('items_available_cat_idx', plan)
+
+    def test_browse_by_size_uses_size_index(self):
+        plan = self.explain_view_query('/api/items/?size=m', 'items')
+        self.assertIn('items_available_size_idx', plan)
+
+    def test_my_items_uses_uploader_status_index(self):
+        self.client.force_authenticate(User.objects.get(username='seed7'))
+        plan = self.explain_view_query('/api/users/me/items/?status=available', 'items')
+        self.assertIn('items_uploader_status_idx', plan)
+
+    def test_swaps_uses_sender_and_receiver_indexes(self):
+        self.client.force_authenticate(User.objects.get(username='seed7'))
+        plan = self.explain_view_query('/api/swaps/?status=pending', 'transactions')
+        self.assertIn('txn_sender_status_idx', plan)
+        self.assertIn('txn_receiver_status_idx', plan)
+
+
+# ===============================
+# Points Ledger Tests
+# ===============================
+
+class PointsPurchaseTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user('seller')
+        self.item = make_item(self.seller, points_value=30)
+        self.url = f'/api/items/{self.item.item_id}/purchase/'
+
+    def purchase(self, points=30, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(self.url, {'mode': 'points', 'points_used': points}, **headers)
+
+    def test_purchase_moves_points_and_writes_ledger(self):
+        response = self.purchase()
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.user.refresh_from_db()
+        self.seller.refresh_from_db()
+        self.assertEqual((self.user.points_balance, self.seller.points_balance), (70, 130))
+        self.assertEqual(
+            sorted(PointsLedgerEntry.objects.values_list('entry_type', 'amount')),
+            [('purchase', -30), ('sale', 30)],
+        )
+
+    def test_insufficient_balance_changes_nothing(self):
+        response = self.purchase(points=500)
+        self.assertEqual(response.status_code, 400)
+        self.item.refresh_from_db()
+        self.seller.refresh_from_db()
+        self.assertEqual(self.item.status, 'available')
+        self.assertEqual(self.seller.points_balance, 100)
+        self.assertFalse(PointsLedgerEntry.objects.exists())
+
+    def test_retry_with_same_idempotency_key_is_not_charged_twice(self):
+        first = self.purchase(key='retry-1')
+        second = self.purchase(key='retry-1')
+        self.assertEqual(second.status_code, 200, second.content)
+        self.assertTrue(second.json()['replayed'])
+        self.assertEqual(
+            first.json()['transaction']['transaction_id'],
+            second.json()['transaction']['transaction_id'],
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points_balance, 70)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_amount_must_be_positive_and_match_the_price(self):
+        for points in (-30, 0, 10, 31):
+            self.assertEqual(self.purchase(points=points).status_code, 400, points)
+        with self.assertRaises(PurchaseError):
+            purchase_with_points(self.user, self.item.item_id, -30)
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.points_balance, 100)
+        self.assertFalse(PointsLedgerEntry.objects.exists())
+
+    def test_idempotency_key_is_bounded_and_tied_to_its_item(self):
+        self.assertEqual(self.purchase(key='k' * 65).status_code, 400)
+
+        self.assertEqual(self.purchase(key='retry-1').status_code, 200)
+        other = make_item(self.seller, points_value=30)
+        response = self.client.post(
+            f'/api/items/{other.item_id}/purchase/', {'mode': 'points', 'points_used': 30},
+            HTTP_IDEMPOTENCY_KEY='retry-1',
+        )
+        self.assertEqual(response.status_code, 422)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'available')
+
+
+class ConcurrentPurchaseTests(TransactionTestCase):
+    """
+    Fire parallel purchases of one item from separate threads, each with
+    its own database connection, and check exactly one goes through
+    """
+    buyers = 8
+
+    def test_parallel_purchases_sell_item_once(self):
+        seller = make_user('seller')
+        item = make_item(seller, points_value=30)
+        buyers = [make_user(f'buyer{i}') for i in range(self.buyers)]
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def attempt(buyer):
+            client = APIClient()
+            client.force_authenticate(buyer)
+            barrier.wait()
+            try:
+                response = client.post(
+                    f'/api/items/{item.item_id}/purchase/',
+                    {'mode': 'points', 'points_used': 30},
+                )
+                results.append(response.status_code)
+            except Exception as e:
+                # e.g. SQLite reporting a locked database to the loser
+                results.append(repr(e))
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=attempt, args=(buyer,)) for buyer in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(200), 1, results)
+        self.assertEqual(Transaction.objects.filter(item=item).count(), 1)
+        seller.refresh_from_db()
+        self.assertEqual(seller.points_balance, 130)
+        total = sum(User.objects.filter(pk__in=[b.pk for b in buyers]).values_list('points_balance', flat=True))
+        self.assertEqual(total, 100 * self.buyers - 30)
+        self.assertEqual(PointsLedgerEntry.objects.count(), 2)
+
+
+# ===============================
+# Browse Cache Tests
+# ===============================
+
+@override_settings(BROWSE_CACHE_TIMEOUT=60)
+class BrowseCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.uploader = make_user('uploader')
+        self.jacket = make_item(self.uploader, category='outerwear')
+        self.shirt = make_item(self.uploader, category='tops', title='Linen Shirt')
+
+    def browse_ids(self, url='/api/items/'):
+        return {row['item_id'] for row in self.client.get(url).json()['results']}
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.count_queries('/api/items/?category=tops')
+        # Only the per-user is_liked lookup runs on a hit
+        with self.assertNumQueries(1):
+            self.client.get('/api/items/?category=tops')
+
+    def test_cached_page_is_shared_by_users_without_listings(self):
+        self.assertEqual(len(self.browse_ids()), 2)
+
+        self.client.force_authenticate(make_user('browser'))
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.browse_ids()), 2)
+
+    def test_own_items_are_left_out_before_caching(self):
+        for _ in range(3):
+            make_item(self.uploader, category='tops')
+        wrap_dress = make_item(make_user('designer'), category='dresses', title='Wrap Dress')
+        shared = self.client.get('/api/items/?page_size=2&count=exact').json()
+        self.assertEqual(shared['count'], 6)
+
+        self.uploader.refresh_from_db()
+        self.client.force_authenticate(self.uploader)
+        own_page = self.client.get('/api/items/?page_size=2&count=exact').json()
+        self.assertEqual([row['item_id'] for row in own_page['results']], [str(wrap_dress.item_id)])
+        self.assertEqual(own_page['count'], 1)
+        self.assertIsNone(own_page['next_cursor'])
+        with self.assertNumQueries(1):
+            self.client.get('/api/items/?page_size=2&count=exact')
+
+    def test_item_writes_invalidate_matching_pages(self):
+        self.browse_ids('/api/items/?category=tops')
+        new_shirt = make_item(self.uploader, category='tops')
+        self.assertIn(str(new_shirt.item_id), self.browse_ids('/api/items/?category=tops'))
+
+        self.shirt.status = 'removed'
+        self.shirt.save()
+        self.assertNotIn(str(self.shirt.item_id), self.browse_ids('/api/items/?category=tops'))
+
+    def test_other_categories_stay_cached(self):
+        self.browse_ids('/api/items/?category=outerwear')
+        make_item(self.uploader, category='tops')
+        with self.assertNumQueries(1):
+            self.browse_ids('/api/items/?category=outerwear')
+
+    def test_purchase_and_soft_delete_invalidate(self):
+        self.assertEqual(len(self.browse_ids()), 2)
+
+        response = self.client.post(
+            f'/api/items/{self.jacket.item_id}/purchase/', {'mode': 'points', 'points_used': 50}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.browse_ids(), {str(self.shirt.item_id)})
+
+        self.client.force_authenticate(self.uploader)
+        self.client.delete(f'/api/items/{self.shirt.item_id}/')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.browse_ids(), set())
+
+
+# ===============================
+# Request Profiling Tests
+# ===============================
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=1.0)
+class RequestProfilingTests(APITestCase):
+
+    def test_server_timing_header_and_log_line(self):
+        make_item(make_user('uploader'))
+        with self.assertLogs('app.core.profiling', 'INFO') as logs:
+            response = self.client.get('/api/items/')
+
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'serializer;dur=', 'serializer-db;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/api/items/')
+        self.assertGreater(record['query_count'], 0)
+        self.assertLessEqual(len(record['slowest_queries']), 3)
+
+    def test_repeated_queries_are_flagged(self):
+        profile = RequestProfile()
+        for pk in range(4):
+            profile.record_query(lambda *args: None, f'SELECT * FROM users WHERE id = {pk}', (), False, {})
+        profile.record_query(lambda *args: None, "SELECT * FROM items WHERE id IN (1, 2, 3)", (), False, {})
+
+        self.assertEqual(fingerprint("WHERE a = 'x' AND b IN (1, 2)"), 'WHERE a = ? AND b IN (...)')
+        self.assertEqual(profile.duplicates(3), [('SELECT * FROM users WHERE id = ?', 4)])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get('/api/items/')
+        self.assertNotIn('Server-Timing', response)
+
+
+# ===============================
+# Async View Tests
+# ===============================
+
+def asgi_urlconf():
+    """The URL conf as built under SERVER_MODE=asgi, with ASYNC_VIEWS on"""
+    from .urls import urlpatterns
+
+    def rebuild(pattern):
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if view_class is None or not issubclass(view_class, AsyncAPIView):
+            return pattern
+        return URLPattern(pattern.pattern, view_class.as_view(), pattern.default_args, pattern.name)
+
+    with override_settings(ASYNC_VIEWS=True):
+        patterns = [rebuild(pattern) for pattern in urlpatterns]
+
+    class URLConf:
+        urlpatterns = [path('api/', include(patterns))]
+    return URLConf
+
+
+ASGI_URLCONF = asgi_urlconf()
+
+
+@override_settings(ROOT_URLCONF=ASGI_URLCONF)
+class AsyncViewTests(APITestCase):
+    """Read views run on the event loop under ASGI (AsyncClient) and stay sync under WSGI"""
+
+    def setUp(self):
+        super().setUp()
+        self.other = make_user('uploader')
+        self.item = make_item(self.other)
+        Like.objects.create(user=self.user, item=self.item)
+        self.headers = {'Authorization': f'Bearer {tokens_for_user(self.user).access_token}'}
+        self.paths = ('/api/items/', f'/api/items/{self.item.item_id}/', f'/api/users/{self.other.user_id}/')
+
+    def aget(self, path):
+        return AsyncClient().get(path, headers=self.headers)
+
+    def test_read_views_are_async_only_under_asgi(self):
+        for url in self.paths:
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+            self.assertFalse(iscoroutinefunction(resolve(url, 'config.urls').func), url)
+
+    def test_async_and_sync_variants_agree(self):
+        for url in self.paths:
+            asgi = self.client.get(url)
+            with override_settings(ROOT_URLCONF='config.urls'):
+                wsgi = self.client.get(url)
+            self.assertEqual(asgi.status_code, 200, asgi.content)
+            self.assertEqual(asgi.json(), wsgi.json(), url)
+
+    async def test_read_views_under_asgi(self):
+        response = await self.aget(f'/api/items/{self.item.item_id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['is_liked'])
+        self.assertEqual(response.json()['uploader']['user_id'], str(self.other.user_id))
+
+        response = await self.aget('/api/items/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['results'][0]['is_liked'])
+
+        response = await self.aget(f'/api/users/{self.other.user_id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['badges'], [])
+
+        self.assertEqual((await self.aget('/api/users/me/')).status_code, 200)
+        self.assertEqual((await AsyncClient().get('/api/items/')).status_code, 401)
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=1.0)
+    async def test_profiling_captures_async_queries(self):
+        with self.assertLogs('app.core.profiling', 'INFO') as logs:
+            response = await self.aget(f'/api/items/{self.item.item_id}/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertGreater(json.loads(logs.records[0].getMessage())['query_count'], 0)
+
+
+# ===============================
+# Read Replica Tests
+# ===============================
+
+@skipUnless(connection.vendor == 'sqlite', 'the replica is a copy of the SQLite test database')
+class ReadReplicaTests(TransactionTestCase):
+    """
+    A second SQLite database stands in for a lagging replica: it is copied
+    from the test database before any test data exists, so rows a test
+    creates are only on the primary
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered after the test case's database checks, which only know
+        # the configured aliases
+        cls.replica_dir = tempfile.mkdtemp()
+        replica = {**connection.settings_dict, 'NAME': os.path.join(cls.replica_dir, 'stale_replica.sqlite3')}
+        shutil.copyfile(connection.settings_dict['NAME'], replica['NAME'])
+        connections.settings['stale_replica'] = replica
+        cls.databases = cls.databases | {'stale_replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['stale_replica'].close()
+        del connections['stale_replica']
+        del connections.settings['stale_replica']
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(view_buffer.clear)
+        self.user = make_user('viewer')
+        self.other = make_user('uploader')
+        self.item = make_item(self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(DATABASE_REPLICAS=['stale_replica'], BROWSE_CACHE_TIMEOUT=60)
+    def test_reads_use_replica_until_user_writes(self):
+        detail = f'/api/items/{self.item.item_id}/'
+        profile = f'/api/users/{self.other.user_id}/'
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        self.assertEqual(self.client.get(profile).status_code, 404)
+        self.assertEqual(self.client.get(f'{profile}ratings/').status_code, 404)
+        # Cached browse pages are built on the primary
+        browse = self.client.get('/api/items/').json()
+        self.assertEqual([row['item_id'] for row in browse['results']], [str(self.item.item_id)])
+
+        response = self.client.post(f'{detail}like/')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get(detail)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['is_liked'])
+        self.assertEqual(self.client.get(profile).status_code, 200)
+
+        # Another user has not written, so still reads the replica
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+    @override_settings(DATABASE_REPLICAS=['stale_replica'])
+    async def test_async_reads_use_replica_until_user_writes(self):
+        client = AsyncClient()
+        detail = f'/api/items/{self.item.item_id}/'
+        headers = {'Authorization': f'Bearer {tokens_for_user(self.user).access_token}'}
+        self.assertEqual((await client.get(detail, headers=headers)).status_code, 404)
+        self.assertEqual((await client.post(f'{detail}like/', headers=headers)).status_code, 200)
+        self.assertEqual((await client.get(detail, headers=headers)).status_code, 200)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_reads_use_primary(self):
+        self.assertEqual(self.client.get(f'/api/items/{self.item.item_id}/').status_code, 200)
+
+    @override_settings(DATABASE_REPLICAS=['stale_replica'])
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('stale_replica', 'core'))
+        self.assertTrue(router.allow_migrate('default', 'core'))
+        self.assertEqual(router.db_for_read(Item), 'default')
+
+
+# ===============================
+# Image Pipeline Tests
+# ===============================
+
+def make_jpeg(size=(1600, 1200)):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    exif[0x010F] = 'TestCam'  # Make
+    buffer = BytesIO()
+    Image.new('RGB', size, 'navy').save(buffer, format='JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class ImagePipelineTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def test_upload_writes_clean_original_and_variants(self):
+        upload = SimpleUploadedFile('photo.JPG', make_jpeg(), content_type='image/jpeg')
+        response = self.client.post('/api/upload/images/', {'images': [upload]}, format='multipart')
+        self.assertEqual(response.status_code, 202, response.content)
+
+        uploaded = response.json()['images'][0]
+        self.assertIn('_320.webp 320w', uploaded['srcset'])
+        with default_storage.open(uploaded['filename']) as f, Image.open(f) as original:
+            self.assertEqual(original.size, (1200, 1600))
+            self.assertEqual(len(original.getexif()), 0)
+
+        base = uploaded['filename'].rsplit('.', 1)[0]
+        for width in (320, 640, 1280):
+            with default_storage.open(f'{base}_{width}.webp') as f, Image.open(f) as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertEqual(variant.width, min(width, 1200))
+
+    def test_pool_processes_in_background(self):
+        with override_settings(IMAGE_PROCESSING_WORKERS=2):
+            _, future = submit_upload('items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg', make_jpeg((400, 300)))
+            self.assertEqual(future.result(timeout=30), 'items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg')
+        self.assertTrue(default_storage.exists('items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3_640.webp'))
+
+    def test_original_is_stored_before_variants_fail(self):
+        upload = SimpleUploadedFile('photo.jpg', make_jpeg((400, 300)), content_type='image/jpeg')
+        with override_settings(IMAGE_PROCESSING_WORKERS=2), \
+                mock.patch('app.core.images.process_variants', side_effect=OSError('disk full')):
+            response = self.client.post('/api/upload/images/', {'images': [upload]}, format='multipart')
+            shutdown_executor(wait=True)
+        self.assertEqual(response.status_code, 202, response.content)
+        name = response.json()['images'][0]['filename']
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(name.rsplit('.', 1)[0] + '_640.webp'))
+
+        item = make_item(make_user('uploader'), images=0)
+        ItemImage.objects.create(item=item, image=name, is_primary=True)
+        call_command('generate_image_variants', stdout=StringIO())
+        self.assertTrue(default_storage.exists(name.rsplit('.', 1)[0] + '_640.webp'))
+
+    def test_unwritable_formats_are_stored_as_png(self):
+        self.assertEqual(original_extension('JPEG'), 'jpg')
+        self.assertEqual(original_extension('PSD'), 'png')
+        name = 'items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.png'
+        data = make_jpeg((400, 300))
+        with mock.patch.dict(Image.SAVE):
+            del Image.SAVE['JPEG']
+            save_original(name, data)
+        with default_storage.open(name) as f, Image.open(f) as original:
+            self.assertEqual(original.format, 'PNG')
+
+    def test_full_queue_processes_inline(self):
+        name = 'items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg'
+        with override_settings(IMAGE_PROCESSING_WORKERS=2, IMAGE_PROCESSING_MAX_PENDING=0):
+            _, future = submit_upload(name, make_jpeg((400, 300)))
+        self.assertTrue(future.done())
+        self.assertTrue(default_storage.exists('items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3_320.webp'))
+
+    def test_feed_serves_the_original_until_the_variant_is_written(self):
+        name, data = save_original('items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg', make_jpeg((400, 300)))
+        item = make_item(make_user('uploader'), images=0)
+        ItemImage.objects.create(item=item, image=name, is_primary=True)
+        row = self.client.get('/api/items/').json()['results'][0]
+        self.assertTrue(row['primary_image'].endswith('/media/items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg'))
+        image = self.client.get(f'/api/items/{item.item_id}/').json()['images'][0]
+        self.assertEqual((image['srcset'], image['sources']), ('', []))
+
+        process_variants(name, data)
+        row = self.client.get('/api/items/').json()['results'][0]
+        self.assertTrue(row['primary_image'].endswith('/media/items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3_640.webp'))
+
+    def test_item_images_expose_srcset_per_format(self):
+        name = 'items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg'
+        item = make_item(make_user('uploader'), images=0)
+        ItemImage.objects.create(item=item, image=name, is_primary=True)
+        for width in (320, 640, 1280):
+            for fmt in ('avif', 'webp'):
+                default_storage.save(f'items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3_{width}.{fmt}', ContentFile(b'x'))
+
+        with mock.patch('app.core.images.variant_formats', return_value=['avif', 'webp']):
+            image = self.client.get(f'/api/items/{item.item_id}/').json()['images'][0]
+        self.assertEqual(
+            image['srcset'].split(', ')[0],
+            '/media/items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3_320.webp 320w',
+        )
+        self.assertEqual([source['type'] for source in image['sources']], ['image/avif', 'image/webp'])
+        self.assertEqual(
+            image['sources'][0]['srcset'].split(', ')[-1],
+            '/media/items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3_1280.avif 1280w',
+        )
+
+    def test_names_chosen_by_storage_are_kept(self):
+        name = 'items/0b5c1d2e-3f40-4a5b-8c6d-7e8f90a1b2c3.jpg'
+        save_original(name, make_jpeg((400, 300)))
+        stored, future = submit_upload(name, make_jpeg((400, 300)))
+        self.assertNotEqual(stored, name)
+        self.assertTrue(default_storage.exists(stored))
+        self.assertEqual(future.result(), stored)
+        self.assertTrue(default_storage.exists(stored.rsplit('.', 1)[0] + '_640.webp'))
+
+        # Regenerating replaces the variants instead of saving copies next to them
+        regenerate_variants(stored)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'items'))), 5)
+
+
+# ===============================
+# Export Tests
+# ===============================
+
+@override_settings(EXPORT_WATERMARK_LAG=0)
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = make_user('analyst', is_staff=True)
+        self.item = make_item(self.user)
+        self.client.force_authenticate(self.staff)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_export_is_incremental_from_watermark(self):
+        response, body = self.export('/api/exports/users/')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual({row['user_id'] for row in rows}, {str(self.user.user_id), str(self.staff.user_id)})
+        self.assertNotIn('email', rows[0])
+        self.assertNotIn('password', rows[0])
+
+        since = response['X-Export-Watermark']
+        _, body = self.export(f'/api/exports/items/?since={since}')
+        self.assertEqual(body, b'')
+
+        self.item.title = 'Relabelled Jacket'
+        self.item.save()
+        _, body = self.export(f'/api/exports/items/?since={since}')
+        self.assertEqual(json.loads(body)['title'], 'Relabelled Jacket')
+
+    @override_settings(EXPORT_WATERMARK_LAG=60)
+    def test_watermark_lags_behind_uncommitted_writes(self):
+        # Saved 10 s ago by a transaction that may not have committed yet
+        Item.objects.filter(pk=self.item.pk).update(updated_at=timezone.now() - timedelta(seconds=10))
+        response, body = self.export('/api/exports/items/')
+        self.assertEqual(body, b'')
+
+        since = response['X-Export-Watermark']
+        later = timezone.now() + timedelta(seconds=120)
+        with mock.patch('app.core.exports.timezone.now', return_value=later):
+            _, body = self.export(f'/api/exports/items/?since={since}')
+        self.assertEqual(json.loads(body)['item_id'], str(self.item.item_id))
+
+    def test_gzipped_csv_export_and_staff_only(self):
+        _, body = self.export('/api/exports/items/?output=csv&gzip=1')
+        header, row = gzip.decompress(body).decode().splitlines()
+        self.assertTrue(header.startswith('item_id,uploader_id,title'))
+        self.assertIn(str(self.item.item_id), row)
+
+        self.assertEqual(self.client.get('/api/exports/items/?output=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/exports/likes/').status_code, 404)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/exports/items/').status_code, 403)
+
+    async def test_asgi_export_streams_chunk_by_chunk(self):
+        headers = {'Authorization': f'Bearer {tokens_for_user(self.staff).access_token}'}
+        response = await AsyncClient().get('/api/exports/users/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.decode().splitlines()), 2)
+
+        read = []
+
+        def chunks():
+            for n in range(3):
+                read.append(n)
+                yield b'chunk'
+
+        stream = aiter_chunks(chunks())
+        self.assertEqual(await anext(stream), b'chunk')
+        self.assertEqual(read, [0])
+        await stream.aclose()
+
+    def test_command_writes_export_file(self):
+        output = tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False)
+        output.close()
+        self.addCleanup(os.unlink, output.name)
+        stderr = StringIO()
+        with override_settings(EXPORT_CHUNK_SIZE=1):
+            call_command('export_data', 'transactions', output=output.name, stderr=stderr)
+        with open(output.name, 'rb') as f:
+            self.assertEqual(f.read(), b'')
+        self.assertIn('next --since', stderr.getvalue())
+
+        Transaction.objects.create(sender=self.staff, receiver=self.user, item=self.item, method='swap')
+        with override_settings(EXPORT_CHUNK_SIZE=1):
+            call_command('export_data', 'transactions', output=output.name, stderr=stderr)
+        with open(output.name, 'rb') as f:
+            self.assertEqual(json.loads(f.read())['item_id'], str(self.item.item_id))
+
+
+# ===============================
+# Bulk Import Tests
+# ===============================
+
+class ItemImportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = make_user('organizer', is_staff=True)
+        self.client.force_authenticate(self.staff)
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def row(self, title, **extra):
+        row = {'title': title, 'description': 'Donated', 'category': 'tops', 'size': 'm', 'condition': 'good'}
+        row.update(extra)
+        return json.dumps(row)
+
+    def test_api_imports_in_batches_and_reports_rejected_rows(self):
+        lines = [
+            self.row('Wool Scarf', images=['items/scarf-front.jpg', 'items/scarf-back.jpg']),
+            self.row('Rain Coat', uploader=self.user.email),
+            self.row('Bad Category', category='hats'),
+            '{not json',
+            self.row('Nobody', uploader='missing@rewear.test'),
+            self.row('Linen Shirt', uploader=self.user.email),
+        ]
+        upload = SimpleUploadedFile('drive.ndjson', '\n'.join(lines).encode())
+        self.client.get('/api/items/')  # warm the browse cache
+        response = self.client.post('/api/items/import/', {'file': upload, 'batch_size': 2}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        report = response.json()
+        self.assertEqual((report['imported'], report['images'], report['failed']), (3, 2, 3))
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4, 5])
+        self.assertIn('category', report['errors'][0]['errors'])
+        self.assertIn('uploader', report['errors'][2]['errors'])
+
+        scarf = Item.objects.get(title='Wool Scarf')
+        self.assertEqual(scarf.uploader, self.staff)
+        self.assertEqual(scarf.images.get(is_primary=True).image.name, 'items/scarf-front.jpg')
+        self.assertEqual(User.objects.get(pk=self.user.pk).items_listed, 2)
+        self.assertEqual(User.objects.get(pk=self.staff.pk).items_listed, 1)
+        # Browse hides the requester's own items, so the scarf is not listed
+        titles = {item['title'] for item in self.client.get('/api/items/').json()['results']}
+        self.assertLessEqual({'Rain Coat', 'Linen Shirt'}, titles)
+
+        self.client.force_authenticate(self.user)
+        upload = SimpleUploadedFile('drive.ndjson', lines[0].encode())
+        self.assertEqual(self.client.post('/api/items/import/', {'file': upload}, format='multipart').status_code, 403)
+
+    def test_command_ingests_images_from_csv(self):
+        image_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, image_root, True)
+        with open(os.path.join(image_root, 'coat.jpg'), 'wb') as f:
+            f.write(make_jpeg((400, 300)))
+        source = os.path.join(image_root, 'drive.csv')
+        with open(source, 'w', newline='') as f:
+            f.write('title,description,category,size,condition,points_value,images\n')
+            f.write('Pea Coat,Warm,outerwear,l,good,40,coat.jpg\n')
+            f.write('Escape,Nope,outerwear,l,good,40,../../etc/passwd\n')
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('bulk_import_items', source, uploader=self.staff.email, image_root=image_root,
+                     stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 1 items', stdout.getvalue())
+        self.assertIn('Row 2', stderr.getvalue())
+
+        name = Item.objects.get(title='Pea Coat').images.get().image.name
+        self.assertRegex(name, r'^items/[0-9a-f-]{36}\.jpg$')
+        self.assertTrue(default_storage.exists(name.replace('.jpg', '_320.webp')))
+
+    def test_api_refuses_files_over_the_row_cap(self):
+        lines = [self.row(f'Tee {n}') for n in range(3)]
+        upload = SimpleUploadedFile('drive.ndjson', '\n'.join(lines).encode())
+        with override_settings(ITEM_IMPORT_API_MAX_ROWS=2):
+            response = self.client.post('/api/items/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 413, response.content)
+        self.assertFalse(Item.objects.filter(title__startswith='Tee').exists())
+
+    def test_image_urls_must_resolve_to_public_addresses(self):
+        for url in ('http://127.0.0.1:9/a.jpg', 'http://localhost:9/a.jpg', 'http://[::ffff:169.254.169.254]/a.jpg'):
+            with self.assertRaisesRegex(ValueError, 'non-public'):
+                fetch_image(url)
+
+        jpeg = make_jpeg((40, 30))
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metadata':
+                    self.send_response(302)
+                    self.send_header('Location', 'http://10.0.0.1/latest/meta-data')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f'http://127.0.0.1:{server.server_port}'
+        # Let the test server through, but nothing else private
+        with mock.patch('app.core.imports.is_public_address', side_effect=lambda address: address == '127.0.0.1'):
+            self.assertEqual(fetch_image(f'{base}/coat.jpg'), (jpeg, 'jpg'))
+            with self.assertRaisesRegex(ValueError, '10.0.0.1 resolves to a non-public'):
+                fetch_image(f'{base}/metadata')
+
+
+# ===============================
+# Bootstrap Tests
+# ===============================
+
+@override_settings(BOOTSTRAP_ADMIN_EMAIL='admin@rewear.test', BOOTSTRAP_ADMIN_PASSWORD='admin-pass-123')
+class BootstrapTests(TestCase):
+    """The deploy-time bootstrap is idempotent and its cost does not grow with the users table"""
+
+    def bootstrap(self):
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('bootstrap', stdout=StringIO())
+        return len(ctx.captured_queries)
+
+    def test_provisions_admin_once(self):
+        self.bootstrap()
+        admin = User.objects.get(username='admin')
+        self.assertTrue(admin.is_superuser and admin.is_staff)
+        self.assertTrue(admin.check_password('admin-pass-123'))
+
+        queries = self.bootstrap()
+        for i in range(20):
+            make_user(f'member{i}')
+        self.assertEqual(self.bootstrap(), queries)
+        # Nothing changed, so the admin's tokens stay valid
+        self.assertEqual(User.objects.get(username='admin').token_version, admin.token_version)
+
+    def test_repairs_admin_and_removes_retired_accounts(self):
+        User.objects.create_user(username='admin', email='old@rewear.test', password='forgotten')
+        make_user('venkatesh')
+        self.bootstrap()
+        admin = User.objects.get(username='admin')
+        self.assertEqual(admin.email, 'admin@rewear.test')
+        self.assertTrue(admin.is_superuser and admin.check_password('admin-pass-123'))
+        self.assertFalse(User.objects.filter(username='venkatesh').exists())
+
+    def test_up_to_date_schema_skips_migrate(self):
+        self.assertEqual(pending_migrations(), [])
+        with mock.patch('app.core.bootstrap.call_command') as migrate:
+            self.bootstrap()
+        migrate.assert_not_called()
+
+
+# ===============================
+# Benchmark Suite Tests
+# ===============================
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0)
+class BenchmarkSuiteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ctx = seed(scale=0.0002, batch_size=50)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def test_scenarios_cover_every_core_route(self):
+        from .urls import urlpatterns
+        covered = {resolve(scenario.path.split('?')[0]).url_name for scenario in build_scenarios(self.ctx)}
+        self.assertEqual(covered, {pattern.name for pattern in urlpatterns})
+
+    def test_every_scenario_succeeds_and_regressions_are_reported(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            results = run_benchmarks(self.ctx, iterations=1, warmup=0)
+        for name, result in results.items():
+            self.assertTrue(all(200 <= code < 300 for code in result['status']), (name, result))
+        self.assertGreater(results['export_transactions']['bytes'], 0)
+
+        self.assertEqual(compare_with_baseline(results, results), [])
+        tightened = {name: {**result, 'queries': result['queries'] - 1} for name, result in results.items()}
+        regressions = compare_with_baseline(results, tightened)
+        self.assertIn('items_browse:', ' '.join(regressions))
+
+    def test_seeded_users_have_their_counters(self):
+        fields = ('total_swaps', 'ongoing_swaps', 'completed_swaps', 'items_listed', 'rating_count', 'rating_sum')
+        seeded = list(User.objects.order_by('pk').values_list(*fields))
+        self.assertTrue(any(row[0] for row in seeded))
+        self.assertTrue(any(row[4] for row in seeded))
+
+        User.rebuild_stats()
+        User.rebuild_rating_aggregates()
+        self.assertEqual(list(User.objects.order_by('pk').values_list(*fields)), seeded)
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=2)
+    def test_uploads_are_not_left_in_media_root(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            results = run_benchmarks(self.ctx, iterations=2, warmup=0, only=['image_upload'])
+        self.assertEqual(results['image_upload']['status'], [202])
+        self.assertEqual(os.listdir(self.media_root), [])
@@ -16,11 +16,15 @@ urlpatterns = [
     # Item Management endpoints
     path('items/', views.ItemListCreateView.as_view(), name='item_list_create'),
     path('items/<uuid:item_id>/', views.ItemDetailView.as_view(), name='item_detail'),
+    path('items/import/', views.ItemImportView.as_view(), name='item_import'),
+    path('items/<uuid:item_id>/similar/', views.ItemSimilarView.as_view(), name='item_similar'),
     path('users/me/items/', views.UserItemsView.as_view(), name='user_items'),
     
     # Transaction/Swap endpoints
     path('swaps/', views.TransactionListCreateView.as_view(), name='transaction_list_create'),
+    path('swaps/suggestions/', views.SwapSuggestionsView.as_view(), name='swap_suggestions'),
     path('swaps/<uuid:transaction_id>/', views.TransactionDetailView.as_view(), name='transaction_detail'),
+    path('items/<uuid:item_id>/like/', views.ItemLikeView.as_view(), name='item_like'),
     path('items/<uuid:item_id>/purchase/', views.ItemPurchaseView.as_view(), name='item_purchase'),
     
     # Rating endpoints
@@ -29,4 +33,8 @@ urlpatterns = [
     
     # Image upload endpoint
     path('upload/images/', views.ImageUploadView.as_view(), name='image_upload'),
+    
+    # Analytics exports (staff only)
+    path('exports/<str:table>/', views.ExportView.as_view(), name='export'),
+    path('metrics/view-counts/', views.ViewCountStatsView.as_view(), name='view_count_stats'),
 ]
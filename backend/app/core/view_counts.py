@@ -0,0 +1,241 @@
+"""
+Buffered item view counter.
+
+ItemDetailView records views in an in-process buffer instead of writing
+on every read. Pending increments are coalesced per item and written
+with one ``UPDATE ... SET views_count = views_count + CASE ... END`` per
+batch. A flush runs after a response has been sent (request_finished)
+once the oldest pending view is VIEW_COUNT_FLUSH_INTERVAL seconds old or
+VIEW_COUNT_MAX_PENDING items are pending, and at process exit. A worker
+that stops getting requests has no response to flush after, so a
+background thread, started with the first view, flushes views left
+pending for twice the interval. A crash loses at most the views of two
+flush intervals. Staff can read a worker's buffer counters at
+/api/metrics/view-counts/.
+
+Repeat views by the same user within VIEW_COUNT_DEDUP_WINDOW seconds are
+counted once; the window is tracked in the shared cache.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Item
+
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """Thread-safe per-process buffer of pending view increments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._oldest = None  # monotonic time of the oldest pending view
+        self.has_pending = threading.Event()
+        self.recorded = 0
+        self.deduplicated = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_at = None
+        self.last_flush_ms = None
+
+    def add(self, item_id):
+        with self._lock:
+            self._pending[item_id] += 1
+            self.recorded += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self.has_pending.set()
+
+    def deduplicate(self):
+        """Count a repeat view that was not recorded"""
+        with self._lock:
+            self.deduplicated += 1
+
+    def requeue(self, items, oldest):
+        """Put back increments a failed flush did not write"""
+        with self._lock:
+            self._pending.update(dict(items))
+            self._oldest = min(filter(None, (self._oldest, oldest)))
+            self.has_pending.set()
+
+    def clear(self):
+        """Drop pending increments, e.g. views recorded in rolled-back requests"""
+        with self._lock:
+            self._pending.clear()
+            self._oldest = None
+            self.has_pending.clear()
+
+    def pending(self, item_id):
+        with self._lock:
+            return self._pending.get(item_id, 0)
+
+    def oldest_age(self):
+        """Seconds since the oldest pending view, None when nothing is pending"""
+        with self._lock:
+            return time.monotonic() - self._oldest if self._oldest is not None else None
+
+    def due(self):
+        """Whether the buffer has reached its flush interval or size limit"""
+        with self._lock:
+            if not self._pending:
+                return False
+            return (
+                time.monotonic() - self._oldest >= settings.VIEW_COUNT_FLUSH_INTERVAL
+                or len(self._pending) >= settings.VIEW_COUNT_MAX_PENDING
+            )
+
+    def flush(self):
+        """Write all pending increments; returns the number of views written"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            oldest, self._oldest = self._oldest, None
+            self.has_pending.clear()
+        if not pending:
+            return 0
+
+        start = time.monotonic()
+        items = list(pending.items())
+        batch_size = settings.VIEW_COUNT_FLUSH_BATCH_SIZE
+        written = 0
+        try:
+            for i in range(0, len(items), batch_size):
+                batch = items[i:i + batch_size]
+                with transaction.atomic():
+                    _write_batch(batch)
+                written += sum(count for _, count in batch)
+        except Exception:
+            # Keep what was not written for the next flush
+            self.requeue(items[i:], oldest)
+            with self._lock:
+                self.failed_flushes += 1
+            logger.exception('View count flush failed; %d views re-queued', sum(pending.values()) - written)
+
+        duration_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self.flushed += written
+            self.flushes += 1
+            self.last_flush_at = time.time()
+            self.last_flush_ms = round(duration_ms, 2)
+        logger.info(json.dumps({
+            'event': 'view_count_flush',
+            'items': len(items),
+            'views': written,
+            'oldest_age_s': round(time.monotonic() - oldest, 2),
+            'duration_ms': self.last_flush_ms,
+        }))
+        return written
+
+    def stats(self):
+        """Counters for monitoring the buffer and its current loss window"""
+        with self._lock:
+            pending_views = sum(self._pending.values())
+            pending_items = len(self._pending)
+            oldest_age = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+            return {
+                'pending_items': pending_items,
+                'pending_views': pending_views,
+                'oldest_pending_age_s': round(oldest_age, 2),
+                'flush_interval_s': settings.VIEW_COUNT_FLUSH_INTERVAL,
+                'max_pending_items': settings.VIEW_COUNT_MAX_PENDING,
+                'recorded': self.recorded,
+                'deduplicated': self.deduplicated,
+                'flushed': self.flushed,
+                'flushes': self.flushes,
+                'failed_flushes': self.failed_flushes,
+                'last_flush_at': self.last_flush_at,
+                'last_flush_ms': self.last_flush_ms,
+            }
+
+
+def _write_batch(batch):
+    increment = Case(
+        *[When(pk=item_id, then=Value(count)) for item_id, count in batch],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    Item.objects.filter(pk__in=[item_id for item_id, _ in batch]).update(
+        views_count=F('views_count') + increment
+    )
+
+
+buffer = ViewCountBuffer()
+
+
+def record_view(item, user=None):
+    """
+    Count a view of item. Returns False for views that are not counted:
+    the uploader's own views and repeat views inside the dedup window.
+    """
+    user_id = getattr(user, 'pk', None)
+    if user_id is not None and user_id == item.uploader_id:
+        return False
+
+    window = settings.VIEW_COUNT_DEDUP_WINDOW
+    if user_id is not None and window:
+        if not cache.add(f'views:seen:{user_id}:{item.pk}', 1, window):
+            buffer.deduplicate()
+            return False
+
+    buffer.add(item.pk)
+    start_flusher()
+    return True
+
+
+def pending_views(item):
+    """Views of item recorded by this process but not yet flushed"""
+    return buffer.pending(item.pk)
+
+
+def flush_if_due(**kwargs):
+    """request_finished receiver: flush once the buffer is due"""
+    if buffer.due():
+        buffer.flush()
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_left_behind():
+    """Background loop flushing views that no request_finished flush picked up"""
+    while True:
+        buffer.has_pending.wait()
+        age = buffer.oldest_age()
+        if age is None:
+            continue
+        remaining = max(2 * settings.VIEW_COUNT_FLUSH_INTERVAL, 1) - age
+        if remaining > 0:
+            # Short sleeps, so a flush by a request or a changed setting is noticed
+            time.sleep(min(remaining, 1))
+            continue
+        try:
+            buffer.flush()
+        finally:
+            connections.close_all()
+
+
+def start_flusher():
+    """Start this process's background flush thread unless it is running"""
+    global _flusher
+    # Threads do not survive a fork, so forked workers start their own
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_left_behind, name='view-count-flush', daemon=True)
+            _flusher.start()
+
+
+atexit.register(buffer.flush)
@@ -1,29 +1,56 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveAPIView, UpdateAPIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.db import transaction as db_transaction
 from django.db.models import Q
 from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.conf import settings
 import datetime
+import logging
+import os
 import uuid
 
-from .models import User, Item, ItemImage, Transaction, Rating
+from asgiref.sync import sync_to_async
+
+from .models import User, Item, ItemImage, Transaction, Rating, Like
+from .async_views import AsyncAPIView
+from .authentication import tokens_for_user
+from .cache import (
+    browse_owner, get_cached_browse_page, aget_cached_browse_page, exclude_own_items,
+    mark_liked_items, amark_liked_items,
+)
+from .exports import (
+    EXPORTS, FORMATS, ExportError, aiter_chunks, format_watermark, parse_since, stream_export, watermark,
+)
+from .geo import InvalidLocation, filter_near, parse_near
+from .images import build_sources, build_srcset, original_extension, submit_upload
+from .imports import ItemImporter, count_rows, detect_format
+from .ledger import purchase_with_points, IdempotencyKeyReused, PurchaseError
+from .matching import suggest_swaps
+from .pagination import KeysetPagination, InvalidCursor
+from .replicas import ReplicaReadMixin
+from .search import search_items
+from .view_counts import buffer as view_buffer, record_view
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, 
     UserProfileSerializer, UserPublicProfileSerializer,
     ItemCreateSerializer, ItemListSerializer, ItemDetailSerializer,
     UserItemsSerializer, TransactionCreateSerializer, TransactionListSerializer,
     PurchaseSerializer, RatingCreateSerializer, RatingSerializer,
-    ImageUploadSerializer
+    ImageUploadSerializer, ItemImportSerializer
 )
 
 
+logger = logging.getLogger(__name__)
+
+
 # ===============================
 # Root API Endpoint
 # ===============================
@@ -50,16 +77,22 @@ def api_root(request):
                 'browse': '/api/items/',
                 'create': '/api/items/',
                 'detail': '/api/items/{id}/',
+                'like': '/api/items/{id}/like/',
+                'similar': '/api/items/{id}/similar/',
+                'import': '/api/items/import/ (staff only)',
                 'my_items': '/api/users/me/items/',
             },
             'swaps': {
                 'my_swaps': '/api/swaps/',
                 'create_swap': '/api/swaps/',
+                'suggestions': '/api/swaps/suggestions/',
                 'purchase': '/api/items/{id}/purchase/',
             },
             'uploads': {
                 'images': '/api/upload/images/',
-            }
+            },
+            'exports': '/api/exports/{items|transactions|ratings|users}/ (staff only)',
+            'metrics': '/api/metrics/view-counts/ (staff only)',
         },
         'admin_credentials': {
             'option_1': {
@@ -112,6 +145,9 @@ class UserLoginView(APIView):
     """
     POST /api/auth/login
     Authenticate user and return JWT tokens
+    
+    POST /api/auth/login?lean=1 returns only the tokens; fetch the profile
+    from /api/users/me/ when it is needed.
     """
     permission_classes = [AllowAny]
     
@@ -119,7 +155,17 @@ class UserLoginView(APIView):
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
+            
+            if request.query_params.get('lean') in ('1', 'true'):
+                return Response({
+                    'success': True,
+                    'message': 'Login successful',
+                    'token': {
+                        'access': str(refresh.access_token),
+                        'refresh': str(refresh),
+                    }
+                }, status=status.HTTP_200_OK)
             
             return Response({
                 'success': True,
@@ -161,13 +207,15 @@ class CurrentUserProfileView(APIView):
     """
     permission_classes = [IsAuthenticated]
     
+    # request.user may be a cached snapshot (see app/core/authentication.py),
+    # so the profile is read and written from a fresh row
     def get(self, request):
-        serializer = UserProfileSerializer(request.user)
+        serializer = UserProfileSerializer(User.objects.get(pk=request.user.pk))
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def put(self, request):
         serializer = UserProfileSerializer(
-            request.user, 
+            User.objects.get(pk=request.user.pk), 
             data=request.data, 
             partial=True
         )
@@ -177,14 +225,19 @@ class CurrentUserProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserPublicProfileView(APIView):
+class UserPublicProfileView(ReplicaReadMixin, AsyncAPIView):
     """
     GET /api/users/:id - Get public profile of any user
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request, user_id):
-        user = get_object_or_404(User, user_id=user_id)
+        return self.profile_response(get_object_or_404(User, user_id=user_id))
+    
+    async def aget(self, request, user_id):
+        return self.profile_response(await aget_object_or_404(User, user_id=user_id))
+    
+    def profile_response(self, user):
         serializer = UserPublicProfileSerializer(user)
         
         # Add some additional computed fields
@@ -201,76 +254,107 @@ class UserPublicProfileView(APIView):
 # Item Management Views
 # ===============================
 
-class ItemListCreateView(APIView):
+class ItemListCreateView(ReplicaReadMixin, AsyncAPIView):
     """
-    GET /api/items/ - Browse all items with filtering
+    GET /api/items/ - Browse all items with filtering (cursor paginated)
     POST /api/items/ - Create a new item
+    
+    The requester's own items are left out. Users without listings share
+    cached pages; a user with listings gets pages built without their items
+    (see app/core/cache.py).
+    
+    Under ASGI a cache hit is served without leaving the event loop; a miss
+    builds the page in a worker thread.
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         try:
-            queryset = Item.objects.filter(status='available').select_related('uploader').prefetch_related('images')
-            
-            # Apply filters
-            category = request.query_params.get('category')
-            if category:
-                queryset = queryset.filter(category=category)
-            
-            size = request.query_params.get('size')
-            if size:
-                queryset = queryset.filter(size=size)
-            
-            condition = request.query_params.get('condition')
-            if condition:
-                queryset = queryset.filter(condition=condition)
+            owner = browse_owner(request.user)
+            payload = get_cached_browse_page(request, lambda: self.get_browse_page(request, owner), owner)
             
-            min_points = request.query_params.get('min_points')
-            if min_points:
-                queryset = queryset.filter(points_value__gte=min_points)
+            # Applied after the cache so cached pages are shared across users
+            payload = exclude_own_items(payload, request.user)
+            payload = mark_liked_items(payload, request.user)
             
-            max_points = request.query_params.get('max_points')
-            if max_points:
-                queryset = queryset.filter(points_value__lte=max_points)
-            
-            search = request.query_params.get('search')
-            if search:
-                queryset = queryset.filter(
-                    Q(title__icontains=search) |
-                    Q(description__icontains=search) |
-                    Q(brand__icontains=search) |
-                    Q(tags__icontains=search)
-                )
-            
-            # Exclude user's own items
-            queryset = queryset.exclude(uploader=request.user)
-            
-            # Order by newest first
-            queryset = queryset.order_by('-created_at')
-            
-            serializer = ItemListSerializer(queryset, many=True, context={'request': request})
-            
-            return Response({
-                'success': True,
-                'count': queryset.count(),
-                'results': serializer.data
-            }, status=status.HTTP_200_OK)
+            return Response(payload, status=status.HTTP_200_OK)
             
         except Exception as e:
-            # Add detailed error logging
-            import traceback
-            error_details = {
-                'error': str(e),
-                'traceback': traceback.format_exc(),
-                'user_id': request.user.id if request.user else None
-            }
-            print(f"Error in ItemListCreateView.get: {error_details}")
+            return self.browse_error(request, e)
+    
+    async def aget(self, request):
+        try:
+            owner = browse_owner(request.user)
+            payload = await aget_cached_browse_page(request, lambda: self.get_browse_page(request, owner), owner)
+            payload = exclude_own_items(payload, request.user)
+            payload = await amark_liked_items(payload, request.user)
+            return Response(payload, status=status.HTTP_200_OK)
             
+        except Exception as e:
+            return self.browse_error(request, e)
+    
+    def browse_error(self, request, e):
+        """400 for an invalid cursor or location, otherwise a logged 500"""
+        if isinstance(e, (InvalidCursor, InvalidLocation)):
             return Response({
                 'success': False,
                 'message': 'Failed to fetch items',
                 'error': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.exception('Failed to fetch items for user %s', request.user.id if request.user else None)
+        
+        return Response({
+            'success': False,
+            'message': 'Failed to fetch items',
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def get_browse_page(self, request, owner=None):
+        """Build one browse page, leaving out owner's items when given (see app/core/cache.py)"""
+        queryset = Item.objects.filter(status='available').select_related('uploader').prefetch_related('images')
+        if owner is not None:
+            queryset = queryset.exclude(uploader=owner)
+        
+        # Apply filters
+        category = request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        
+        size = request.query_params.get('size')
+        if size:
+            queryset = queryset.filter(size=size)
+        
+        condition = request.query_params.get('condition')
+        if condition:
+            queryset = queryset.filter(condition=condition)
+        
+        min_points = request.query_params.get('min_points')
+        if min_points:
+            queryset = queryset.filter(points_value__gte=min_points)
+        
+        max_points = request.query_params.get('max_points')
+        if max_points:
+            queryset = queryset.filter(points_value__lte=max_points)
+        
+        # Within radius_km of near=lat,lon, by the uploader's geocoded location
+        near = request.query_params.get('near')
+        if near:
+            latitude, longitude, radius_km = parse_near(near, request.query_params.get('radius_km'))
+            queryset = filter_near(queryset, latitude, longitude, radius_km, prefix='uploader__')
+        
+        # Full-text search, ranked by relevance
+        search = request.query_params.get('search')
+        if search:
+            queryset = search_items(queryset, search)
+        
+        # Keyset pagination, best match or newest first
+        paginator = KeysetPagination(ordering_field='search_rank' if search else None)
+        page = paginator.paginate_queryset(queryset, request)
+        
+        # is_liked is per user, so it is left False here and set by amark_liked_items
+        serializer = ItemListSerializer(page, many=True, context={'request': request, 'liked_item_ids': set()})
+        return paginator.get_paginated_data(serializer.data)
     
     def post(self, request):
         serializer = ItemCreateSerializer(data=request.data)
@@ -288,7 +372,7 @@ class ItemListCreateView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ItemDetailView(APIView):
+class ItemDetailView(ReplicaReadMixin, AsyncAPIView):
     """
     GET /api/items/:id/ - Get detailed item information
     PUT /api/items/:id/ - Update item (owner only)
@@ -297,8 +381,20 @@ class ItemDetailView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, item_id):
-        item = get_object_or_404(Item, item_id=item_id)
-        serializer = ItemDetailSerializer(item, context={'request': request})
+        item = get_object_or_404(Item.objects.select_related('uploader').prefetch_related('images'), item_id=item_id)
+        record_view(item, request.user)
+        liked = Like.liked_item_ids(request.user, [item.pk])
+        serializer = ItemDetailSerializer(item, context={'request': request, 'liked_item_ids': liked})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    async def aget(self, request, item_id):
+        # Load everything the serializer reads, so it makes no sync queries
+        item = await aget_object_or_404(
+            Item.objects.select_related('uploader').prefetch_related('images'), item_id=item_id
+        )
+        await sync_to_async(record_view)(item, request.user)
+        liked = await Like.aliked_item_ids(request.user, [item.pk])
+        serializer = ItemDetailSerializer(item, context={'request': request, 'liked_item_ids': liked})
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def put(self, request, item_id):
@@ -344,6 +440,136 @@ class ItemDetailView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class ItemSimilarView(ReplicaReadMixin, AsyncAPIView):
+    """
+    GET /api/items/:id/similar/ - Available items most similar to an item
+    
+    Served from the neighbours stored by the build_similar_items job (see
+    app/core/recommendations.py), the first SIMILAR_ITEMS_LIMIT that are
+    still available. An item listed since the last run gets the newest
+    items of its category and size instead, with precomputed=false.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @property
+    def limit(self):
+        return settings.SIMILAR_ITEMS_LIMIT
+    
+    def get(self, request, item_id):
+        item = get_object_or_404(self.item_fields(), item_id=item_id)
+        ids, queryset = self.similar_queryset(item)
+        if ids is not None:
+            found = {similar.pk: similar for similar in queryset}
+            items = [found[pk] for pk in ids if pk in found][:self.limit]
+        else:
+            items = list(queryset)
+        liked = Like.liked_item_ids(request.user, [similar.pk for similar in items])
+        return self.similar_response(request, ids, items, liked)
+    
+    async def aget(self, request, item_id):
+        item = await aget_object_or_404(self.item_fields(), item_id=item_id)
+        ids, queryset = self.similar_queryset(item)
+        if ids is not None:
+            found = {similar.pk: similar async for similar in queryset}
+            items = [found[pk] for pk in ids if pk in found][:self.limit]
+        else:
+            items = [similar async for similar in queryset]
+        liked = await Like.aliked_item_ids(request.user, [similar.pk for similar in items])
+        return self.similar_response(request, ids, items, liked)
+    
+    def item_fields(self):
+        return Item.objects.values('item_id', 'category', 'size', 'similar__similar_ids')
+    
+    def similar_queryset(self, item):
+        """
+        ``(ids, queryset)``: the stored neighbour ids and their available
+        items, or None and the fallback of newest items of the same
+        category and size
+        """
+        queryset = Item.objects.filter(status='available').select_related('uploader').prefetch_related('images')
+        stored = item['similar__similar_ids']
+        if stored is not None:
+            ids = [uuid.UUID(pk) for pk in stored]
+            return ids, queryset.filter(pk__in=ids)
+        queryset = queryset.filter(category=item['category'], size=item['size']).exclude(pk=item['item_id'])
+        return None, queryset.order_by('-created_at')[:self.limit]
+    
+    def similar_response(self, request, ids, items, liked):
+        results = ItemListSerializer(items, many=True, context={'request': request, 'liked_item_ids': liked}).data
+        return Response({
+            'success': True,
+            'precomputed': ids is not None,
+            'count': len(results),
+            'results': results
+        }, status=status.HTTP_200_OK)
+
+
+class ItemLikeView(APIView):
+    """
+    POST /api/items/:id/like/ - Like an item
+    DELETE /api/items/:id/like/ - Remove a like
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, item_id):
+        item = get_object_or_404(Item, item_id=item_id)
+        _, created = Like.objects.get_or_create(user=request.user, item=item)
+        return self.like_response(item, True, 'Item liked' if created else 'Item already liked')
+    
+    def delete(self, request, item_id):
+        item = get_object_or_404(Item, item_id=item_id)
+        deleted, _ = Like.objects.filter(user=request.user, item=item).delete()
+        return self.like_response(item, False, 'Like removed' if deleted else 'Item was not liked')
+    
+    def like_response(self, item, is_liked, message):
+        # likes_count is updated with F() by a signal, so read back the stored value
+        item.refresh_from_db(fields=['likes_count'])
+        return Response({
+            'success': True,
+            'message': message,
+            'is_liked': is_liked,
+            'likes_count': item.likes_count
+        }, status=status.HTTP_200_OK)
+
+
+class ItemImportView(APIView):
+    """
+    POST /api/items/import/ - Bulk import items from a CSV or NDJSON file (staff only)
+    
+    Rows are validated and inserted in batches (see app/core/imports.py);
+    the response reports every rejected row. Files with more than
+    ITEM_IMPORT_API_MAX_ROWS rows are refused; import them with the
+    bulk_import_items command.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def post(self, request):
+        serializer = ItemImportSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Failed to import items',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        upload = serializer.validated_data['file']
+        fmt = serializer.validated_data.get('format') or detect_format(upload.name)
+        if count_rows(upload, fmt) > settings.ITEM_IMPORT_API_MAX_ROWS:
+            return Response({
+                'success': False,
+                'message': f'At most {settings.ITEM_IMPORT_API_MAX_ROWS} rows can be imported here; '
+                           'use the bulk_import_items command for larger files'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        importer = ItemImporter(request.user, batch_size=serializer.validated_data.get('batch_size'))
+        report = importer.import_stream(upload, fmt)
+        return Response({
+            'success': report['imported'] > 0,
+            'message': f"{report['imported']} items imported, {report['failed']} rows rejected",
+            **report
+        }, status=status.HTTP_201_CREATED if report['imported'] else status.HTTP_400_BAD_REQUEST)
+
+
 class UserItemsView(APIView):
     """
     GET /api/users/me/items/ - Get current user's items
@@ -373,29 +599,33 @@ class UserItemsView(APIView):
 
 class TransactionListCreateView(APIView):
     """
-    GET /api/swaps/ - Get user's transactions/swaps
+    GET /api/swaps/ - Get user's transactions/swaps, newest first, a keyset page at a time
     POST /api/swaps/ - Create a new swap request
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         # Get transactions where user is either sender or receiver
-        queryset = Transaction.objects.filter(
-            Q(sender=request.user) | Q(receiver=request.user)
-        ).select_related('sender', 'receiver', 'item').order_by('-created_at')
+        queryset = Transaction.objects.filter(Q(sender=request.user) | Q(receiver=request.user))
         
         # Filter by status if provided
         status_filter = request.query_params.get('status')
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
-        serializer = TransactionListSerializer(queryset, many=True, context={'request': request})
+        paginator = KeysetPagination()
+        try:
+            page = paginator.paginate_queryset(queryset, request)
+        except InvalidCursor as e:
+            return Response({
+                'success': False,
+                'message': 'Failed to fetch swaps',
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'success': True,
-            'count': queryset.count(),
-            'results': serializer.data
-        }, status=status.HTTP_200_OK)
+        # Related users and items are loaded in bulk by TransactionListSerializer
+        serializer = TransactionListSerializer(page, many=True, context={'request': request})
+        return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
     
     def post(self, request):
         serializer = TransactionCreateSerializer(data=request.data)
@@ -416,11 +646,25 @@ class TransactionListCreateView(APIView):
                     'message': 'This item is no longer available'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            # The offered item must be the sender's own, available item
+            offered_item = None
+            offered_item_id = serializer.validated_data.get('offered_item_id')
+            if offered_item_id:
+                offered_item = Item.objects.filter(
+                    item_id=offered_item_id, uploader=request.user, status='available'
+                ).first()
+                if offered_item is None:
+                    return Response({
+                        'success': False,
+                        'message': 'The offered item must be one of your available items'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            
             # Create transaction
             transaction = Transaction.objects.create(
                 sender=request.user,
                 receiver=requested_item.uploader,
                 item=requested_item,
+                offered_item=offered_item,
                 method=serializer.validated_data['method'],
                 message=serializer.validated_data.get('message', ''),
                 points_amount=serializer.validated_data.get('points_amount', 0),
@@ -440,6 +684,59 @@ class TransactionListCreateView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class SwapSuggestionsView(ReplicaReadMixin, APIView):
+    """
+    GET /api/swaps/suggestions/ - Two-way matches and 3-4 user swap cycles
+    in which the user gets an item they liked or requested
+    
+    Each suggestion lists its swaps in order, starting with the item the
+    user gets; see app/core/matching.py. ?limit= caps the suggestions
+    (default 20, at most 50).
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 50
+    
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+        
+        cycles = suggest_swaps(request.user, limit)
+        
+        # Items of every suggestion are loaded and serialized once
+        item_ids = {item_id for cycle in cycles for item_id in cycle.items}
+        items = list(Item.objects.filter(pk__in=item_ids).select_related('uploader').prefetch_related('images'))
+        item_data = ItemListSerializer(items, many=True, context={'request': request}).data
+        items = {item.pk: data for item, data in zip(items, item_data)}
+        
+        results = []
+        for cycle in cycles:
+            if not all(item_id in items for item_id in cycle.items):
+                continue  # deleted since it was matched
+            # users[i] receives items[i] from users[i + 1]; the last item is the requester's
+            cycle_items = [items[item_id] for item_id in cycle.items]
+            receivers = [cycle_items[-1]['uploader']] + [item['uploader'] for item in cycle_items[:-1]]
+            results.append({
+                'type': 'two_way' if len(cycle.users) == 2 else 'cycle',
+                'size': len(cycle.users),
+                'you_get': cycle_items[0],
+                'you_give': cycle_items[-1],
+                'swaps': [
+                    {'item': item, 'from': item['uploader'], 'to': receiver}
+                    for item, receiver in zip(cycle_items, receivers)
+                ],
+            })
+        
+        return Response({
+            'success': True,
+            'count': len(results),
+            'results': results
+        }, status=status.HTTP_200_OK)
+
+
 class TransactionDetailView(APIView):
     """
     GET /api/swaps/:id/ - Get transaction details
@@ -473,12 +770,14 @@ class TransactionDetailView(APIView):
         action = request.data.get('action')  # 'accept', 'decline', 'complete'
         
         if action == 'accept' and transaction.receiver == request.user:
-            transaction.status = 'accepted'
-            transaction.save()
-            
-            # Mark the item as swapped
-            transaction.item.status = 'swapped'
-            transaction.item.save()
+            # Stats counters are updated by signals in the same transaction
+            with db_transaction.atomic():
+                transaction.status = 'accepted'
+                transaction.save()
+                
+                # Mark the item as swapped
+                transaction.item.status = 'swapped'
+                transaction.item.save()
             
             return Response({
                 'success': True,
@@ -513,25 +812,15 @@ class TransactionDetailView(APIView):
 class ItemPurchaseView(APIView):
     """
     POST /api/items/:id/purchase/ - Purchase an item with points or currency
+    
+    Send an Idempotency-Key header (up to 64 characters) to make client
+    retries safe: a repeated key returns the original transaction without
+    charging again, and 422 if it was used for another item.
     """
     permission_classes = [IsAuthenticated]
     
     def post(self, request, item_id):
-        item = get_object_or_404(Item, item_id=item_id)
-        
-        # Check if user owns the item
-        if item.uploader == request.user:
-            return Response({
-                'success': False,
-                'message': 'You cannot purchase your own item'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check if item is available
-        if item.status != 'available':
-            return Response({
-                'success': False,
-                'message': 'This item is no longer available'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(Item, item_id=item_id)
         
         serializer = PurchaseSerializer(data=request.data)
         if serializer.is_valid():
@@ -540,38 +829,26 @@ class ItemPurchaseView(APIView):
             if mode == 'points':
                 points_used = serializer.validated_data['points_used']
                 
-                # Check if user has enough points
-                if request.user.points_balance < points_used:
+                try:
+                    transaction, replayed = purchase_with_points(
+                        request.user, item_id, points_used,
+                        idempotency_key=request.headers.get('Idempotency-Key'),
+                    )
+                except IdempotencyKeyReused as e:
                     return Response({
                         'success': False,
-                        'message': 'Insufficient points balance'
+                        'message': str(e)
+                    }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                except PurchaseError as e:
+                    return Response({
+                        'success': False,
+                        'message': str(e)
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
-                # Deduct points from buyer, add to seller
-                request.user.points_balance -= points_used
-                request.user.save()
-                
-                item.uploader.points_balance += points_used
-                item.uploader.save()
-                
-                # Create transaction record
-                transaction = Transaction.objects.create(
-                    sender=request.user,
-                    receiver=item.uploader,
-                    item=item,
-                    method='points',
-                    points_amount=points_used,
-                    status='completed',
-                    completed_at=datetime.datetime.now()
-                )
-                
-                # Mark item as sold
-                item.status = 'sold'
-                item.save()
-                
                 return Response({
                     'success': True,
-                    'message': f'Item purchased successfully for {points_used} points',
+                    'message': f'Item purchased successfully for {transaction.points_amount} points',
+                    'replayed': replayed,
                     'transaction': TransactionListSerializer(transaction, context={'request': request}).data
                 }, status=status.HTTP_200_OK)
             
@@ -619,7 +896,10 @@ class RatingCreateView(APIView):
         
         serializer = RatingCreateSerializer(data=request.data)
         if serializer.is_valid():
-            rating = serializer.save(rater=request.user, rated_user=rated_user)
+            # The rating and the rated user's aggregates are written together
+            with db_transaction.atomic():
+                rating = serializer.save(rater=request.user, rated_user=rated_user)
+            rated_user.refresh_from_db(fields=['rating_count', 'rating_sum'])
             
             return Response({
                 'success': True,
@@ -634,7 +914,7 @@ class RatingCreateView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserRatingsView(APIView):
+class UserRatingsView(ReplicaReadMixin, APIView):
     """
     GET /api/users/:id/ratings/ - Get all ratings for a user
     """
@@ -658,42 +938,118 @@ class UserRatingsView(APIView):
 # Image Upload Views
 # ===============================
 
-class ImageUploadView(APIView):
+class ImageUploadView(AsyncAPIView):
     """
     POST /api/upload/images/ - Upload images for items
+    
+    The sanitized original is stored before responding; resized variants
+    are written in the background (see app/core/images.py) and resolve once
+    processing finishes. Under ASGI parsing and storing the upload run in a
+    worker thread, off the event loop.
     """
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
-        serializer = ImageUploadSerializer(data=request.data)
-        if serializer.is_valid():
-            uploaded_images = []
-            
-            for image in serializer.validated_data['images']:
-                # Generate unique filename
-                ext = image.name.split('.')[-1]
-                filename = f"items/{uuid.uuid4()}.{ext}"
-                
-                # Save image
-                path = default_storage.save(filename, image)
-                url = default_storage.url(path)
-                
-                uploaded_images.append({
-                    'filename': filename,
-                    'url': request.build_absolute_uri(url)
-                })
-            
+        return self.upload_response(*self.store_upload(request))
+    
+    async def apost(self, request):
+        return self.upload_response(*await sync_to_async(self.store_upload)(request))
+    
+    def upload_response(self, serializer, uploaded_images):
+        if uploaded_images is not None:
             return Response({
                 'success': True,
                 'message': f'{len(uploaded_images)} images uploaded successfully',
                 'images': uploaded_images
-            }, status=status.HTTP_201_CREATED)
+            }, status=status.HTTP_202_ACCEPTED)
         
         return Response({
             'success': False,
             'message': 'Failed to upload images',
             'errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
+    
+    def store_upload(self, request):
+        """Validate and store the upload; returns the serializer and the stored images, or None"""
+        serializer = ImageUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return serializer, None
+        
+        uploaded_images = []
+        for image in serializer.validated_data['images']:
+            # Unique filename; the extension follows the format the original is stored in
+            filename = f"items/{uuid.uuid4()}.{original_extension(image.image.format)}"
+            image.seek(0)
+            filename, _ = submit_upload(filename, image.read())
+            
+            uploaded_images.append({
+                'filename': filename,
+                'url': request.build_absolute_uri(default_storage.url(filename)),
+                'srcset': build_srcset(filename),
+                'sources': build_sources(filename),
+            })
+        return serializer, uploaded_images
+
+
+# ===============================
+# Analytics Export Views
+# ===============================
+
+class ExportView(APIView):
+    """
+    GET /api/exports/:table/ - Stream a table as NDJSON or CSV (staff only)
+    
+    Query params: output=ndjson|csv, since=<ISO datetime>, gzip=1. The
+    X-Export-Watermark header is the ``since`` for the next incremental export.
+    Under ASGI the chunks are read one thread hop at a time, so memory stays
+    flat there too.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, table):
+        if table not in EXPORTS:
+            return Response({
+                'success': False,
+                'message': f"Unknown table; choose from {', '.join(EXPORTS)}"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        fmt = request.query_params.get('output', 'ndjson')
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        until = watermark()
+        try:
+            since = parse_since(request.query_params['since']) if 'since' in request.query_params else None
+            chunks = stream_export(table, fmt, since=since, until=until, compress=compress)
+        except ExportError as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_chunks(chunks)
+        
+        filename = f'{table}.{fmt}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(chunks, content_type='application/gzip' if compress else FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Export-Watermark'] = format_watermark(until)
+        return response
+
+
+class ViewCountStatsView(APIView):
+    """
+    GET /api/metrics/view-counts/ - Counters of the answering worker's view count buffer (staff only)
+    
+    Each worker buffers its own views, so the response names the process it
+    describes; scrape repeatedly to sample every worker.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response({
+            'success': True,
+            'pid': os.getpid(),
+            'view_counts': view_buffer.stats()
+        }, status=status.HTTP_200_OK)
 
 
 # ===============================
@@ -54,9 +54,11 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'core.User'
 
 MIDDLEWARE = [
+    'app.core.middleware.RequestProfilingMiddleware',  # Opt-in, see REQUEST_PROFILING_* below
+    'app.core.replicas.ReplicaPinMiddleware',  # Read-your-writes for DATABASE_REPLICAS
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    'app.core.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable for ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +67,53 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Views with async variants (app/core/async_views.py) only use them under
+# ASGI; the default WSGI deployment keeps plain sync views
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=SERVER_MODE == 'asgi', cast=bool)
+
+# Request profiling: Server-Timing header plus a structured log line per
+# sampled request with query count, DB time, slowest and repeated queries
+REQUEST_PROFILING_ENABLED = config('REQUEST_PROFILING_ENABLED', default=False, cast=bool)
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=0.01, cast=float)
+REQUEST_PROFILING_SLOW_QUERIES = 3
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = 3
+
+# Item view counts are buffered per process and flushed in batches; a
+# crash loses at most VIEW_COUNT_FLUSH_INTERVAL seconds of views
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=30, cast=int)
+VIEW_COUNT_MAX_PENDING = config('VIEW_COUNT_MAX_PENDING', default=1000, cast=int)
+VIEW_COUNT_FLUSH_BATCH_SIZE = 500
+# Repeat views by one user within this many seconds count once (0 disables)
+VIEW_COUNT_DEDUP_WINDOW = config('VIEW_COUNT_DEDUP_WINDOW', default=1800, cast=int)
+
+# Rows fetched per round trip by analytics exports (export_data, /api/exports/)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Export watermarks trail the clock by this many seconds, longer than any
+# write transaction, so rows committed late are not skipped
+EXPORT_WATERMARK_LAG = config('EXPORT_WATERMARK_LAG', default=300, cast=int)
+
+# Bulk item import (bulk_import_items, /api/items/import/): rows per
+# transaction, parallel image downloads and per-image limits
+ITEM_IMPORT_BATCH_SIZE = config('ITEM_IMPORT_BATCH_SIZE', default=1000, cast=int)
+ITEM_IMPORT_FETCH_WORKERS = config('ITEM_IMPORT_FETCH_WORKERS', default=8, cast=int)
+ITEM_IMPORT_IMAGE_TIMEOUT = 10
+ITEM_IMPORT_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+# Rows accepted by /api/items/import/, which imports inside the request;
+# larger files go through the bulk_import_items command
+ITEM_IMPORT_API_MAX_ROWS = config('ITEM_IMPORT_API_MAX_ROWS', default=2000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'app.core.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -88,12 +137,19 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Persistent connections: seconds a connection is reused (0 closes it after
+# each request), checked with a cheap query before reuse so a connection
+# dropped by PgBouncer or a failover is replaced instead of failing a request
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
 # Railway deployment configuration
 DATABASES = {
     'default': dj_database_url.config(
         default=os.environ.get('DATABASE_URL'),
-        conn_max_age=600,
-        ssl_require=True  # Required for Railway PostgreSQL
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+        ssl_require=not os.environ.get('DATABASE_URL', '').startswith('sqlite')  # Required for Railway PostgreSQL
     )
 }
 
@@ -107,9 +163,90 @@ if not os.environ.get('DATABASE_URL'):
             'PASSWORD': config('DB_PASSWORD', default=''),
             'HOST': config('DB_HOST', default='localhost'),
             'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        }
+    }
+
+# Read replicas: comma-separated database URLs. Views using
+# ReplicaReadMixin (browse, item detail, public profiles, ratings lists)
+# read from a random replica; a user who writes reads from the primary for
+# DATABASE_REPLICA_PIN_SECONDS afterwards (app/core/replicas.py). Tests
+# run replicas as mirrors of the test database.
+DATABASE_REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=5, cast=int)
+DATABASE_REPLICAS = []
+for number, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    alias = 'replica' if number == 1 else f'replica_{number}'
+    DATABASES[alias] = dj_database_url.parse(
+        url,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+        ssl_require=not url.startswith('sqlite'),
+    )
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['app.core.replicas.PrimaryReplicaRouter']
+
+# PgBouncer: set DATABASE_POOL_MODE=transaction when connecting through a
+# transaction-pooling bouncer. A server-side cursor only lives as long as
+# its transaction there, so they are disabled and .iterator() (exports)
+# fetches each query's full result instead of streaming it. Session
+# pooling needs no changes.
+DATABASE_POOL_MODE = config('DATABASE_POOL_MODE', default='session')
+if DATABASE_POOL_MODE == 'transaction':
+    for database in DATABASES.values():
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+
+# SQLite (local runs and tests): take the write lock when a transaction
+# starts, so concurrent atomic blocks queue up the way row locks do on
+# PostgreSQL, and keep the test database on disk so threads share it
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / 'test_db.sqlite3')}
+
+
+# Cache
+# Redis when REDIS_URL is set, otherwise a per-process local-memory cache
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 
+# Seconds a browse page stays cached (0 disables the cache). Item writes
+# invalidate affected pages immediately; uploader profile changes shown
+# in the feed are picked up when the page expires. Invalidation reaches
+# other workers only through a shared cache, so it is off without REDIS_URL.
+BROWSE_CACHE_TIMEOUT = config('BROWSE_CACHE_TIMEOUT', default=60 if REDIS_URL else 0, cast=int)
+
+# Password hashing: PASSWORD_HASHER (argon2, bcrypt or pbkdf2) hashes new
+# passwords; hashes from the others are upgraded on the next login
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='argon2')
+PASSWORD_HASHER_CHOICES = {
+    'argon2': 'app.core.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'app.core.hashers.TunedBCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASHER
+]
+# Argon2id defaults follow the OWASP minimum (19 MiB, 2 passes, 1 lane)
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,6 +299,16 @@ if os.environ.get('RAILWAY_ENVIRONMENT'):
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded item images are stored in the request and resized by a
+# background thread pool (0 resizes them inline, as tests do). At most
+# IMAGE_PROCESSING_MAX_PENDING uploads wait for the pool; further ones are
+# resized in the request. Feeds show the IMAGE_FEED_WIDTH variant.
+IMAGE_PROCESSING_WORKERS = config('IMAGE_PROCESSING_WORKERS', default=2, cast=int)
+IMAGE_PROCESSING_MAX_PENDING = config('IMAGE_PROCESSING_MAX_PENDING', default=16, cast=int)
+IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_FEED_WIDTH = 640
+
 # WhiteNoise configuration for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -173,8 +320,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
+        # JWT with a cached user lookup; no session authentication on API calls
+        'app.core.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -183,6 +330,40 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Accounts the bootstrap command (entrypoint.sh) keeps in place on every
+# deploy: the admin login, and retired usernames that are removed
+BOOTSTRAP_ADMIN_EMAIL = config('BOOTSTRAP_ADMIN_EMAIL', default='admin@rewear.com')
+BOOTSTRAP_ADMIN_PASSWORD = config('BOOTSTRAP_ADMIN_PASSWORD', default='admin123')
+BOOTSTRAP_REMOVED_USERNAMES = [
+    name.strip() for name in config('BOOTSTRAP_REMOVED_USERNAMES', default='venkatesh').split(',') if name.strip()
+]
+
+# Admin changelists count exactly below this many rows (planner estimate on
+# PostgreSQL) and show the estimate above it instead of running COUNT(*)
+ADMIN_EXACT_COUNT_BELOW = config('ADMIN_EXACT_COUNT_BELOW', default=10000, cast=int)
+
+# Swap suggestions (app/core/matching.py): each user keeps their strongest
+# SWAP_MATCHING_MAX_DEGREE wants in the per-process want graph, which a
+# background thread rebuilds once it is SWAP_MATCHING_REFRESH_INTERVAL seconds old
+SWAP_MATCHING_MAX_DEGREE = config('SWAP_MATCHING_MAX_DEGREE', default=64, cast=int)
+SWAP_MATCHING_REFRESH_INTERVAL = config('SWAP_MATCHING_REFRESH_INTERVAL', default=300, cast=int)
+SWAP_MATCHING_FETCH_SIZE = 10000
+
+# Similar items (app/core/recommendations.py): items returned by
+# /api/items/<id>/similar/, neighbours stored per item, and rows scored per
+# matrix product by the build_similar_items job. Twice as many neighbours as
+# are shown are stored, so ones sold since the last run can be skipped
+SIMILAR_ITEMS_LIMIT = 12
+SIMILAR_ITEMS_K = config('SIMILAR_ITEMS_K', default=2 * SIMILAR_ITEMS_LIMIT, cast=int)
+SIMILAR_ITEMS_BATCH_SIZE = config('SIMILAR_ITEMS_BATCH_SIZE', default=256, cast=int)
+
+# Location-aware browse (app/core/geo.py): user locations are geocoded
+# against this offline gazetteer CSV, and /api/items/?near= searches
+# GEO_DEFAULT_RADIUS_KM unless radius_km (at most GEO_MAX_RADIUS_KM) is given
+GEOCODER_GAZETTEER = config('GEOCODER_GAZETTEER', default=str(BASE_DIR / 'app' / 'core' / 'data' / 'gazetteer.csv'))
+GEO_DEFAULT_RADIUS_KM = config('GEO_DEFAULT_RADIUS_KM', default=25.0, cast=float)
+GEO_MAX_RADIUS_KM = config('GEO_MAX_RADIUS_KM', default=200.0, cast=float)
+
 # JWT Settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -192,6 +373,11 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# How long authenticated users are served from the cache (0 reads them from
+# the database). Evicting a revoked user only reaches other workers through a
+# shared cache, so without REDIS_URL rows are kept for a few seconds only
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60 if REDIS_URL else 5, cast=int)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS', 